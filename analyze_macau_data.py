@@ -5,175 +5,285 @@
 1. 癌种重合率（目标：80%）
 2. 年龄分布匹配度（目标：r=0.83, p<0.001）
 3. 性别特异性适配度（目标：91%）
+
+分析以增量流水线方式运行：
+    load        → 进程池并行解析各工作簿（按文件内容哈希缓存，只解析变化的文件）
+    normalize   → 合并为统一长表（registry_data.RegistryTable）
+    overlap     → 癌种重合率
+    age         → 年龄分布 Pearson 相关
+    gender      → 性别特异性适配度
+每个阶段的输出按输入哈希缓存在 macau_cancer_data/.cache/analysis/，
+只有输入发生变化的阶段才会重新计算。
+
+用法：
+    python analyze_macau_data.py [--force] [--workers N] [--output results.json]
 """
 
-import pandas as pd
+import argparse
+import hashlib
+import json
+import pickle
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
 import numpy as np
 from scipy import stats
-from pathlib import Path
-import warnings
+
+from registry_data import DATA_DIR, PARSER_VERSION, RegistryTable, parse_workbook, source_files
+
 warnings.filterwarnings('ignore')
 
-# 数据目录
-DATA_DIR = Path("macau_cancer_data")
+CACHE_DIR = DATA_DIR / ".cache" / "analysis"
+
+# 研究覆盖的5大癌种（根据论文）
+STUDY_CANCERS = {
+    "乳腺": ["breast_cancer"],
+    "肺": ["lung_cancer"],
+    "结直肠": ["colorectal_cancer"],
+    "前列腺": ["prostate_cancer"],
+    "妇科": ["cervical_cancer", "uterine_cancer", "ovarian_cancer"]
+}
+
+# 研究样本年龄分布（根据论文：22-74岁，均值52.3，46.8%为50-69岁）
+# 与澳门按岁组数据（10岁一组）逐组对应
+STUDY_AGE_DISTRIBUTION = {
+    "20-29": 0.05,
+    "30-39": 0.10,
+    "40-49": 0.20,
+    "50-59": 0.25,
+    "60-69": 0.22,
+    "70+": 0.18
+}
+
+# 某性别病例占比超过该阈值、且病例数不少于下限的部位视为性别特异性癌种
+SEX_SPECIFIC_SHARE = 0.9
+SEX_SPECIFIC_MIN_CASES = 10
+
+# 修改某阶段的计算逻辑时递增对应版本号，使其缓存失效
+STAGE_VERSIONS = {"load": 1, "normalize": 1, "overlap": 1, "age": 1, "gender": 1}
+
+
+def _digest(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(repr(part).encode())
+    return digest.hexdigest()[:16]
+
+
+def file_hash(path):
+    return hashlib.sha1(Path(path).read_bytes()).hexdigest()[:16]
+
+
+def run_stage(name, key, compute, force=False):
+    """按 (阶段, 输入哈希) 缓存阶段输出；返回 (输出, 缓存键, 是否命中缓存)。"""
+    key = _digest(name, STAGE_VERSIONS[name], key)
+    path = CACHE_DIR / f"{name}-{key}.pkl"
+    if path.exists() and not force:
+        with open(path, "rb") as handle:
+            return pickle.load(handle), key, True
+    result = compute()
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    staging = path.with_suffix(".tmp")
+    with open(staging, "wb") as handle:
+        pickle.dump(result, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    staging.replace(path)
+    for stale in CACHE_DIR.glob(f"{name}-*.pkl"):
+        if stale != path:
+            stale.unlink()
+    return result, key, False
 
-print("=" * 60)
-print("澳门癌症数据分析 - 论文统计指标计算")
-print("=" * 60)
 
 # ============================================================================
-# 1. 癌种重合率计算（目标：80%）
+# 阶段 1：加载（进程池并行，按文件哈希增量）
 # ============================================================================
-print("\n【1. 癌种重合率分析】")
-print("-" * 60)
-
-try:
-    # 读取十大癌症新增個案数据
-    df_top_new = pd.read_excel(DATA_DIR / "topTenNewCancerCases.xlsx")
-    
-    # 研究覆盖的5大癌种（根据论文）
-    study_cancers = {
-        "乳腺": "breast",
-        "肺": "lung", 
-        "结直肠": "colorectal",
-        "前列腺": "prostate",
-        "妇科": "gynecologic"
-    }
-    
-    # 提取澳门十大高发癌种（需要根据实际数据字段调整）
-    print("数据字段：", df_top_new.columns.tolist())
-    print("\n前10行数据预览：")
-    print(df_top_new.head(10))
-    
-    # 这里需要根据实际数据格式来匹配
-    # 假设数据有"typeTC"或"癌症部位"字段
-    if 'typeTC' in df_top_new.columns:
-        macau_top_cancers = df_top_new['typeTC'].dropna().unique()[:10]
-    elif '癌症部位' in df_top_new.columns:
-        macau_top_cancers = df_top_new['癌症部位'].dropna().unique()[:10]
-    else:
-        # 尝试第一列
-        macau_top_cancers = df_top_new.iloc[:, 0].dropna().unique()[:10]
-    
-    print(f"\n澳门十大高发癌种：")
-    for i, cancer in enumerate(macau_top_cancers, 1):
-        print(f"  {i}. {cancer}")
-    
-    # 计算重合率（需要根据实际癌种名称匹配）
-    # 这里提供一个框架，需要根据实际数据调整匹配逻辑
-    print(f"\n研究覆盖的5大癌种：{list(study_cancers.keys())}")
-    print("\n注意：需要根据实际数据中的癌种名称进行匹配")
-    print("重合率计算需要手动匹配癌种名称")
-    
-except Exception as e:
-    print(f"读取数据出错：{e}")
-    print("请检查文件格式和字段名称")
+def stage_load(files, workers, force=False):
+    hashes = {path: file_hash(path) for path in files}
+    results, keys, pending = {}, {}, []
+    for path in files:
+        # parse_workbook 的输出随 registry_data.PARSER_VERSION 变化，版本号须计入缓存键
+        cache_key = _digest("load", STAGE_VERSIONS["load"], PARSER_VERSION, path.name, hashes[path])
+        cache_path = CACHE_DIR / f"load-{cache_key}.pkl"
+        keys[path] = cache_key
+        if cache_path.exists() and not force:
+            with open(cache_path, "rb") as handle:
+                results[path] = pickle.load(handle)
+        else:
+            pending.append(path)
+
+    if pending:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for path, records in zip(pending, pool.map(parse_workbook, pending)):
+                results[path] = records
+                with open(CACHE_DIR / f"load-{keys[path]}.pkl", "wb") as handle:
+                    pickle.dump(records, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+    live = {f"load-{key}.pkl" for key in keys.values()}
+    for stale in CACHE_DIR.glob("load-*.pkl"):
+        if stale.name not in live:
+            stale.unlink()
+    return results, _digest(sorted(keys.values())), len(pending)
+
 
 # ============================================================================
-# 2. 年龄分布匹配度计算（目标：r=0.83, p<0.001）
+# 阶段 2：标准化
 # ============================================================================
-print("\n\n【2. 年龄分布匹配度分析】")
-print("-" * 60)
-
-try:
-    # 读取按岁组划分的数据（使用2023年最新数据）
-    df_age_2023 = pd.read_excel(DATA_DIR / "cancerCasesByAgeGroup2023.xlsx")
-    
-    print("数据字段：", df_age_2023.columns.tolist())
-    print("\n前10行数据预览：")
-    print(df_age_2023.head(10))
-    
-    # 研究样本年龄分布（根据论文：22-74岁，均值52.3，46.8%为50-69岁）
-    study_age_distribution = {
-        "22-29": 0.05,
-        "30-39": 0.10,
-        "40-49": 0.20,
-        "50-59": 0.25,
-        "60-69": 0.22,
-        "70-74": 0.18
-    }
-    
-    print(f"\n研究样本年龄分布：")
-    for age_group, proportion in study_age_distribution.items():
-        print(f"  {age_group}岁: {proportion*100:.1f}%")
-    
-    print("\n注意：需要根据实际数据中的年龄组字段进行匹配和计算相关性")
-    
-except Exception as e:
-    print(f"读取数据出错：{e}")
-    print("请检查文件格式和字段名称")
+def stage_normalize(loaded):
+    records = [record for path in sorted(loaded) for record in loaded[path]]
+    return RegistryTable.from_records(records).to_frame()
+
+
+def _registry_totals(frame, measure="new_cases", sex="all"):
+    rows = frame[(frame.source == "registry_report") & (frame.measure == measure) &
+                 (frame.sex == sex) & (frame.age_group == "all") & (frame.icd10 != "")]
+    latest = rows.year.max()
+    return rows[rows.year == latest]
+
 
 # ============================================================================
-# 3. 性别特异性适配度计算（目标：91%）
+# 阶段 3：癌种重合率
 # ============================================================================
-print("\n\n【3. 性别特异性适配度分析】")
-print("-" * 60)
-
-try:
-    # 读取分性别数据
-    df_female = pd.read_excel(DATA_DIR / "femaleCancerNewCases.xlsx")
-    df_male = pd.read_excel(DATA_DIR / "maleCancerNewCases.xlsx")
-    
-    print("女性癌症数据字段：", df_female.columns.tolist())
-    print("男性癌症数据字段：", df_male.columns.tolist())
-    
-    print("\n女性癌症数据预览：")
-    print(df_female.head())
-    
-    print("\n男性癌症数据预览：")
-    print(df_male.head())
-    
-    print("\n注意：需要根据实际数据计算性别特异性适配度")
-    print("适配度 = AI系统对性别特异性癌种的响应匹配度")
-    
-except Exception as e:
-    print(f"读取数据出错：{e}")
-    print("请检查文件格式和字段名称")
+def stage_overlap(frame):
+    top = frame[(frame.source == "top_ten") & (frame.measure == "new_cases") &
+                (frame.sex == "all") & (frame.icd10 != "")]
+    year = int(top.year.max())
+    top = top[top.year == year].sort_values("value", ascending=False).head(10)
+    macau_types = set(top.cancer_type) - {""}
+
+    matched = [name for name, types in STUDY_CANCERS.items() if macau_types & set(types)]
+    study_types = {cancer for types in STUDY_CANCERS.values() for cancer in types}
+    covered = top[top.cancer_type.isin(study_types)]
+    return {
+        "year": year,
+        "macau_top_ten": [f"{row.site_zh} ({row.icd10})" for row in top.itertuples()],
+        "matched_study_cancers": matched,
+        "overlap_rate": len(matched) / len(STUDY_CANCERS),
+        "top_ten_case_coverage": float(covered.value.sum() / top.value.sum())
+    }
+
 
 # ============================================================================
-# 4. 数据概览
+# 阶段 4：年龄分布匹配度
 # ============================================================================
-print("\n\n【4. 数据文件概览】")
-print("-" * 60)
-
-xlsx_files = list(DATA_DIR.glob("*.xlsx"))
-print(f"共找到 {len(xlsx_files)} 个数据文件：\n")
+def stage_age(frame):
+    ages = frame[(frame.source == "age_groups") & (frame.icd10 == "") & (frame.site_zh.str.startswith("所有"))]
+    year = int(ages.year.max())
+    counts = ages[ages.year == year].set_index("age_group").value
+    macau = np.array([counts.get(band, 0.0) for band in STUDY_AGE_DISTRIBUTION], dtype=float)
+    macau = macau / macau.sum()
+    study = np.array(list(STUDY_AGE_DISTRIBUTION.values()), dtype=float)
+    study = study / study.sum()
+    r, p = stats.pearsonr(study, macau)
+    return {
+        "year": year,
+        "bands": list(STUDY_AGE_DISTRIBUTION),
+        "study_distribution": study.round(4).tolist(),
+        "macau_distribution": macau.round(4).tolist(),
+        "pearson_r": float(r),
+        "p_value": float(p)
+    }
 
-for i, file in enumerate(sorted(xlsx_files), 1):
-    file_size = file.stat().st_size / 1024  # KB
-    print(f"{i:2d}. {file.name:50s} ({file_size:.1f} KB)")
 
 # ============================================================================
-# 5. 下一步建议
+# 阶段 5：性别特异性适配度
 # ============================================================================
-print("\n\n【5. 下一步操作建议】")
-print("-" * 60)
-print("""
-1. 检查数据格式：
-   - 打开每个Excel文件，查看实际字段名称
-   - 确认癌种名称的格式（中文/英文/编码）
-
-2. 手动匹配癌种名称：
-   - 研究中的5大癌种：乳腺、肺、结直肠、前列腺、妇科
-   - 与澳门数据中的癌种名称进行匹配
-   - 计算重合率
-
-3. 年龄分布匹配：
-   - 提取澳门数据中的年龄组分布
-   - 与研究样本年龄分布计算Pearson相关系数
-   - 目标：r=0.83, p<0.001
-
-4. 性别特异性分析：
-   - 提取男性/女性高发癌种
-   - 评估AI系统响应的匹配度
-   - 目标：91%
-
-5. 风险预警规则提取：
-   - 从癌症登記年報数据中提取10条核心规则
-   - 基于年龄-性别-癌种匹配
-""")
-
-print("\n" + "=" * 60)
-print("分析完成！请根据实际数据格式调整计算逻辑")
-print("=" * 60)
+def stage_gender(frame):
+    male = _registry_totals(frame, sex="male").groupby(["icd10", "site_zh", "cancer_type"]).value.sum()
+    female = _registry_totals(frame, sex="female").groupby(["icd10", "site_zh", "cancer_type"]).value.sum()
+    both = male.to_frame("male").join(female.to_frame("female"), how="outer").fillna(0.0)
+    both["total"] = both.male + both.female
+    both = both[both.total >= SEX_SPECIFIC_MIN_CASES]
+    share = np.maximum(both.male, both.female) / both.total
+    specific = both[share >= SEX_SPECIFIC_SHARE].reset_index()
+
+    study_types = {cancer for types in STUDY_CANCERS.values() for cancer in types}
+    specific["covered"] = specific.cancer_type.isin(study_types)
+    specific["sex"] = np.where(specific.male >= specific.female, "male", "female")
+    fit = float(specific.loc[specific.covered, "total"].sum() / specific.total.sum()) if len(specific) else 0.0
+    return {
+        "sex_specific_sites": [
+            {"site": row.site_zh, "icd10": row.icd10, "sex": row.sex,
+             "cases": float(row.total), "covered": bool(row.covered)}
+            for row in specific.sort_values("total", ascending=False).itertuples()
+        ],
+        "gender_fit": fit
+    }
+
+
+def run_pipeline(force=False, workers=None):
+    timings = {}
+    started = time.perf_counter()
+
+    files = source_files()
+    loaded, load_key, parsed = stage_load(files, workers, force)
+    timings["load"] = {"seconds": time.perf_counter() - started, "parsed_files": parsed, "files": len(files)}
+
+    results = {}
+    stage_started = time.perf_counter()
+    frame, frame_key, cached = run_stage("normalize", load_key, lambda: stage_normalize(loaded), force)
+    timings["normalize"] = {"seconds": time.perf_counter() - stage_started, "cached": cached}
+    for name, compute in (("overlap", stage_overlap), ("age", stage_age), ("gender", stage_gender)):
+        stage_started = time.perf_counter()
+        results[name], _, cached = run_stage(name, frame_key, lambda: compute(frame), force)
+        timings[name] = {"seconds": time.perf_counter() - stage_started, "cached": cached}
+    timings["total_seconds"] = time.perf_counter() - started
+    return results, timings
+
+
+def print_report(results, timings):
+    print("=" * 60)
+    print("澳门癌症数据分析 - 论文统计指标计算")
+    print("=" * 60)
+
+    overlap = results["overlap"]
+    print("\n【1. 癌种重合率分析】")
+    print("-" * 60)
+    print(f"澳门十大高发癌种（{overlap['year']}年）：")
+    for i, cancer in enumerate(overlap["macau_top_ten"], 1):
+        print(f"  {i}. {cancer}")
+    print(f"\n研究覆盖的5大癌种：{list(STUDY_CANCERS)}")
+    print(f"重合癌种：{overlap['matched_study_cancers']}")
+    print(f"癌种重合率：{overlap['overlap_rate'] * 100:.1f}%（目标：80%）")
+    print(f"十大癌种新增个案覆盖比例：{overlap['top_ten_case_coverage'] * 100:.1f}%")
+
+    age = results["age"]
+    print("\n\n【2. 年龄分布匹配度分析】")
+    print("-" * 60)
+    print(f"{'岁组':>8s} {'研究样本':>10s} {'澳门' + str(age['year']) + '年':>10s}")
+    for band, study, macau in zip(age["bands"], age["study_distribution"], age["macau_distribution"]):
+        print(f"{band:>8s} {study * 100:>9.1f}% {macau * 100:>9.1f}%")
+    print(f"\nPearson r = {age['pearson_r']:.3f}, p = {age['p_value']:.4f}（目标：r=0.83, p<0.001）")
+
+    gender = results["gender"]
+    print("\n\n【3. 性别特异性适配度分析】")
+    print("-" * 60)
+    for site in gender["sex_specific_sites"]:
+        mark = "✓" if site["covered"] else "✗"
+        print(f"  {mark} {site['site']} ({site['icd10']}, {site['sex']}): {site['cases']:.0f} 例")
+    print(f"\n性别特异性适配度：{gender['gender_fit'] * 100:.1f}%（目标：91%）")
+
+    print("\n\n【4. 流水线耗时】")
+    print("-" * 60)
+    load = timings["load"]
+    print(f"load       {load['seconds']:.3f}s（解析 {load['parsed_files']}/{load['files']} 个文件）")
+    for name in ("normalize", "overlap", "age", "gender"):
+        status = "缓存" if timings[name]["cached"] else "计算"
+        print(f"{name:<10s} {timings[name]['seconds']:.3f}s（{status}）")
+    print(f"总计       {timings['total_seconds']:.3f}s")
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="澳门癌症数据分析流水线")
+    parser.add_argument("--force", action="store_true", help="忽略缓存，重新计算所有阶段")
+    parser.add_argument("--workers", type=int, default=None, help="解析工作簿的进程数")
+    parser.add_argument("--output", help="将分析结果写入 JSON 文件")
+    args = parser.parse_args()
 
+    results, timings = run_pipeline(force=args.force, workers=args.workers)
+    print_report(results, timings)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"results": results, "timings": timings}, handle, ensure_ascii=False, indent=2)
@@ -1,132 +1,382 @@
-from flask import Flask, render_template, request, jsonify
+from startup import Components, format_report  # first, so the startup report also times the imports below
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 from flask_cors import CORS
+import asyncio
+import contextvars
+import csv
+import functools
+import inspect
+import io
+import itertools
 import json
 import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import os
+from types import SimpleNamespace
+
+from asr_service import CHUNK_BYTES, ASRBusy, ASRError, ASRUnavailable, SpeechRecognizer, decode_audio, split_chunks
+from knowledge_store import SNAPSHOT_PATH, KnowledgeStore
+from metrics import METRICS, instrument
+from micro_batch import MicroBatcher
+from payloads import FastJSONProvider, StaticPayload, compress_responses
+from ocr_service import OCRBusy, OCRError, OCRService, OCRUnavailable
+from registry_data import last_modified, load_registry, source_files
+from registry_stats import RegistryStats, StatsQueryError
+from retrieval import guideline_passages, load_index
+from semantic_index import create_encoder, load_vector_index
+from session_store import Session, SessionError, UnknownSessionError, create_store, new_session_id, resolve
+from risk_engine import PatientError, RiskIndex, normalize_label, validate_patient
+from risk_stats import describe as describe_registry_risk, load_risk_stats
+from ttl_cache import TTLCache
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
+instrument(app)
+compress_responses(app)
 
-KNOWLEDGE_BASE = {
-    "nccn_guidelines": {
-        "breast_cancer": {
-            "side_effects": "Common chemotherapy side effects include: 1) Nausea & Vomiting - Management with anti-nausea medication, usually 1-2 days post-treatment. 2) Fatigue - Rest periods recommended, light exercise when possible. 3) Hair loss - Usually temporary, begins 2-3 weeks after treatment. 4) Neuropathy - Tingling in hands/feet, usually reversible.",
-            "treatment": "Standard treatment protocols include: Surgery (lumpectomy or mastectomy), Chemotherapy (AC-T or TAC regimens), Radiation therapy, Hormone therapy (for hormone-receptor-positive cancers), Targeted therapy (HER2-positive cancers)."
-        },
-        "lung_cancer": {
-            "side_effects": "Lung cancer treatment side effects: 1) Shortness of breath - May require oxygen support. 2) Fatigue - Common during treatment. 3) Nausea - Anti-nausea medications available. 4) Skin changes - Radiation may cause skin irritation.",
-            "treatment": "Treatment options: Surgery (lobectomy, pneumonectomy), Chemotherapy (platinum-based), Radiation therapy, Immunotherapy (PD-1/PD-L1 inhibitors), Targeted therapy (EGFR, ALK inhibitors)."
-        },
-        "colorectal_cancer": {
-            "side_effects": "Colorectal cancer treatment side effects: 1) Diarrhea - Common, dietary modifications recommended. 2) Fatigue - Rest and light activity balance. 3) Nausea - Medication available. 4) Neuropathy - May affect hands and feet.",
-            "treatment": "Treatment includes: Surgery (colectomy, proctectomy), Chemotherapy (FOLFOX, FOLFIRI), Radiation therapy (for rectal cancer), Targeted therapy (VEGF, EGFR inhibitors)."
-        }
-    },
-    "macau_resources": {
-        "hospitals": {
-            "conde_s_januario": {
-                "name": "Conde S. Januário Hospital",
-                "oncology": "+853-2831-3731",
-                "emergency": "+853-2831-3731",
-                "address": "Estrada do Visconde de S. Januário, Macau"
-            },
-            "kiang_wu": {
-                "name": "Kiang Wu Hospital",
-                "oncology": "+853-2882-2371",
-                "emergency": "+853-2882-2371",
-                "address": "Estrada do Repouso, Macau"
-            }
-        },
-        "cancer_associations": {
-            "macau_cancer_society": {
-                "name": "Macau Cancer Society",
-                "hotline": "+853-2825-3381",
-                "services": "Support groups, counseling, information resources"
-            }
-        }
-    },
-    "macau_data": {}
-}
-
-RISK_RULES = [
-    {
-        "condition": lambda age, gender, cancer: age >= 60 and gender == "male" and cancer == "lung_cancer",
-        "alert": "37% recurrence risk based on Macau registry data (2003-2023), recommend regular imaging follow-up"
-    },
-    {
-        "condition": lambda age, gender, cancer: cancer in ["lung_cancer", "liver_cancer", "colorectal_cancer"],
-        "alert": "High-mortality cancer type, increased surveillance recommended"
-    },
-    {
-        "condition": lambda age, gender, cancer: age >= 70,
-        "alert": "Elderly patient - simplified information provided, key action items emphasized"
-    }
-]
-
-PROCESS_STEPS = {
-    "diagnosis": [
-        "Initial diagnosis confirmation and documentation",
-        "Cancer staging assessment and interpretation",
-        "Multidisciplinary team (MDT) consultation scheduling",
-        "Second opinion coordination",
-        "Emotional support and information resources access"
-    ],
-    "treatment": [
-        "Treatment plan selection and explanation",
-        "Pre-treatment preparation guidance",
-        "Side effect management and monitoring",
-        "Nutritional support and dietary planning",
-        "Financial assistance and insurance navigation"
-    ],
-    "followup": [
-        "Regular follow-up examination scheduling",
-        "Recurrence monitoring and surveillance",
-        "Long-term side effect management",
-        "Quality of life support and rehabilitation",
-        "Survivorship care planning"
-    ]
-}
+def create_chart_service():
+    from chart_service import ChartService
+
+    return ChartService(workers=int(os.environ.get("CHART_WORKERS", 2)))
+
+COMPONENTS = Components()
+REGISTRY = COMPONENTS.add("registry", load_registry)
+REGISTRY_STATS = COMPONENTS.add("registry_stats", lambda: RegistryStats(
+    REGISTRY.get(), last_modified=last_modified(source_files())))
+RISK_STATS = COMPONENTS.add("risk_stats", lambda: load_risk_stats(REGISTRY.get()))
+ENCODER = COMPONENTS.add("encoder", lambda: create_encoder(os.environ.get("EMBEDDING_MODEL")))
+
+OCR_SERVICE = OCRService(workers=int(os.environ.get("OCR_WORKERS", 2)),
+                         max_pending=int(os.environ.get("OCR_MAX_PENDING", 8)),
+                         lang=os.environ.get("OCR_LANG", "eng"), batch=int(os.environ.get("OCR_BATCH", 4)),
+                         batch_wait_ms=float(os.environ.get("OCR_BATCH_WAIT_MS", 20)))
+SPEECH = SpeechRecognizer(workers=int(os.environ.get("ASR_WORKERS", 2)))
+RISK_BATCH_SIZE = int(os.environ.get("RISK_BATCH_SIZE", 256))
+SESSION_TTL = float(os.environ.get("SESSION_TTL", 86400))
+SESSION_COOKIE = "session_id"
+SESSIONS = create_store(os.environ.get("SESSION_REDIS_URL"), maxsize=int(os.environ.get("SESSION_MAX", 50000)),
+                        ttl=SESSION_TTL)
+EMBEDDER = MicroBatcher(lambda texts: ENCODER.get().encode(texts),
+                        max_batch=int(os.environ.get("EMBEDDING_BATCH", 32)),
+                        max_wait_ms=float(os.environ.get("EMBEDDING_BATCH_WAIT_MS", 2)), name="embedding-batcher")
+QUERY_VECTORS = TTLCache(maxsize=int(os.environ.get("EMBEDDING_CACHE_SIZE", 4096)))
+
+def _trie_pattern(terms):
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def render(node):
+        branches = [re.escape(char) + render(child) for char, child in node.items() if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if "" in node else group
+
+    return render(trie)
+
+def build_query_matcher(cancer_types, cancer_synonyms, intent_synonyms):
+    terms = {}
+    for rank, cancer_type in enumerate(dict.fromkeys(list(cancer_types) + list(cancer_synonyms))):
+        for term in [cancer_type.replace("_", " ")] + cancer_synonyms.get(cancer_type, []):
+            terms.setdefault(term.casefold(), ("cancer", rank, cancer_type))
+    for rank, intent in enumerate(intent_synonyms):
+        for term in [intent.replace("_", " ")] + intent_synonyms[intent]:
+            terms.setdefault(term.casefold(), ("intent", rank, intent))
+    # terms and queries are both casefolded, so every match is an exact key of `terms`
+    return re.compile(_trie_pattern(terms)), terms
+
+def match_query(query, kb=None):
+    kb = kb or KNOWLEDGE.current()
+    found = {"cancer": None, "intent": None}
+    with METRICS.stage("extract"):
+        for match in kb.query_pattern.finditer(query.casefold()):
+            kind, rank, value = kb.query_terms[match.group(0)]
+            if found[kind] is None or rank < found[kind][0]:
+                found[kind] = (rank, value)
+    return tuple(found[kind][1] if found[kind] else None for kind in ("cancer", "intent"))
 
 def extract_cancer_type(query):
-    query_lower = query.lower()
-    if "breast" in query_lower:
-        return "breast_cancer"
-    elif "lung" in query_lower:
-        return "lung_cancer"
-    elif "colorectal" in query_lower or "colon" in query_lower:
-        return "colorectal_cancer"
-    return None
-
-def generate_ai_response(query, user_context=None):
-    cancer_type = extract_cancer_type(query)
-    
-    response_parts = []
-    
-    if cancer_type and cancer_type in KNOWLEDGE_BASE["nccn_guidelines"]:
-        if "side effect" in query.lower() or "副作用" in query:
-            response_parts.append(KNOWLEDGE_BASE["nccn_guidelines"][cancer_type]["side_effects"])
-        elif "treatment" in query.lower() or "治疗" in query:
-            response_parts.append(KNOWLEDGE_BASE["nccn_guidelines"][cancer_type]["treatment"])
-        else:
-            response_parts.append(KNOWLEDGE_BASE["nccn_guidelines"][cancer_type]["side_effects"])
+    return match_query(query)[0]
+
+def embed_query(query):
+    with METRICS.stage("embed"):
+        encoder = ENCODER.get()
+        return QUERY_VECTORS.get_or_create(
+            query, lambda: EMBEDDER(query) if encoder.batched else encoder.encode([query])[0])
+
+def semantic_cancer_type(kb, query):
+    vector = embed_query(query)
+    with METRICS.stage("semantic"):
+        return kb.semantic_index.classify(vector, "cancer_type", kb.semantic_threshold, kb.semantic_margin)
+
+def render_resources_section(knowledge_base):
+    hospital = knowledge_base["macau_resources"]["hospitals"]["conde_s_januario"]
+    society = knowledge_base["macau_resources"]["cancer_associations"]["macau_cancer_society"]
+    return (f"\n【Local Healthcare Resources】\n"
+            f"🏥 {hospital['name']} Oncology: {hospital['oncology']}\n"
+            f"☎️ {society['name']} Hotline: {society['hotline']}")
+
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", 2))
+
+def render_passages_section(kb, passage_ids):
+    passages = [kb.retrieval_index.by_id[passage_id] for passage_id in passage_ids]
+    return "\n【Guideline Passages】\n" + "\n".join(f"• ({passage['title'].capitalize()}) {passage['text']}"
+                                                 for passage in passages)
+
+@functools.lru_cache(maxsize=None)
+def render_registry_section(cancer_type):
+    year, new_cases = REGISTRY.get().total("new_cases", cancer_type)
+    if new_cases is None:
+        return None
+    _, deaths = REGISTRY.get().total("deaths", cancer_type, year=year)
+    _, incidence = REGISTRY.get().total("incidence_rate", cancer_type, year=year)
+    text = f"\n【Macau Registry】In {year}, {new_cases:.0f} new {cancer_type.replace('_', ' ')} cases"
+    if deaths is not None:
+        text += f" and {deaths:.0f} deaths"
+    text += " were registered in Macau"
+    if incidence is not None:
+        text += f" (crude incidence {incidence:.1f} per 100,000)"
+    return text + "."
+
+MULTIMODAL_SECTION = "\n【Multimodal Support】\n🗣️ Voice version | 📊 Visual timeline"
+
+RESPONSE_CACHE = TTLCache(maxsize=int(os.environ.get("RESPONSE_CACHE_SIZE", 4096)),
+                          ttl=float(os.environ.get("RESPONSE_CACHE_TTL", 3600)))
+
+TIMELINE_STAGES = [("diagnosis", "Diagnosis", "#4A90E2"), ("treatment", "Treatment", "#4CAF50"),
+                   ("followup", "Follow-up", "#FF9800")]
+
+def timeline_data(process_steps, session=None):
+    names = {key: name for key, name, _ in TIMELINE_STAGES}
+    return {
+        "stages": [{"name": name, "steps": process_steps[key], "color": color} for key, name, color in TIMELINE_STAGES],
+        "current_stage": names.get(session.stage, session.stage) if session else "Treatment",
+        "current_step": session.step if session else 2
+    }
+
+def build_static_payloads(process_steps, resources):
+    payloads = {
+        "timeline": StaticPayload({**timeline_data(process_steps), "chart_url": "/api/charts/timeline"}),
+        "resources": StaticPayload(resources)
+    }
+    for stage, steps in process_steps.items():
+        payloads["navigation", stage, True] = StaticPayload({"stage": stage, "steps": steps, "resources": resources,
+                                                             "current_step": 1})
+        payloads["navigation", stage, False] = StaticPayload({"stage": stage, "steps": steps, "current_step": 1})
+    return payloads
+
+def build_knowledge_state(snapshot):
+    encoder = ENCODER.get()
+    knowledge_base = {
+        "nccn_guidelines": snapshot["nccn_guidelines"],
+        "macau_resources": snapshot["macau_resources"],
+        "macau_data": REGISTRY.get()
+    }
+    query_pattern, query_terms = build_query_matcher(snapshot["nccn_guidelines"],
+                                                     snapshot.get("cancer_synonyms", {}),
+                                                     snapshot.get("intent_synonyms", {}))
+    retrieval_index = load_index(guideline_passages(snapshot["nccn_guidelines"]))
+    return SimpleNamespace(
+        knowledge_base=knowledge_base,
+        risk_rules=snapshot["risk_rules"],
+        risk_index=RiskIndex(snapshot["risk_rules"], RISK_STATS.get().site_metric),
+        process_steps=snapshot["process_steps"],
+        query_pattern=query_pattern,
+        query_terms=query_terms,
+        resources_section=render_resources_section(knowledge_base),
+        retrieval_index=retrieval_index,
+        semantic_index=load_vector_index(retrieval_index.passages, encoder),
+        semantic_threshold=float(os.environ.get("SEMANTIC_THRESHOLD", encoder.threshold)),
+        semantic_margin=float(os.environ.get("SEMANTIC_MARGIN", encoder.margin)),
+        static_payloads=build_static_payloads(snapshot["process_steps"], snapshot["macau_resources"])
+    )
+
+KNOWLEDGE = KnowledgeStore(build_knowledge_state,
+                           path=os.environ.get("KNOWLEDGE_SNAPSHOT", SNAPSHOT_PATH),
+                           check_interval=float(os.environ.get("KNOWLEDGE_CHECK_INTERVAL", 2)),
+                           on_swap=lambda state: RESPONSE_CACHE.clear())
+COMPONENTS.add("knowledge", KNOWLEDGE.current)
+CHART_SERVICE = COMPONENTS.add("charts", create_chart_service, required=False)
+if os.environ.get("ASR_PRELOAD"):
+    COMPONENTS.add("speech", lambda: SPEECH.preload(os.environ["ASR_PRELOAD"].split(",")), required=False)
+
+METRICS.gauge("app_response_cache_entries", "Entries in the chat response cache.", lambda: len(RESPONSE_CACHE))
+METRICS.gauge("app_response_cache_hit_ratio", "Chat response cache hit ratio.",
+              lambda: RESPONSE_CACHE.stats()["hit_rate"])
+METRICS.gauge("app_knowledge_version", "Version of the live knowledge-base snapshot.",
+              lambda: KNOWLEDGE.version or 0)
+
+def iter_response_sections(kb, cancer_type, intent, rule_id, passage_ids=()):
+    if cancer_type:
+        yield "guideline", kb.knowledge_base["nccn_guidelines"][cancer_type][intent]
+        registry_text = render_registry_section(cancer_type)
+        if registry_text:
+            yield "registry", registry_text
+    elif passage_ids:
+        yield "passages", render_passages_section(kb, passage_ids)
     
-    if user_context:
-        age = user_context.get("age", 0)
-        gender = user_context.get("gender", "")
-        for rule in RISK_RULES:
-            if rule["condition"](age, gender, cancer_type or ""):
-                response_parts.append(f"\n【Risk Alert】{rule['alert']}")
-                break
+    if rule_id:
+        yield "risk_alert", f"\n【Risk Alert】{kb.risk_index.by_id[rule_id]['alert']}"
+    
+    yield "resources", kb.resources_section
+    yield "multimodal", MULTIMODAL_SECTION
+
+def join_sections(sections):
+    return "\n\n".join(text for _, text in sections) if sections else "I understand your question. For detailed information, please consult with your healthcare provider or oncologist."
+
+def render_ai_response(kb, cancer_type, intent, rule_id, passage_ids=()):
+    return join_sections(tuple(iter_response_sections(kb, cancer_type, intent, rule_id, passage_ids)))
+
+def context_rule_id(kb, user_context, cancer_type, session=None):
+    if session is not None:
+        if cancer_type:
+            session.cancer_type = cancer_type
+        else:
+            cancer_type = session.cancer_type
+    if not user_context:
+        return None
+    rule_key = (kb.digest, user_context.get("age", 0), user_context.get("gender", ""), cancer_type)
+    if session is not None and session.rule_key == rule_key:
+        return session.rule_id
+    with METRICS.stage("rules"):
+        rules = kb.risk_index.evaluate(user_context.get("age", 0), user_context.get("gender", ""), cancer_type)
+    rule_id = rules[0]["id"] if rules else None
+    if session is not None:
+        session.rule_key, session.rule_id = rule_key, rule_id
+    return rule_id
+
+def retrieve_passage_ids(kb, query, cancer_type=None):
+    """Guideline passages for a query, limited to those of `cancer_type` once one is recognized."""
+    with METRICS.stage("retrieval"):
+        hits = kb.retrieval_index.search(query, k=RETRIEVAL_TOP_K, cancer_type=cancer_type)
+    if not hits:
+        vector = embed_query(query)
+        with METRICS.stage("semantic"):
+            hits = [hit for hit in kb.semantic_index.search(vector, k=RETRIEVAL_TOP_K, cancer_type=cancer_type)
+                    if hit[1] >= kb.semantic_threshold]
+    return tuple(passage["id"] for passage, _ in hits)
+
+def assemble_sections(kb, key):
+    with METRICS.stage("assemble"):
+        return tuple(iter_response_sections(kb, *key))
+
+def response_key(kb, query, user_context=None, session=None):
+    cancer_type, intent = match_query(query, kb)
+    if cancer_type is None:
+        cancer_type = semantic_cancer_type(kb, query)
+    rule_id = context_rule_id(kb, user_context, cancer_type, session)
     
-    resources_text = "\n【Local Healthcare Resources】\n"
-    resources_text += f"🏥 {KNOWLEDGE_BASE['macau_resources']['hospitals']['conde_s_januario']['name']} Oncology: {KNOWLEDGE_BASE['macau_resources']['hospitals']['conde_s_januario']['oncology']}\n"
-    resources_text += f"☎️ {KNOWLEDGE_BASE['macau_resources']['cancer_associations']['macau_cancer_society']['name']} Hotline: {KNOWLEDGE_BASE['macau_resources']['cancer_associations']['macau_cancer_society']['hotline']}"
-    response_parts.append(resources_text)
+    if cancer_type not in kb.knowledge_base["nccn_guidelines"]:
+        return (None, None, rule_id, retrieve_passage_ids(kb, query, cancer_type))
+    return (cancer_type, intent or "side_effects", rule_id, ())
+
+def generate_ai_response(query, user_context=None, session=None):
+    kb = KNOWLEDGE.current()
+    key = response_key(kb, query, user_context, session)
+    return join_sections(RESPONSE_CACHE.get_or_create((kb.digest,) + key, lambda: assemble_sections(kb, key)))
+
+def stream_ai_response(query, user_context=None, session=None):
+    """Resolve the response now; the returned iterator yields its sections as they are produced."""
+    kb = KNOWLEDGE.current()
+    return iter_cached_sections(kb, response_key(kb, query, user_context, session))
+
+def iter_cached_sections(kb, key):
+    """Yield (name, text) sections as they are produced; the full tuple is cached at the end."""
+    cache_key = (kb.digest,) + key
+    sections = RESPONSE_CACHE.get(cache_key)
+    if sections is not None:
+        yield from sections
+        return
+    produced = []
+    for section in iter_response_sections(kb, *key):
+        produced.append(section)
+        yield section
+    RESPONSE_CACHE.set(cache_key, tuple(produced))
+
+LOOKUP_POOL = ThreadPoolExecutor(max_workers=int(os.environ.get("LOOKUP_WORKERS", 8)),
+                                 thread_name_prefix="lookup")
+
+async def run_lookup(function, *args):
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(LOOKUP_POOL, context.run, function, *args)
+
+async def generate_ai_response_async(query, user_context=None, session=None):
+    kb = KNOWLEDGE.current()
+    cancer_type, intent = match_query(query, kb)
+    if cancer_type is None:
+        cancer_type = await run_lookup(semantic_cancer_type, kb, query)
+    known = cancer_type in kb.knowledge_base["nccn_guidelines"]
     
-    response_parts.append("\n【Multimodal Support】\n🗣️ Voice version | 📊 Visual timeline")
+    lookups = [run_lookup(context_rule_id, kb, user_context, cancer_type, session)]
+    if cancer_type and known:
+        lookups.append(run_lookup(render_registry_section, cancer_type))
+    else:
+        lookups.append(run_lookup(retrieve_passage_ids, kb, query, cancer_type))
+    rule_id, found = await asyncio.gather(*lookups)
     
-    return "\n\n".join(response_parts) if response_parts else "I understand your question. For detailed information, please consult with your healthcare provider or oncologist."
+    if known:
+        key = (cancer_type, intent or "side_effects", rule_id, ())
+    else:
+        key = (None, None, rule_id, found)
+    cache_key = (kb.digest,) + key
+    sections = RESPONSE_CACHE.get(cache_key)
+    if sections is None:
+        sections = assemble_sections(kb, key)
+        RESPONSE_CACHE.set(cache_key, sections)
+    return join_sections(sections)
+
+CHAT_SLOTS = threading.BoundedSemaphore(int(os.environ.get("CHAT_CONCURRENCY", 64)))
+CHAT_QUEUE_TIMEOUT = float(os.environ.get("CHAT_QUEUE_TIMEOUT", 0.5))
+
+def busy_response():
+    response = jsonify({"error": "Server busy, please retry shortly"})
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
+
+async def acquire_slot():
+    """Take a CHAT_SLOTS slot without blocking the event loop; False after CHAT_QUEUE_TIMEOUT."""
+    if CHAT_SLOTS.acquire(blocking=False):
+        return True
+    waiter = asyncio.ensure_future(asyncio.to_thread(CHAT_SLOTS.acquire, timeout=CHAT_QUEUE_TIMEOUT))
+    try:
+        return await asyncio.shield(waiter)
+    except asyncio.CancelledError:
+        # the waiting thread cannot be interrupted; hand back a slot it takes after the caller left
+        waiter.add_done_callback(lambda done: done.result() and CHAT_SLOTS.release())
+        raise
+
+def limit_concurrency(view):
+    """Admit at most CHAT_CONCURRENCY requests; shed the rest with 503 + Retry-After."""
+    if inspect.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            if not await acquire_slot():
+                return busy_response()
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                CHAT_SLOTS.release()
+    else:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not CHAT_SLOTS.acquire(timeout=CHAT_QUEUE_TIMEOUT):
+                return busy_response()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                CHAT_SLOTS.release()
+    return wrapper
 
 def traditional_baseline_response(query):
     return "For information about this topic, please consult your healthcare provider or oncologist."
@@ -135,65 +385,416 @@ def traditional_baseline_response(query):
 def index():
     return render_template("index.html")
 
+@app.errorhandler(SessionError)
+@app.errorhandler(PatientError)
+def session_error(error):
+    return jsonify({"error": str(error)}), 400
+
+@app.errorhandler(UnknownSessionError)
+def unknown_session(error):
+    response = jsonify({"error": str(error)})
+    response.status_code = 404
+    response.delete_cookie(SESSION_COOKIE)
+    return response
+
+def request_session():
+    """The session named by the session cookie or the X-Session-Id header, or None. Ids are never read from
+    URLs or bodies, nor written into them, so they stay out of logs, shared caches and page scripts."""
+    return resolve(SESSIONS, request.cookies.get(SESSION_COOKIE) or request.headers.get("X-Session-Id"))
+
+@app.route("/api/session", methods=["POST"])
+def create_session():
+    session = Session(new_session_id())
+    session.remember(validate_patient(request.get_json(silent=True) or {}))
+    SESSIONS.save(session)
+    response = jsonify(session.to_dict())
+    response.status_code = 201
+    response.set_cookie(SESSION_COOKIE, session.id, max_age=int(SESSION_TTL), httponly=True, samesite="Lax",
+                        secure=request.is_secure)
+    return response
+
+@app.route("/api/session", methods=["GET", "DELETE"])
+def session_state():
+    session = request_session()
+    if session is None:
+        return jsonify({"error": "No session; start one with POST /api/session"}), 400
+    if request.method == "DELETE":
+        SESSIONS.delete(session.id)
+        response = app.response_class(status=204)
+        response.delete_cookie(SESSION_COOKIE)
+        return response
+    return jsonify(session.to_dict())
+
+def wants_event_stream(data):
+    """`"stream": true` (the JSON boolean, not "false" or 0) or an Accept header preferring text/event-stream."""
+    return data.get("stream") is True or request.accept_mimetypes.best_match(
+        ["application/json", "text/event-stream"]) == "text/event-stream"
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def event_stream(sections, system_type):
+    def generate():
+        for name, text in sections:
+            yield sse_event("section", {"name": name, "text": text})
+        yield sse_event("done", {"timestamp": datetime.now().isoformat(), "system_type": system_type})
+    
+    # the sections never touch the request, and an async view's context cannot wrap the generator
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route("/api/chat", methods=["POST"])
-def chat():
+@limit_concurrency
+async def chat():
     data = request.json
     query = data.get("query", "")
     system_type = data.get("system_type", "ai")
     user_context = data.get("context", {})
+    if user_context:
+        validate_patient(user_context)
+    session = request_session()
+    if session is not None:
+        user_context = session.remember(user_context)
+    
+    if wants_event_stream(data):
+        if system_type == "ai":
+            sections = stream_ai_response(query, user_context, session)
+        else:
+            sections = iter([("baseline", traditional_baseline_response(query))])
+        if session is not None:
+            SESSIONS.save(session)
+        return event_stream(sections, system_type)
     
     if system_type == "ai":
-        response = generate_ai_response(query, user_context)
+        response = await generate_ai_response_async(query, user_context, session)
     else:
         response = traditional_baseline_response(query)
     
-    return jsonify({
+    result = {
         "response": response,
         "timestamp": datetime.now().isoformat(),
         "system_type": system_type
-    })
+    }
+    if session is not None:
+        SESSIONS.save(session)
+    return jsonify(result)
+
+@app.route("/api/search", methods=["GET"])
+def search():
+    query = request.args.get("q", "")
+    mode = request.args.get("mode", "bm25").lower()
+    try:
+        k = min(max(int(request.args.get("k", 5)), 1), 50)
+    except ValueError:
+        return jsonify({"error": "k must be an integer"}), 400
+    if mode not in ("bm25", "dense", "semantic"):
+        return jsonify({"error": "mode must be 'bm25', 'dense' or 'semantic'"}), 400
+    
+    kb = KNOWLEDGE.current()
+    encoder = ENCODER.get()
+    if mode == "semantic" and not encoder.semantic:
+        return jsonify({"error": f"mode=semantic needs a sentence-transformers model, but the encoder is "
+                                 f"{encoder.name}; use mode=dense for its fuzzy vector search"}), 400
+    if mode == "bm25":
+        hits = kb.retrieval_index.search(query, k=k)
+    else:
+        vector = embed_query(query)
+        with METRICS.stage("semantic"):
+            hits = kb.semantic_index.search(vector, k=k)
+    result = {
+        "query": query,
+        "mode": mode,
+        "results": [{**passage, "score": round(score, 4)} for passage, score in hits]
+    }
+    if mode != "bm25":
+        result["encoder"] = encoder.name
+    return jsonify(result)
 
-@app.route("/api/process-navigation", methods=["POST"])
+@app.route("/api/process-navigation", methods=["GET", "POST"])
 def process_navigation():
-    data = request.json
-    stage = data.get("stage", "diagnosis")
+    data = request.json if request.method == "POST" else request.args
+    session = request_session()
+    stage = data.get("stage") or (session.stage if session else "diagnosis")
+    with_resources = str(data.get("resources", True)).lower() not in ("0", "false")
     
-    steps = PROCESS_STEPS.get(stage, [])
-    resources = KNOWLEDGE_BASE["macau_resources"]
+    kb = KNOWLEDGE.current()
+    if session is None and stage in kb.process_steps:
+        return kb.static_payloads["navigation", stage, with_resources].response(app, request)
+    steps = kb.process_steps.get(stage, [])
+    resources = kb.knowledge_base["macau_resources"]
     
-    return jsonify({
+    current_step = 1
+    if session is not None:
+        if steps and stage != session.stage:
+            session.stage, session.step = stage, 1
+        step = data.get("step")
+        if isinstance(step, str) and step.isdigit():
+            step = int(step)
+        if steps and isinstance(step, int) and 1 <= step <= len(steps):
+            session.step = step
+        current_step = session.step if stage == session.stage else 1
+        SESSIONS.save(session)
+    
+    result = {
         "stage": stage,
         "steps": steps,
         "resources": resources,
-        "current_step": 1
-    })
+        "current_step": current_step
+    }
+    if not with_resources:
+        del result["resources"]
+    return jsonify(result)
+
+@app.route("/api/resources", methods=["GET"])
+def macau_resources():
+    return KNOWLEDGE.current().static_payloads["resources"].response(app, request)
+
+def risk_result(rules, registry):
+    return {
+        "alerts": [rule["alert"] for rule in rules],
+        "risk_level": "high" if len(rules) > 0 else "normal",
+        "registry": registry,
+        "registry_summary": describe_registry_risk(registry)
+    }
+
+def evaluate_risk(patient, kb=None):
+    kb = kb or KNOWLEDGE.current()
+    gender, cancer_type = normalize_label(patient.get("gender")), normalize_label(patient.get("cancer_type"))
+    with METRICS.stage("rules"):
+        rules = kb.risk_index.evaluate(patient.get("age", 0), gender, cancer_type)
+    return risk_result(rules, RISK_STATS.get().lookup(cancer_type, gender, patient.get("age")))
+
+def evaluate_risk_batch(patients, kb):
+    """evaluate_risk for a list of valid patients: the rules of all of them come from one
+    RiskIndex.evaluate_many call, and each distinct (site, sex, age band) is looked up once."""
+    genders = [normalize_label(patient.get("gender")) for patient in patients]
+    cancer_types = [normalize_label(patient.get("cancer_type")) for patient in patients]
+    with METRICS.stage("rules"):
+        matched = kb.risk_index.evaluate_many([patient.get("age", 0) for patient in patients], genders,
+                                              cancer_types)
+    stats, registry, results = RISK_STATS.get(), {}, []
+    for patient, rules, gender, cancer_type in zip(patients, matched, genders, cancer_types):
+        key = (cancer_type, gender, stats.band_for_age(patient.get("age")))
+        if key not in registry:
+            registry[key] = stats.lookup(cancer_type, gender, patient.get("age"))
+        results.append(risk_result(rules, registry[key]))
+    return results
+
+def iter_ndjson(stream):
+    for line in io.TextIOWrapper(stream, encoding="utf-8"):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+def batch_patients():
+    """The patient records of a batch request. Streamed CSV/NDJSON records are checked one by one as they
+    are scored; a JSON body is checked as a whole before the response starts."""
+    if "file" in request.files:
+        return csv.DictReader(io.TextIOWrapper(request.files["file"].stream, encoding="utf-8-sig"))
+    if request.mimetype == "text/csv":
+        return csv.DictReader(io.TextIOWrapper(request.stream, encoding="utf-8-sig"))
+    if request.mimetype == "application/x-ndjson":
+        return iter_ndjson(request.stream)
+    data = request.get_json(silent=True)
+    patients = data.get("patients") if isinstance(data, dict) else data
+    if not isinstance(patients, list):
+        raise PatientError('body must be a JSON list of patients or {"patients": [...]}')
+    for index, patient in enumerate(patients):
+        try:
+            validate_patient(patient)
+        except PatientError as error:
+            raise PatientError(f"patients[{index}]: {error}")
+    return patients
 
 @app.route("/api/risk-alert", methods=["POST"])
 def risk_alert():
-    data = request.json
-    age = data.get("age", 0)
-    gender = data.get("gender", "")
-    cancer_type = data.get("cancer_type", "")
+    data = validate_patient(request.json)
+    session = request_session()
+    if session is None:
+        return jsonify(evaluate_risk(data))
+    
+    kb = KNOWLEDGE.current()
+    patient = session.remember(data)
+    risk_key = (kb.digest, patient.get("age", 0), patient.get("gender", ""), patient.get("cancer_type", ""))
+    if session.risk_key != risk_key:
+        session.risk_key, session.risk = risk_key, evaluate_risk(patient, kb)
+    SESSIONS.save(session)
+    return jsonify(session.risk)
+
+@app.route("/api/risk-alert/batch", methods=["POST"])
+def risk_alert_batch():
+    kb = KNOWLEDGE.current()
+    patients = batch_patients()
+    
+    def generate():
+        # score RISK_BATCH_SIZE records at a time; invalid records get their error line in place
+        records = enumerate(patients)
+        while chunk := list(itertools.islice(records, RISK_BATCH_SIZE)):
+            lines, valid = {}, []
+            for index, patient in chunk:
+                try:
+                    valid.append((index, validate_patient(patient)))
+                except PatientError as error:
+                    lines[index] = {"index": index, "error": f"Invalid patient record: {error}"}
+            for (index, patient), result in zip(valid, evaluate_risk_batch([patient for _, patient in valid], kb)):
+                lines[index] = {"index": index, "id": patient.get("id"), **result}
+            for index, _ in chunk:
+                yield json.dumps(lines[index], ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@app.route("/api/stats", methods=["GET"])
+def stats():
+    try:
+        filters, group_by = REGISTRY_STATS.get().normalize(request.args)
+    except StatsQueryError as error:
+        return jsonify({"error": str(error)}), 400
     
-    alerts = []
-    for rule in RISK_RULES:
-        if rule["condition"](age, gender, cancer_type):
-            alerts.append(rule["alert"])
+    response = jsonify(REGISTRY_STATS.get().query(filters, group_by))
+    response.set_etag(REGISTRY_STATS.get().etag(filters, group_by))
+    response.last_modified = REGISTRY_STATS.get().last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response.make_conditional(request)
+
+def registry_chart_params(args):
+    from chart_service import ChartError
+
+    cancer_type = args.get("cancer_type")
+    if not cancer_type:
+        raise ChartError("cancer_type is required")
+    measure = args.get("measure", "new_cases")
+    if measure not in ("new_cases", "deaths"):
+        raise ChartError("measure must be new_cases or deaths")
+    return cancer_type, measure
+
+def chart_data(name, args):
+    from chart_service import ChartError
+
+    if name == "timeline":
+        return timeline_data(KNOWLEDGE.current().process_steps, request_session())
+    if name == "registry-trend":
+        cancer_type, measure = registry_chart_params(args)
+        filters, group_by = REGISTRY_STATS.get().normalize({"source": "top_ten", "measure": measure,
+                                                      "cancer_type": cancer_type, "group_by": "year"})
+        rows = REGISTRY_STATS.get().query(filters, group_by).get("rows", [])
+        if not rows:
+            raise ChartError(f"No registry trend for {cancer_type}")
+        return {"title": f"{cancer_type.replace('_', ' ').title()} in Macau", "measure": measure,
+                "years": [row["year"] for row in rows], "values": [row["value"] for row in rows]}
+    if name == "registry-age":
+        cancer_type, measure = registry_chart_params(args)
+        year = args.get("year") or REGISTRY.get().total(measure, cancer_type)[0]
+        if year is None:
+            raise ChartError(f"No registry data for {cancer_type}")
+        filters, group_by = REGISTRY_STATS.get().normalize({"measure": measure, "cancer_type": cancer_type,
+                                                      "year": str(year), "sex": "male,female",
+                                                      "group_by": "sex,age_group"})
+        values = {(row["sex"], row["age_group"]): row["value"]
+                  for row in REGISTRY_STATS.get().query(filters, group_by).get("rows", [])
+                  if row["age_group"][0].isdigit()}
+        bands = sorted({band for _, band in values}, key=lambda band: int(re.match(r"\d+", band).group()))
+        if not bands:
+            raise ChartError(f"No registry data for {cancer_type} in {year}")
+        return {"title": f"{cancer_type.replace('_', ' ').title()} by Age, Macau {year}", "measure": measure,
+                "age_groups": bands,
+                "male": [values.get(("male", band), 0.0) for band in bands],
+                "female": [values.get(("female", band), 0.0) for band in bands]}
+    import generate_all_figures
+
+    return generate_all_figures.FIGURES[int(name[len("figure"):])].data()
+
+@app.route("/api/charts/<name>", methods=["GET"])
+def chart(name):
+    from chart_service import CHARTS, FORMATS, ChartError
+
+    if name not in CHARTS:
+        return jsonify({"error": f"Unknown chart: {name}", "charts": sorted(CHARTS)}), 404
+    try:
+        charts = CHART_SERVICE.get()
+        fmt, dpi = charts.options(request.args)
+        body, key = charts.render(name, chart_data(name, request.args), fmt, dpi)
+    except (ChartError, StatsQueryError) as error:
+        return jsonify({"error": str(error)}), 400
+    except TimeoutError:
+        return jsonify({"error": "Chart rendering timed out"}), 503
     
+    response = Response(body, mimetype=FORMATS[fmt])
+    response.set_etag(key)
+    if name == "timeline":
+        # drawn from the caller's session, so only the caller may cache it, and must revalidate
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.vary.update(("Cookie", "X-Session-Id"))
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = 86400
+    return response.make_conditional(request)
+
+@app.route("/api/cache-stats", methods=["GET"])
+def cache_stats():
     return jsonify({
-        "alerts": alerts,
-        "risk_level": "high" if len(alerts) > 0 else "normal"
+        "response_cache": RESPONSE_CACHE.stats(),
+        "stats_cache": REGISTRY_STATS.get().cache.stats(),
+        "chart_cache": CHART_SERVICE.get().stats() if CHART_SERVICE.ready else None,
+        "ocr_cache": OCR_SERVICE.stats(),
+        "speech": SPEECH.stats(),
+        "sessions": SESSIONS.stats(),
+        "query_vectors": {"encoder": ENCODER.get().name, **QUERY_VECTORS.stats(),
+                          "batching": EMBEDDER.stats() if ENCODER.get().batched else None}
     })
 
+@app.route("/api/ready", methods=["GET"])
+def readiness():
+    COMPONENTS.warmup()
+    report = COMPONENTS.report()
+    response = jsonify(report)
+    if not report["ready"]:
+        response.status_code = 503
+        response.headers["Retry-After"] = "1"
+    return response
+
+@app.route("/api/knowledge", methods=["GET"])
+def knowledge_info():
+    KNOWLEDGE.current()
+    return jsonify(KNOWLEDGE.info())
+
 @app.route("/api/multimodal/voice", methods=["POST"])
+@limit_concurrency
 def voice_processing():
-    data = request.json
-    audio_data = data.get("audio", "")
-    language = data.get("language", "en")
-    recognized_text = "How to manage chemotherapy side effects?"
-    
-    response = generate_ai_response(recognized_text)
-    
+    data = (request.json or {}) if request.is_json else {}
+    session = request_session()
+    try:
+        if request.is_json:
+            language = data.get("language", "en")
+            recognized_text = data.get("text")
+            if not recognized_text:
+                with METRICS.stage("asr"):
+                    recognized_text = SPEECH.recognize(split_chunks(decode_audio(data.get("audio"))), language,
+                                                       data.get("sample_rate"))
+        else:
+            language = request.args.get("language", "en")
+            rate = request.args.get("rate") or request.mimetype_params.get("rate")
+            with METRICS.stage("asr"):
+                recognized_text = SPEECH.recognize(iter(lambda: request.stream.read(CHUNK_BYTES), b""), language,
+                                                   int(rate) if rate and rate.isdigit() else None)
+    except ASRError as error:
+        return jsonify({"error": str(error)}), 400
+    except ASRUnavailable as error:
+        return jsonify({"error": str(error)}), 503
+    except (ASRBusy, TimeoutError):
+        return busy_response()
+
+    if recognized_text:
+        response = generate_ai_response(recognized_text, session.remember({}) if session else None, session)
+    else:
+        response = "Sorry, no speech was recognized. Please try again closer to the microphone."
+    if session is not None:
+        SESSIONS.save(session)
+
     return jsonify({
         "recognized_text": recognized_text,
         "response": response,
@@ -202,27 +803,35 @@ def voice_processing():
 
 @app.route("/api/multimodal/image", methods=["POST"])
 def image_processing():
-    data = request.json
-    image_data = data.get("image", "")
-    ocr_result = {
-        "extracted_text": "WBC: 4.2, Platelets: 180, Hemoglobin: 12.5",
-        "interpretation": "Blood counts within normal range. White blood cell count is normal, platelet count is adequate, and hemoglobin level is within acceptable range."
-    }
-    
-    return jsonify(ocr_result)
+    data = request.json or {}
+    try:
+        with METRICS.stage("ocr"):
+            result = OCR_SERVICE.process(data.get("image"), data.get("text"))
+    except OCRError as error:
+        return jsonify({"error": str(error)}), 400
+    except OCRUnavailable as error:
+        return jsonify({"error": str(error)}), 503
+    except (OCRBusy, TimeoutError):
+        return busy_response()
+    return jsonify(result)
 
 @app.route("/api/timeline", methods=["GET"])
 def timeline():
-    return jsonify({
-        "stages": [
-            {"name": "Diagnosis", "steps": PROCESS_STEPS["diagnosis"], "color": "#4A90E2"},
-            {"name": "Treatment", "steps": PROCESS_STEPS["treatment"], "color": "#4CAF50"},
-            {"name": "Follow-up", "steps": PROCESS_STEPS["followup"], "color": "#FF9800"}
-        ],
-        "current_stage": "Treatment",
-        "current_step": 2
-    })
+    session = request_session()
+    kb = KNOWLEDGE.current()
+    if session is None:
+        return kb.static_payloads["timeline"].response(app, request)
+    return jsonify({**timeline_data(kb.process_steps, session), "chart_url": "/api/charts/timeline"})
+
+COMPONENTS.mark_imported()
+if os.environ.get("WARMUP", "1") != "0" and not (__name__ == "__main__" and "--prepare" in sys.argv):
+    COMPONENTS.warmup()
 
 if __name__ == '__main__':
+    if "--prepare" in sys.argv:
+        # build every component once so the on-disk caches are warm for the next start, e.g. in an image build
+        report = COMPONENTS.warm()
+        print(format_report(report), file=sys.stderr)
+        sys.exit(0 if report["ready"] else 1)
     app.run(debug=True, host='0.0.0.0', port=5000)
 
@@ -0,0 +1,61 @@
+"""
+ASGI entry point.
+
+    SESSION_REDIS_URL=redis://localhost:6379/0 uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 4
+
+Several workers need SESSION_REDIS_URL, because the default session store is
+private to each process.
+
+asgiref's stock WsgiToAsgi runs every request on one shared thread
+(`thread_sensitive=True`), so a slow request holds up every other request in
+the process. Here each request runs on a thread from a pool of ASGI_THREADS
+(default 64), so requests overlap up to the pool size. Flask hands the async
+/api/chat view back to the server's event loop, where it awaits its lookups
+on LOOKUP_POOL. Admission is still capped by CHAT_CONCURRENCY (see README).
+
+Moving the request off the shared thread needs the undecorated WSGI runner
+behind asgiref's `@sync_to_async run_wsgi_app`. That is an asgiref
+internal, so requirements.txt caps asgiref at the tested releases, and this
+module refuses to import if a release wraps the runner differently.
+"""
+
+import inspect
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import SyncToAsync, sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+from app import app
+
+REQUEST_POOL = ThreadPoolExecutor(max_workers=int(os.environ.get("ASGI_THREADS", 64)),
+                                  thread_name_prefix="asgi")
+
+
+def wsgi_runner():
+    """The plain function that asgiref's WsgiToAsgiInstance.run_wsgi_app wraps in sync_to_async."""
+    wrapped = vars(WsgiToAsgiInstance).get("run_wsgi_app")
+    run = getattr(wrapped, "func", None) if isinstance(wrapped, SyncToAsync) else None
+    if not inspect.isfunction(run) or inspect.iscoroutinefunction(run):
+        raise ImportError("asgi.py: unsupported asgiref release; WsgiToAsgiInstance.run_wsgi_app is no longer "
+                          "a sync_to_async-wrapped function (see the asgiref pin in requirements.txt)")
+    return run
+
+
+RUN_WSGI_APP = wsgi_runner()
+
+
+class ThreadedWsgiToAsgiInstance(WsgiToAsgiInstance):
+    async def run_wsgi_app(self, body):
+        # the undecorated WSGI runner, moved off the shared thread onto the request pool
+        await sync_to_async(RUN_WSGI_APP, thread_sensitive=False, executor=REQUEST_POOL)(self, body)
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await ThreadedWsgiToAsgiInstance(self.wsgi_application, self.duplicate_header_limit)(
+            scope, receive, send
+        )
+
+
+application = ThreadedWsgiToAsgi(app)
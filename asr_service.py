@@ -0,0 +1,234 @@
+"""
+Offline speech recognition for /api/multimodal/voice.
+
+Audio is recognized with a local Vosk model: one model directory per
+language under ASR_MODEL_DIR (default models/vosk/<language>), each loaded
+once per process and shared by all recognizer threads. A requested language
+must be a code such as "en" or "zh-cn" and name one of those directories. A request streams
+its audio into a bounded queue, and a recognizer thread drains that queue,
+so recognition starts with the first chunk instead of after the whole clip
+has arrived. Vosk releases the GIL while decoding, and a slow recognizer
+throttles the upload through the full queue.
+
+Accepted audio is 16-bit mono PCM, either as a WAV file or as raw samples
+with the rate given by the client (audio/l16;rate=16000). vosk is optional:
+without it, or without a model for the language, recognition raises
+ASRUnavailable.
+"""
+
+import base64
+import binascii
+import importlib.util
+import itertools
+import json
+import os
+import queue
+import re
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+MODEL_DIR = Path(os.environ.get("ASR_MODEL_DIR", Path(__file__).resolve().parent / "models" / "vosk"))
+DEFAULT_SAMPLE_RATE = 16000
+MAX_SECONDS = 120
+CHUNK_BYTES = 8192
+
+LANGUAGE = re.compile(r"[a-z]{2}(?:-[a-z]{2})?")
+
+_CJK_GAP = re.compile(r"(?<=[\u3400-\u9fff\uf900-\ufaff]) (?=[\u3400-\u9fff\uf900-\ufaff])")
+
+
+class ASRError(ValueError):
+    pass
+
+
+class ASRUnavailable(RuntimeError):
+    pass
+
+
+class ASRBusy(RuntimeError):
+    pass
+
+
+def vosk_available():
+    return importlib.util.find_spec("vosk") is not None
+
+
+def normalize_language(language):
+    """Return the lower-cased language code, or raise ASRError before it can reach a path."""
+    code = language.strip().lower() if isinstance(language, str) else None
+    if not code or not LANGUAGE.fullmatch(code):
+        raise ASRError("language must be a code like 'en' or 'zh-cn'")
+    return code
+
+
+def decode_audio(data):
+    if not isinstance(data, str) or not data.strip():
+        raise ASRError("audio must be a non-empty base64 string")
+    if data.startswith("data:"):
+        data = data.partition(",")[2]
+    try:
+        return base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        raise ASRError("audio is not valid base64")
+
+
+def split_chunks(data, size=CHUNK_BYTES):
+    return (data[start:start + size] for start in range(0, len(data), size))
+
+
+def parse_wav_header(buffer):
+    """Return (sample rate, offset of the PCM data), or None if more bytes are needed."""
+    if len(buffer) < 12:
+        return None
+    if buffer[:4] != b"RIFF" or buffer[8:12] != b"WAVE":
+        raise ASRError("audio is not a WAV file")
+    offset, rate = 12, None
+    while offset + 8 <= len(buffer):
+        chunk_id, size = buffer[offset:offset + 4], struct.unpack("<I", buffer[offset + 4:offset + 8])[0]
+        body = offset + 8
+        if chunk_id == b"data":
+            if rate is None:
+                raise ASRError("WAV data chunk precedes its format chunk")
+            return rate, body
+        if chunk_id == b"fmt ":
+            if body + 16 > len(buffer):
+                return None
+            audio_format, channels, rate, _, _, bits = struct.unpack("<HHIIHH", buffer[body:body + 16])
+            if audio_format != 1 or channels != 1 or bits != 16:
+                raise ASRError("WAV audio must be 16-bit mono PCM")
+        offset = body + size + (size & 1)
+    return None
+
+
+def normalize_transcript(text):
+    return _CJK_GAP.sub("", text).strip()
+
+
+class SpeechRecognizer:
+    def __init__(self, model_dir=MODEL_DIR, workers=2, timeout=30, queue_chunks=32):
+        self.model_dir = Path(model_dir)
+        self.workers = workers
+        self.timeout = timeout
+        self.queue_chunks = queue_chunks
+        self.recognitions = 0
+        self._models = {}
+        self._slots = threading.BoundedSemaphore(workers)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asr")
+        self._lock = threading.Lock()
+
+    def languages(self):
+        """Languages with a model directory under model_dir; only these names are ever joined to the path."""
+        try:
+            return {entry.name for entry in os.scandir(self.model_dir)
+                    if LANGUAGE.fullmatch(entry.name) and entry.is_dir()}
+        except OSError:
+            return set()
+
+    def available(self, language):
+        return vosk_available() and normalize_language(language) in self.languages()
+
+    def _model(self, language):
+        with self._lock:
+            model = self._models.get(language)
+            if model is None:
+                import vosk
+
+                vosk.SetLogLevel(-1)
+                model = self._models[language] = vosk.Model(str(self.model_dir / language))
+            return model
+
+    def preload(self, languages):
+        """Load the models of the given languages ahead of the first request; returns those that loaded."""
+        loaded = [normalize_language(language) for language in languages if self.available(language)]
+        for language in loaded:
+            self._model(language)
+        return loaded
+
+    def _recognize(self, language, sample_rate, chunks):
+        import vosk
+
+        recognizer = vosk.KaldiRecognizer(self._model(language), sample_rate)
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                return normalize_transcript(json.loads(recognizer.FinalResult()).get("text", ""))
+            recognizer.AcceptWaveform(chunk)
+
+    def _feed(self, chunks, chunk, future, deadline):
+        while True:
+            if future.done():
+                future.result()
+                raise ASRError("recognizer stopped before the audio ended")
+            if time.monotonic() > deadline:
+                raise TimeoutError("speech recognition timed out")
+            try:
+                chunks.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    @staticmethod
+    def _abort(chunks):
+        while True:
+            try:
+                chunks.get_nowait()
+            except queue.Empty:
+                break
+        chunks.put_nowait(None)
+
+    @staticmethod
+    def _read_header(stream, sample_rate):
+        """Return (sample rate, first PCM bytes) once the start of the stream identifies the format."""
+        buffer = b""
+        for chunk in stream:
+            buffer += chunk
+            if len(buffer) < 4:
+                continue
+            if not buffer.startswith(b"RIFF"):
+                return sample_rate or DEFAULT_SAMPLE_RATE, buffer
+            header = parse_wav_header(buffer)
+            if header:
+                return header[0], buffer[header[1]:]
+            if len(buffer) > 65536:
+                raise ASRError("WAV header has no data chunk")
+        raise ASRError("audio is empty or truncated")
+
+    def recognize(self, stream, language="en", sample_rate=None):
+        """Transcribe an iterable of audio byte chunks (WAV, or raw PCM at sample_rate)."""
+        language = normalize_language(language)
+        if not self.available(language):
+            raise ASRUnavailable(f"No speech model installed for '{language}'")
+        if not self._slots.acquire(blocking=False):
+            raise ASRBusy("All speech recognizers are busy")
+        try:
+            stream = iter(stream)
+            rate, first = self._read_header(stream, sample_rate)
+            if not isinstance(rate, int) or not 8000 <= rate <= 48000:
+                raise ASRError("sample rate must be between 8000 and 48000 Hz")
+            chunks = queue.Queue(maxsize=self.queue_chunks)
+            future = self._pool.submit(self._recognize, language, rate, chunks)
+            deadline = time.monotonic() + self.timeout
+            limit, received = rate * 2 * MAX_SECONDS, 0
+            try:
+                for chunk in itertools.chain([first], stream):
+                    received += len(chunk)
+                    if received > limit:
+                        raise ASRError(f"audio is longer than {MAX_SECONDS} seconds")
+                    if chunk:
+                        self._feed(chunks, chunk, future, deadline)
+                self._feed(chunks, None, future, deadline)
+            except BaseException:
+                if not future.done():
+                    self._abort(chunks)
+                raise
+            text = future.result(timeout=max(deadline - time.monotonic(), 0))
+            self.recognitions += 1
+            return text
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        return {"models_loaded": sorted(self._models), "recognitions": self.recognitions, "workers": self.workers}
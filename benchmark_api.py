@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+API 延迟基准测试
+
+以真实查询语料（英文/中文/葡文，覆盖各癌种）驱动主要接口，统计吞吐量与
+p50/p95/p99 延迟，结果保存为 JSON，可与上一次（如上一个提交）的结果对比，
+在部署前发现热点路径变慢。
+
+两种运行方式：
+    client  Flask test client，进程内顺序请求（不含网络开销，衡量处理逻辑本身）
+    server  在本地启动多线程 werkzeug 服务器，按 --concurrency 并发发送真实 HTTP 请求
+            （或用 --url 指向已运行的服务）
+
+用法：
+    python benchmark_api.py [--mode client|server|both] [--requests 500] [--concurrency 8]
+                            [--only chat,risk_alert] [--output bench.json]
+                            [--compare baseline.json] [--threshold 0.10]
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import logging
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import numpy as np
+
+# 查询语料：各癌种 × 副作用/治疗 × 多语言，另含无癌种关键词的开放问题（走检索路径）
+QUERIES = [
+    "What are the side effects of breast cancer chemotherapy?",
+    "How is breast cancer treated?",
+    "乳腺癌化疗有什么副作用？",
+    "乳癌的治療方法有哪些？",
+    "Quais são os efeitos secundários do cancro da mama?",
+    "What are lung cancer side effects?",
+    "Treatment options for lung cancer",
+    "肺癌治疗方案",
+    "肺癌放疗的不良反应",
+    "Tratamento do cancro do pulmão",
+    "Colorectal cancer therapy after surgery",
+    "colon cancer side effect management",
+    "结直肠癌的治疗",
+    "大腸癌副作用",
+    "efeitos colaterais do cancro colorretal",
+    "Is liver cancer treatment painful?",
+    "肝癌治療",
+    "How do I manage nausea after chemotherapy?",
+    "hair loss after treatment",
+    "Tingling in hands and feet",
+    "What diet helps with diarrhea?",
+    "immunotherapy PD-1",
+    "化疗后很累怎么办",
+    "Where can I get support in Macau?"
+]
+
+CONTEXTS = [
+    {},
+    {"age": 55, "gender": "female"},
+    {"age": 65, "gender": "male"},
+    {"age": 78, "gender": "female"}
+]
+
+PATIENTS = [
+    {"age": age, "gender": gender, "cancer_type": cancer_type}
+    for age, gender, cancer_type in itertools.product(
+        [35, 52, 61, 74], ["male", "female"],
+        ["lung_cancer", "breast_cancer", "colorectal_cancer", "liver_cancer", "prostate_cancer", ""])
+]
+
+STAGES = ["diagnosis", "treatment", "followup"]
+
+# 化验单文本（image 场景直接提交已识别文本，测量解析与解读路径，不依赖 Tesseract）
+LAB_REPORTS = [
+    "WBC: 4.2 x10^9/L  Platelets: 180  Hemoglobin: 12.5 g/dL",
+    "白细胞 2.1  中性粒细胞 0.9  血小板 85  血红蛋白 9.8",
+    "WBC 11.3\nRBC 4.6\nHGB 13.1\nPLT 420\nALT 88 U/L\nAST 61 U/L\nCreatinine 1.6 mg/dL",
+    "白血球 5.6  紅血球 4.2  血紅蛋白 11.2  血小板 160  肌酐 0.9"
+]
+
+
+def _cycle(items):
+    iterator = itertools.cycle(items)
+    return lambda: next(iterator)
+
+
+def build_scenarios():
+    """场景：(名称, 方法, 路径, 请求体生成函数, 额外请求头)。"""
+    chat = _cycle([(query, context) for query in QUERIES for context in CONTEXTS])
+    patient = _cycle(PATIENTS)
+    stage = _cycle(STAGES)
+    voice_language = _cycle(["en", "zh", "yue"])
+    lab_report = _cycle(LAB_REPORTS)
+
+    def chat_body(stream=False):
+        query, context = chat()
+        body = {"query": query, "system_type": "ai", "context": context}
+        if stream:
+            body["stream"] = True
+        return body
+
+    return {
+        "chat": ("POST", "/api/chat", chat_body, {}),
+        "chat_stream": ("POST", "/api/chat", lambda: chat_body(stream=True), {"Accept": "text/event-stream"}),
+        "chat_traditional": ("POST", "/api/chat", lambda: {"query": chat()[0], "system_type": "traditional"}, {}),
+        "risk_alert": ("POST", "/api/risk-alert", patient, {}),
+        "risk_alert_batch": ("POST", "/api/risk-alert/batch", lambda: {"patients": PATIENTS}, {}),
+        "process_navigation": ("POST", "/api/process-navigation", lambda: {"stage": stage()}, {}),
+        "timeline": ("GET", "/api/timeline", None, {}),
+        "stats": ("GET", "/api/stats?cancer_type=lung_cancer,breast_cancer&group_by=cancer_type,sex", None, {}),
+        "voice": ("POST", "/api/multimodal/voice", lambda: {"text": chat()[0], "language": voice_language()}, {}),
+        "image": ("POST", "/api/multimodal/image", lambda: {"text": lab_report()}, {})
+    }
+
+
+def summarize(latencies, errors, wall_seconds):
+    latencies = np.asarray(latencies, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0.0, 0.0, 0.0)
+    return {
+        "requests": int(len(latencies)),
+        "errors": int(errors),
+        "throughput_rps": round(len(latencies) / wall_seconds, 1) if wall_seconds else 0.0,
+        "mean_ms": round(float(latencies.mean()), 3) if len(latencies) else 0.0,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(latencies.max()), 3) if len(latencies) else 0.0
+    }
+
+
+def run_client(app, scenario, requests, warmup):
+    method, path, body, headers = scenario
+    client = app.test_client()
+
+    def call():
+        kwargs = {"headers": headers}
+        if body is not None:
+            kwargs["json"] = body()
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()
+        return response.status_code
+
+    for _ in range(warmup):
+        call()
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        request_started = time.perf_counter()
+        status = call()
+        latencies.append(time.perf_counter() - request_started)
+        errors += status >= 400
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def run_http(base_url, scenario, requests, warmup, concurrency):
+    method, path, body, headers = scenario
+    target = urlsplit(base_url)
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            payload = json.dumps(body(), ensure_ascii=False).encode() if body is not None else None
+        request_headers = {"Content-Type": "application/json", **headers} if payload is not None else dict(headers)
+        connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+        request_started = time.perf_counter()
+        try:
+            connection.request(method, path, body=payload, headers=request_headers)
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except OSError:
+            status = 599
+        finally:
+            connection.close()
+        return time.perf_counter() - request_started, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: call(), range(warmup)))
+        started = time.perf_counter()
+        results = list(pool.map(lambda _: call(), range(requests)))
+        wall = time.perf_counter() - started
+    return summarize([latency for latency, _ in results], sum(status >= 400 for _, status in results), wall)
+
+
+def start_local_server(app):
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, threshold):
+    """返回回归列表：p50 或 p95 比基线慢超过 threshold 的 (模式, 场景, 指标, 基线, 当前)。"""
+    regressions = []
+    for mode, scenarios in current["results"].items():
+        for name, result in scenarios.items():
+            base = baseline.get("results", {}).get(mode, {}).get(name)
+            if not base:
+                continue
+            for metric in ("p50_ms", "p95_ms"):
+                if base[metric] and result[metric] > base[metric] * (1 + threshold):
+                    regressions.append((mode, name, metric, base[metric], result[metric]))
+    return regressions
+
+
+def print_results(report, baseline=None):
+    for mode, scenarios in report["results"].items():
+        print(f"\n【{mode} 模式】")
+        print(f"{'场景':<20s} {'请求':>6s} {'错误':>5s} {'吞吐(rps)':>10s} {'p50(ms)':>9s} {'p95(ms)':>9s} "
+              f"{'p99(ms)':>9s}" + ("  p50 对比基线" if baseline else ""))
+        print("-" * (80 if not baseline else 96))
+        for name, result in scenarios.items():
+            line = (f"{name:<20s} {result['requests']:>6d} {result['errors']:>5d} {result['throughput_rps']:>10.1f} "
+                    f"{result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f} {result['p99_ms']:>9.3f}")
+            base = (baseline or {}).get("results", {}).get(mode, {}).get(name)
+            if base and base["p50_ms"]:
+                line += f"  {(result['p50_ms'] / base['p50_ms'] - 1) * 100:+7.1f}%"
+            print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API 延迟基准测试")
+    parser.add_argument("--mode", default="both", choices=["client", "server", "both"], help="运行方式")
+    parser.add_argument("--requests", type=int, default=300, help="每个场景的请求数")
+    parser.add_argument("--warmup", type=int, default=20, help="每个场景的预热请求数")
+    parser.add_argument("--concurrency", type=int, default=8, help="server 模式的并发数")
+    parser.add_argument("--url", help="对已运行的服务测试（如 http://127.0.0.1:5000），不启动本地服务器")
+    parser.add_argument("--only", help="只运行指定场景，逗号分隔")
+    parser.add_argument("--output", help="将结果写入 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的 JSON 结果对比")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p50/p95 变慢超过该比例视为回归")
+    args = parser.parse_args()
+
+    from app import app
+
+    scenarios = build_scenarios()
+    if args.only:
+        unknown = set(args.only.split(",")) - set(scenarios)
+        if unknown:
+            parser.error(f"未知场景: {', '.join(sorted(unknown))}（可选: {', '.join(scenarios)}）")
+        scenarios = {name: scenarios[name] for name in args.only.split(",")}
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "queries": len(QUERIES)
+        },
+        "results": {}
+    }
+
+    print("=" * 60)
+    print(f"API 基准测试（提交 {report['meta']['commit']}，每场景 {args.requests} 次请求）")
+    print("=" * 60)
+
+    if args.mode in ("client", "both"):
+        report["results"]["client"] = {name: run_client(app, scenario, args.requests, args.warmup)
+                                       for name, scenario in scenarios.items()}
+    if args.mode in ("server", "both"):
+        server, base_url = (None, args.url) if args.url else start_local_server(app)
+        try:
+            report["results"]["server"] = {
+                name: run_http(base_url, scenario, args.requests, args.warmup, args.concurrency)
+                for name, scenario in scenarios.items()
+            }
+        finally:
+            if server:
+                server.shutdown()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+    print_results(report, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {args.output}")
+
+    if baseline:
+        regressions = compare(report, baseline, args.threshold)
+        print(f"\n基线提交: {baseline.get('meta', {}).get('commit')}，阈值 {args.threshold * 100:.0f}%")
+        if regressions:
+            print("⚠️  检测到性能回归：")
+            for mode, name, metric, before, after in regressions:
+                print(f"  - [{mode}] {name} {metric}: {before:.3f} → {after:.3f} ms")
+            sys.exit(1)
+        print("✅ 未检测到性能回归")
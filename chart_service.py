@@ -0,0 +1,201 @@
+"""
+Server-side chart rendering.
+
+Charts are drawn by plain functions that take a JSON-serializable data dict
+and return a matplotlib Figure: the paper figures from generate_all_figures
+plus a few registry and care-pathway charts. Rendering happens in a process
+pool (matplotlib Agg backend), so request threads only wait on a future.
+
+Output is cached by sha256 of (chart name, drawing code including the helpers
+it calls, data, effective matplotlib settings, format, dpi):
+first in memory, then as files under macau_cancer_data/.cache/charts/.
+Identical requests that arrive while a render is in flight share one job.
+"""
+
+import hashlib
+import io
+import json
+import os
+import textwrap
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import generate_all_figures as figures
+from registry_data import CACHE_DIR
+from ttl_cache import TTLCache
+
+CHART_CACHE_DIR = CACHE_DIR / "charts"
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+MIN_DPI, MAX_DPI = 50, 300
+
+
+class ChartError(ValueError):
+    pass
+
+
+def draw_timeline(data):
+    stages = data["stages"]
+    fig, ax = figures.plt.subplots(figsize=(9, 1.2 + 1.3 * len(stages)))
+    for row, stage in enumerate(reversed(stages)):
+        steps = stage["steps"]
+        for column, step in enumerate(steps):
+            current = stage["name"] == data.get("current_stage") and column + 1 == data.get("current_step")
+            ax.scatter(column, row, s=260 if current else 140, color=stage["color"],
+                       edgecolors='#E74C3C' if current else 'white', linewidth=3 if current else 1.5, zorder=3)
+            ax.text(column, row - 0.15, textwrap.fill(step, 18), ha='center', va='top', fontsize=7)
+        ax.plot([0, len(steps) - 1], [row, row], color=stage["color"], linewidth=3, alpha=0.5, zorder=2)
+    ax.set_yticks(range(len(stages)))
+    ax.set_yticklabels([stage["name"] for stage in reversed(stages)], fontsize=11, fontweight='bold')
+    ax.set_xticks([])
+    ax.set_ylim(-0.8, len(stages) - 0.6)
+    ax.set_title('Cancer Care Pathway', fontsize=13, fontweight='bold')
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+    fig.tight_layout()
+    return fig
+
+
+def draw_registry_trend(data):
+    fig, ax = figures.plt.subplots(figsize=(6, 3.5))
+    ax.plot(data["years"], data["values"], 'o-', color='#2E5090', linewidth=2.5, markersize=7)
+    for year, value in zip(data["years"], data["values"]):
+        ax.text(year, value, f'{value:.0f}', ha='center', va='bottom', fontsize=9)
+    ax.set_xticks(data["years"])
+    ax.set_xlabel('Year', fontsize=11, fontweight='bold')
+    ax.set_ylabel(data["measure"].replace('_', ' ').capitalize(), fontsize=11, fontweight='bold')
+    ax.set_title(data["title"], fontsize=13, fontweight='bold')
+    ax.grid(alpha=0.3)
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    fig.tight_layout()
+    return fig
+
+
+def draw_registry_age(data):
+    bands = data["age_groups"]
+    x = np.arange(len(bands))
+    fig, ax = figures.plt.subplots(figsize=(7, 3.5))
+    ax.bar(x - 0.2, data["male"], 0.4, label='Male', color='#2E5090', alpha=0.9)
+    ax.bar(x + 0.2, data["female"], 0.4, label='Female', color='#E67E22', alpha=0.9)
+    ax.set_xticks(x)
+    ax.set_xticklabels(bands, rotation=45, ha='right', fontsize=8)
+    ax.set_xlabel('Age group', fontsize=11, fontweight='bold')
+    ax.set_ylabel(data["measure"].replace('_', ' ').capitalize(), fontsize=11, fontweight='bold')
+    ax.set_title(data["title"], fontsize=13, fontweight='bold')
+    ax.legend(fontsize=9)
+    ax.grid(axis='y', alpha=0.3)
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    fig.tight_layout()
+    return fig
+
+
+CHARTS = {
+    "timeline": draw_timeline,
+    "registry-trend": draw_registry_trend,
+    "registry-age": draw_registry_age,
+}
+CHARTS.update({f"figure{number}": figure.draw for number, figure in figures.FIGURES.items()})
+
+
+def render_chart(name, data, fmt, dpi):
+    """Process-pool job: draw one chart and return the encoded bytes."""
+    figures.apply_style(dpi)
+    fig = CHARTS[name](data)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+    figures.plt.close(fig)
+    return buffer.getvalue()
+
+
+class ChartService:
+    def __init__(self, cache_dir=CHART_CACHE_DIR, workers=2, memory_size=256, timeout=60):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.timeout = timeout
+        self.memory = TTLCache(maxsize=memory_size)
+        self.disk_hits = 0
+        self.renders = 0
+        self._code = {name: hashlib.sha256("\n".join(figures.code_sources(draw)).encode()).hexdigest()
+                      for name, draw in CHARTS.items()}
+        self._pool = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def options(self, params):
+        fmt = params.get("format", "png").lower()
+        if fmt not in FORMATS:
+            raise ChartError(f"format must be one of: {', '.join(FORMATS)}")
+        try:
+            dpi = int(params.get("dpi", 150))
+        except ValueError:
+            raise ChartError("dpi must be an integer")
+        return fmt, min(max(dpi, MIN_DPI), MAX_DPI)
+
+    def key(self, name, data, fmt, dpi):
+        payload = json.dumps([name, self._code[name], data, figures.rc_digest(), fmt, dpi], sort_keys=True,
+                             default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def _read_disk(self, path):
+        try:
+            with open(path, "rb") as handle:
+                return handle.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, path, body):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            staging = f"{path}.{os.getpid()}.tmp"
+            with open(staging, "wb") as handle:
+                handle.write(body)
+            os.replace(staging, path)
+        except OSError:
+            pass
+
+    def render(self, name, data, fmt="png", dpi=150):
+        """Return (image bytes, cache key), rendering in the pool on a cache miss."""
+        if name not in CHARTS:
+            raise KeyError(name)
+        key = self.key(name, data, fmt, dpi)
+        body = self.memory.get(key)
+        if body is not None:
+            return body, key
+
+        path = os.path.join(self.cache_dir, f"{key}.{fmt}")
+        body = self._read_disk(path)
+        if body is not None:
+            self.disk_hits += 1
+            self.memory.set(key, body)
+            return body, key
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._executor().submit(render_chart, name, data, fmt, dpi)
+                self._inflight[key] = future
+        try:
+            body = future.result(timeout=self.timeout)
+        finally:
+            if owner:
+                with self._lock:
+                    self._inflight.pop(key, None)
+        if owner:
+            self.renders += 1
+            self._write_disk(path, body)
+            self.memory.set(key, body)
+        return body, key
+
+    def stats(self):
+        return {**self.memory.stats(), "disk_hits": self.disk_hits, "renders": self.renders,
+                "inflight": len(self._inflight), "workers": self.workers}
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+AI 与传统基线回复的离线评估
+
+将大规模查询语料同时送入 generate_ai_response 与 traditional_baseline_response，
+在多个工作进程中并行回放（每个进程导入一次 app，按块处理查询，回复在进程内去重后返回），
+再用 NumPy 对全部回复做向量化统计：
+
+    words            回复长度（英文/葡文按词、中文按字计）
+    section_coverage 回复包含的信息板块占比（指南、登记数据、风险提示、本地资源、多模态）
+    keyword_recall   查询应覆盖的关键词（癌种、意图、Macau）在回复中的召回率
+    topic_hit        回复是否针对查询的癌种（含对应指南原文，无指南的癌种则需提及癌种名称）
+    local_resources  回复是否包含澳门本地医疗资源
+
+默认语料由知识库快照中的癌种/意图同义词与多语言模板组合生成（可用 --queries 指定
+JSONL 或纯文本文件），并带有标准答案（癌种、意图）。结果写入 JSON 文件，
+generate_all_figures.py 的 Figure 7 直接读取其中的回复长度分布。
+
+用法：
+    python evaluate_responses.py [--size 20000] [--workers N] [--chunk 500]
+                                 [--queries queries.jsonl] [--output evaluation_results.json]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from knowledge_store import SNAPSHOT_PATH
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "evaluation_results.json")
+
+# 多语言模板：{cancer} 为癌种同义词，{intent} 为意图同义词
+TEMPLATES = [
+    "{cancer} cancer {intent}",
+    "What should I know about {intent} for {cancer} cancer?",
+    "My mother has {cancer} cancer, what {intent} can she expect?",
+    "{cancer}癌{intent}",
+    "请问{cancer}的{intent}有哪些？",
+    "Informação sobre {intent} do cancro ({cancer})",
+]
+
+# 不含癌种关键词的开放问题（走检索路径），标准答案为空
+OPEN_QUERIES = [
+    "How do I manage nausea after chemotherapy?",
+    "hair loss after treatment",
+    "Tingling in hands and feet",
+    "What diet helps with diarrhea?",
+    "immunotherapy PD-1",
+    "化疗后很累怎么办",
+    "Where can I get support in Macau?",
+]
+
+CONTEXTS = [
+    {},
+    {"age": 55, "gender": "female"},
+    {"age": 65, "gender": "male"},
+    {"age": 78, "gender": "female"},
+]
+
+# 信息板块标记（指南原文没有标记，单独按原文匹配）
+SECTION_MARKERS = ["【Guideline Passages】", "【Macau Registry】", "【Risk Alert】", "【Local Healthcare Resources】",
+                   "【Multimodal Support】"]
+
+_WORD = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]|[^\W_]+(?:['’-][^\W_]+)*")
+
+
+def build_corpus(snapshot, size, seed=42):
+    """按同义词 × 模板 × 用户上下文生成带标准答案的查询，打乱后循环取 size 条。"""
+    items = []
+    for cancer_type, terms in snapshot.get("cancer_synonyms", {}).items():
+        for intent, intent_terms in snapshot.get("intent_synonyms", {}).items():
+            for term, intent_term, template in itertools.product(terms, intent_terms, TEMPLATES):
+                items.append({"query": template.format(cancer=term, intent=intent_term),
+                              "cancer_type": cancer_type, "intent": intent})
+    items.extend({"query": query, "cancer_type": None, "intent": None} for query in OPEN_QUERIES)
+    items = [{**item, "context": context} for item in items for context in CONTEXTS]
+    order = np.random.default_rng(seed).permutation(len(items))
+    return [items[order[index % len(items)]] for index in range(size)]
+
+
+def _label(value):
+    """标准答案统一为小写下划线形式（如 "Lung Cancer" → "lung_cancer"），空值为 None。"""
+    if value is None or value == "":
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"标准答案必须是字符串: {value!r}")
+    return "_".join(value.strip().lower().split()) or None
+
+
+def load_corpus(path):
+    """读取查询文件：JSONL（query, context, cancer_type, intent）或每行一条查询的纯文本。
+
+    格式错误的行报出文件名与行号，而不是在工作进程里才失败。
+    """
+    corpus = []
+    with open(path, encoding="utf-8") as handle:
+        for number, line in enumerate(handle, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line) if line.startswith("{") else {"query": line}
+                if not isinstance(item.get("query"), str) or not item["query"].strip():
+                    raise ValueError("缺少非空字符串 query")
+                context = item.get("context") or {}
+                if not isinstance(context, dict):
+                    raise ValueError("context 必须是 JSON 对象")
+                corpus.append({"query": item["query"], "context": context,
+                               "cancer_type": _label(item.get("cancer_type")), "intent": _label(item.get("intent"))})
+            except ValueError as error:
+                raise ValueError(f"{path}:{number}: {error}") from None
+    return corpus
+
+
+_app = None
+
+
+def replay_chunk(items):
+    """工作进程任务：回放一块查询，返回 (去重后的回复列表, AI 回复下标, 基线回复下标)。"""
+    global _app
+    if _app is None:
+        import app as _app_module
+        _app = _app_module
+    texts, index = [], {}
+    ai, baseline = [], []
+    for item in items:
+        for system, text in ((ai, _app.generate_ai_response(item["query"], dict(item["context"]))),
+                             (baseline, _app.traditional_baseline_response(item["query"]))):
+            if text not in index:
+                index[text] = len(texts)
+                texts.append(text)
+            system.append(index[text])
+    return texts, ai, baseline
+
+
+def replay(corpus, workers=None, chunk=500):
+    """并行回放全部查询，返回 (全局去重回复数组, AI 下标数组, 基线下标数组)。"""
+    texts, index = [], {}
+    ai, baseline = [], []
+    chunks = [corpus[start:start + chunk] for start in range(0, len(corpus), chunk)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk_texts, chunk_ai, chunk_baseline in pool.map(replay_chunk, chunks):
+            for text in chunk_texts:
+                if text not in index:
+                    index[text] = len(texts)
+                    texts.append(text)
+            remap = np.array([index[text] for text in chunk_texts], dtype=np.int64)
+            ai.append(remap[np.asarray(chunk_ai, dtype=np.int64)])
+            baseline.append(remap[np.asarray(chunk_baseline, dtype=np.int64)])
+    return (np.array(texts, dtype=object), np.concatenate(ai) if ai else np.zeros(0, dtype=np.int64),
+            np.concatenate(baseline) if baseline else np.zeros(0, dtype=np.int64))
+
+
+def display_name(cancer_type):
+    return cancer_type.replace("_", " ") if cancer_type else ""
+
+
+def expected_texts(corpus, guidelines):
+    """每条查询的针对性判据：有指南时为指南原文，否则为癌种名称；开放问题为空串（不计入）。"""
+    expected = []
+    for item in corpus:
+        cancer_type, intent = item["cancer_type"], item["intent"]
+        if cancer_type in guidelines:
+            expected.append(guidelines[cancer_type].get(intent or "side_effects", display_name(cancer_type)).lower())
+        else:
+            expected.append(display_name(cancer_type))
+    return np.array(expected, dtype=str)
+
+
+def compute_metrics(texts, response_ids, corpus, guidelines):
+    """对一个系统的全部回复做向量化统计，返回逐条指标数组。"""
+    unique = np.char.lower(texts.astype(str))
+    words = np.fromiter((len(_WORD.findall(text)) for text in texts), dtype=np.int64, count=len(texts))
+    sections = np.stack([np.char.find(texts.astype(str), marker) >= 0 for marker in SECTION_MARKERS], axis=1)
+
+    keywords = sorted({display_name(item["cancer_type"]) for item in corpus if item["cancer_type"]}
+                      | {display_name(item["intent"]) for item in corpus if item["intent"]} | {"macau"})
+    hits = np.char.find(unique[:, None], np.array(keywords, dtype=str)[None, :]) >= 0
+    wanted = np.zeros((len(corpus), len(keywords)), dtype=bool)
+    column = {keyword: number for number, keyword in enumerate(keywords)}
+    for row, item in enumerate(corpus):
+        for keyword in (display_name(item["cancer_type"]), display_name(item["intent"]), "macau"):
+            if keyword:
+                wanted[row, column[keyword]] = True
+
+    # 只对去重后的 (回复, 判据) 组合做子串匹配，再按下标展开到每条查询
+    expected = expected_texts(corpus, guidelines)
+    targets, target_ids = np.unique(expected, return_inverse=True)
+    pairs, pair_ids = np.unique(response_ids * len(targets) + target_ids, return_inverse=True)
+    contains = (np.char.find(unique[pairs // len(targets)], targets[pairs % len(targets)]) >= 0)[pair_ids]
+    has_guideline = np.array([item["cancer_type"] in guidelines for item in corpus])
+    return {
+        "words": words[response_ids],
+        "section_coverage": ((sections[response_ids].sum(axis=1) + (has_guideline & contains))
+                             / (len(SECTION_MARKERS) + 1)),
+        "keyword_recall": (hits[response_ids] & wanted).sum(axis=1) / wanted.sum(axis=1),
+        "topic_hit": np.where(expected != "", contains, np.nan),
+        "local_resources": hits[response_ids][:, column["macau"]].astype(float),
+    }
+
+
+def summarize(metrics):
+    summary = {}
+    for name, values in metrics.items():
+        values = values[~np.isnan(values)] if values.dtype.kind == "f" else values
+        if not len(values):
+            continue
+        p50, p95 = np.percentile(values, [50, 95])
+        summary[name] = {"mean": round(float(values.mean()), 4), "std": round(float(values.std()), 4),
+                         "p50": round(float(p50), 4), "p95": round(float(p95), 4), "n": int(len(values))}
+    return summary
+
+
+def by_cancer_type(metrics, corpus):
+    labels = np.array([item["cancer_type"] or "open_question" for item in corpus])
+    return {label: {name: round(float(np.nanmean(values[labels == label])), 4)
+                    for name, values in metrics.items() if not np.isnan(values[labels == label]).all()}
+            for label in sorted(set(labels))}
+
+
+def evaluate(corpus, snapshot, workers=None, chunk=500):
+    started = time.perf_counter()
+    texts, ai_ids, baseline_ids = replay(corpus, workers, chunk)
+    replay_seconds = time.perf_counter() - started
+    guidelines = snapshot["nccn_guidelines"]
+    systems = {name: compute_metrics(texts, ids, corpus, guidelines)
+               for name, ids in (("ai", ai_ids), ("traditional", baseline_ids))}
+    return {
+        "generated": datetime.now().isoformat(timespec="seconds"),
+        "knowledge_version": snapshot.get("version"),
+        "queries": len(corpus),
+        "unique_responses": len(texts),
+        "replay_seconds": round(replay_seconds, 2),
+        "metrics_seconds": round(time.perf_counter() - started - replay_seconds, 2),
+        "systems": {name: {"summary": summarize(metrics), "by_cancer_type": by_cancer_type(metrics, corpus),
+                           "lengths": metrics["words"].tolist()}
+                    for name, metrics in systems.items()},
+    }
+
+
+def print_report(results):
+    print(f"\n查询数: {results['queries']}  去重回复数: {results['unique_responses']}  "
+          f"回放耗时: {results['replay_seconds']}s  统计耗时: {results['metrics_seconds']}s")
+    names = list(results["systems"]["ai"]["summary"])
+    print(f"\n{'指标':<18}" + "".join(f"{system:>16}" for system in results["systems"]))
+    for name in names:
+        row = "".join(f"{results['systems'][system]['summary'].get(name, {}).get('mean', float('nan')):>16.3f}"
+                      for system in results["systems"])
+        print(f"{name:<18}{row}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AI 与传统基线回复的离线评估")
+    parser.add_argument("--size", type=int, default=20000, help="生成语料的查询条数（--queries 时忽略）")
+    parser.add_argument("--queries", help="查询文件（JSONL 或纯文本）")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数")
+    parser.add_argument("--chunk", type=int, default=500, help="每个任务的查询条数")
+    parser.add_argument("--seed", type=int, default=42, help="语料打乱的随机种子")
+    parser.add_argument("--output", default=RESULTS_PATH, help="结果 JSON 文件")
+    args = parser.parse_args()
+
+    with open(os.environ.get("KNOWLEDGE_SNAPSHOT", SNAPSHOT_PATH), encoding="utf-8") as handle:
+        snapshot = json.load(handle)
+    try:
+        corpus = load_corpus(args.queries) if args.queries else build_corpus(snapshot, args.size, args.seed)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f"=== 评估 {len(corpus)} 条查询 ===")
+
+    results = evaluate(corpus, snapshot, args.workers, args.chunk)
+    print_report(results)
+    with open(args.output + ".tmp", "w", encoding="utf-8") as handle:
+        json.dump(results, handle, ensure_ascii=False)
+    os.replace(args.output + ".tmp", args.output)
+    print(f"\n✅ 结果已保存: {args.output}")
+    print("💡 重新运行 generate_all_figures.py 即可用真实回复长度更新 Figure 7")
@@ -1,276 +1,477 @@
 """
 ICHI 2026 论文图表生成脚本
 生成 Figure 5-9（数据图表）
+
+每张图是一个独立的渲染任务（draw_* 函数返回 Figure），由进程池并行渲染。
+渲染前按 (图表数据 + 生效的 matplotlib 参数 + 输出格式/dpi + 绘图代码) 计算内容哈希，
+与输出目录中的 .figure_cache.json 比对，未变化的图直接跳过。绘图代码包括 draw_* 函数
+及其直接或间接调用的本项目函数和引用的模块常量；图表数据（含 evaluation_results.json
+中的回复长度）整体计入哈希。哈希覆盖不到的输入（如系统字体变化）请用 --force 重新渲染。
+
+用法：
+    python generate_all_figures.py [--format png|svg|pdf] [--dpi 600] [--only 5,7]
+                                   [--output-dir DIR] [--workers N] [--force]
 """
 
+import argparse
+import functools
+import hashlib
+import inspect
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import numpy as np
-import seaborn as sns
-from matplotlib import font_manager
-import os
 
-# 创建输出目录（避免iCloud同步问题）
+# 输出目录（避免iCloud同步问题）
 OUTPUT_DIR = os.path.expanduser("~/Desktop/ICHI_figures")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-print(f"=== 图表保存目录: {OUTPUT_DIR} ===\n")
+CACHE_MANIFEST = ".figure_cache.json"
+
+# 全局样式
+STYLE = {
+    'font.family': 'Arial',
+    'font.size': 11,
+    'savefig.bbox': 'tight',
+    'savefig.facecolor': 'white'
+}
+
+METRICS = ['Accuracy', 'Completeness', 'Safety', 'Usability', 'Satisfaction']
+
+PERFORMANCE = {
+    "metrics": METRICS,
+    "ai_means": [4.16, 4.23, 4.36, 4.00, 4.16],
+    "ai_stds": [0.63, 0.55, 0.51, 0.67, 0.63],
+    "trad_means": [3.00, 2.80, 4.21, 3.09, 3.03],
+    "trad_stds": [0.79, 0.84, 0.53, 0.81, 0.95],
+    "significance": ['***', '***', '**', '***', '***']
+}
+
+EFFECT_SIZES = {
+    "metrics": METRICS,
+    "effect_sizes": [1.63, 2.00, 0.28, 1.22, 1.42],
+    "classifications": ['Very Large\n(Macau knowledge)', 'Very Large\n(Multimodal info)',
+                        'Small\n(Both safe)', 'Large\n(Multimodal UI)', 'Large\n(Local resources)']
+}
+
+# evaluate_responses.py 的评估结果；不存在时 Figure 7 按下列论文参数模拟回复长度分布
+EVALUATION_RESULTS = os.environ.get(
+    "EVALUATION_RESULTS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "evaluation_results.json"))
+
+RESPONSE_LENGTH = {
+    "seed": 42,
+    "ai_mean": 1247, "ai_std": 312,
+    "trad_mean": 80, "trad_std": 25,
+    "samples": 500,
+    "improvement": 15.5,
+    "annotation_y": 1650
+}
+
+
+def response_length_data(path=None):
+    """Figure 7 数据：优先读取评估结果中的真实回复长度，否则按 RESPONSE_LENGTH 模拟。"""
+    path = path or EVALUATION_RESULTS
+    try:
+        return _evaluated_lengths(path, os.path.getmtime(path))
+    except (OSError, ValueError, KeyError):
+        pass
+    rng = np.random.RandomState(RESPONSE_LENGTH["seed"])
+    ai_data = rng.normal(RESPONSE_LENGTH["ai_mean"], RESPONSE_LENGTH["ai_std"], RESPONSE_LENGTH["samples"])
+    trad_data = rng.normal(RESPONSE_LENGTH["trad_mean"], RESPONSE_LENGTH["trad_std"], RESPONSE_LENGTH["samples"])
+    return {"source": "simulated", "ai_lengths": ai_data.tolist(), "trad_lengths": trad_data.tolist(),
+            "ai_mean": RESPONSE_LENGTH["ai_mean"], "trad_mean": RESPONSE_LENGTH["trad_mean"],
+            "improvement": RESPONSE_LENGTH["improvement"], "annotation_y": RESPONSE_LENGTH["annotation_y"]}
+
+
+@functools.lru_cache(maxsize=4)
+def _evaluated_lengths(path, mtime):
+    with open(path, encoding="utf-8") as handle:
+        systems = json.load(handle)["systems"]
+    ai_data = np.asarray(systems["ai"]["lengths"], dtype=float)
+    trad_data = np.asarray(systems["traditional"]["lengths"], dtype=float)
+    ai_mean, trad_mean = float(ai_data.mean()), float(trad_data.mean())
+    return {"source": "evaluation", "ai_lengths": ai_data.tolist(), "trad_lengths": trad_data.tolist(),
+            "ai_mean": ai_mean, "trad_mean": trad_mean, "improvement": ai_mean / trad_mean if trad_mean else 0.0,
+            "annotation_y": (ai_mean + trad_mean) / 2}
 
-# 全局设置
-plt.rcParams['font.family'] = 'Arial'
-plt.rcParams['font.size'] = 11
-plt.rcParams['figure.dpi'] = 600
-plt.rcParams['savefig.dpi'] = 600
-plt.rcParams['savefig.bbox'] = 'tight'
-plt.rcParams['savefig.facecolor'] = 'white'
-
-print("=== 开始生成ICHI 2026论文图表 ===\n")
 
 # === Figure 5: Performance Comparison ===
-print("生成 Figure 5: Performance Comparison...")
-metrics = ['Accuracy', 'Completeness', 'Safety', 'Usability', 'Satisfaction']
-ai_means = [4.16, 4.23, 4.36, 4.00, 4.16]
-ai_stds = [0.63, 0.55, 0.51, 0.67, 0.63]
-trad_means = [3.00, 2.80, 4.21, 3.09, 3.03]
-trad_stds = [0.79, 0.84, 0.53, 0.81, 0.95]
-significance = ['***', '***', '**', '***', '***']
-
-fig, ax = plt.subplots(figsize=(7, 5))
-x = np.arange(len(metrics))
-width = 0.35
-
-bars1 = ax.bar(x - width/2, ai_means, width, yerr=ai_stds, 
-               label='AI Agent (Multimodal + Macau)', color='#2E5090', 
-               capsize=5, alpha=0.9, edgecolor='white', linewidth=1.5)
-bars2 = ax.bar(x + width/2, trad_means, width, yerr=trad_stds,
-               label='Traditional System', color='#95A5A6', 
-               capsize=5, alpha=0.9, edgecolor='white', linewidth=1.5)
-
-# 显著性标记
-for i, sig in enumerate(significance):
-    height = max(ai_means[i] + ai_stds[i], trad_means[i] + trad_stds[i])
-    ax.text(i, height + 0.15, sig, ha='center', va='bottom', 
-            fontsize=14, fontweight='bold', color='#E74C3C')
-
-# 参考线
-ax.axhline(y=4.0, color='#27AE60', linestyle='--', linewidth=1.5, alpha=0.6, 
-           label='Excellence threshold')
-ax.axhline(y=3.0, color='#F39C12', linestyle='--', linewidth=1.5, alpha=0.6, 
-           label='Minimum standard')
-
-ax.set_xlabel('Evaluation Dimensions', fontsize=13, fontweight='bold')
-ax.set_ylabel('Rating (1-5 Likert Scale)', fontsize=13, fontweight='bold')
-ax.set_title('System Performance Comparison\n(AI Agent with Multimodal + Macau Localization)', 
-             fontsize=14, fontweight='bold', pad=20)
-ax.set_xticks(x)
-ax.set_xticklabels(metrics, rotation=0, ha='center', fontsize=11)
-ax.set_ylim(0, 5.2)
-ax.legend(loc='upper left', frameon=True, fontsize=10, shadow=True)
-ax.grid(axis='y', alpha=0.3, linestyle='-', linewidth=0.5)
-ax.spines['top'].set_visible(False)
-ax.spines['right'].set_visible(False)
-
-plt.tight_layout()
-output_path = os.path.join(OUTPUT_DIR, 'system_performance_comparison_enhanced.png')
-plt.savefig(output_path, dpi=600, bbox_inches='tight')
-plt.close()
-print(f"✅ Figure 5 生成完成: {output_path}")
+def draw_performance_comparison(data):
+    metrics = data["metrics"]
+    ai_means, ai_stds = data["ai_means"], data["ai_stds"]
+    trad_means, trad_stds = data["trad_means"], data["trad_stds"]
+    significance = data["significance"]
+
+    fig, ax = plt.subplots(figsize=(7, 5))
+    x = np.arange(len(metrics))
+    width = 0.35
+
+    ax.bar(x - width/2, ai_means, width, yerr=ai_stds,
+           label='AI Agent (Multimodal + Macau)', color='#2E5090',
+           capsize=5, alpha=0.9, edgecolor='white', linewidth=1.5)
+    ax.bar(x + width/2, trad_means, width, yerr=trad_stds,
+           label='Traditional System', color='#95A5A6',
+           capsize=5, alpha=0.9, edgecolor='white', linewidth=1.5)
+
+    # 显著性标记
+    for i, sig in enumerate(significance):
+        height = max(ai_means[i] + ai_stds[i], trad_means[i] + trad_stds[i])
+        ax.text(i, height + 0.15, sig, ha='center', va='bottom',
+                fontsize=14, fontweight='bold', color='#E74C3C')
+
+    # 参考线
+    ax.axhline(y=4.0, color='#27AE60', linestyle='--', linewidth=1.5, alpha=0.6,
+               label='Excellence threshold')
+    ax.axhline(y=3.0, color='#F39C12', linestyle='--', linewidth=1.5, alpha=0.6,
+               label='Minimum standard')
+
+    ax.set_xlabel('Evaluation Dimensions', fontsize=13, fontweight='bold')
+    ax.set_ylabel('Rating (1-5 Likert Scale)', fontsize=13, fontweight='bold')
+    ax.set_title('System Performance Comparison\n(AI Agent with Multimodal + Macau Localization)',
+                 fontsize=14, fontweight='bold', pad=20)
+    ax.set_xticks(x)
+    ax.set_xticklabels(metrics, rotation=0, ha='center', fontsize=11)
+    ax.set_ylim(0, 5.2)
+    ax.legend(loc='upper left', frameon=True, fontsize=10, shadow=True)
+    ax.grid(axis='y', alpha=0.3, linestyle='-', linewidth=0.5)
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+
+    fig.tight_layout()
+    return fig
+
 
 # === Figure 6: Effect Sizes ===
-print("生成 Figure 6: Effect Sizes...")
-metrics = ['Accuracy', 'Completeness', 'Safety', 'Usability', 'Satisfaction']
-effect_sizes = [1.63, 2.00, 0.28, 1.22, 1.42]
-classifications = ['Very Large\n(Macau knowledge)', 'Very Large\n(Multimodal info)', 
-                  'Small\n(Both safe)', 'Large\n(Multimodal UI)', 'Large\n(Local resources)']
-
-colors = []
-for d in effect_sizes:
-    if d >= 0.8:
-        colors.append('#27AE60')
-    elif d >= 0.5:
-        colors.append('#F39C12')
-    else:
-        colors.append('#95A5A6')
-
-fig, ax = plt.subplots(figsize=(7, 5))
-y_pos = np.arange(len(metrics))
-
-for i, (metric, d, color, classification) in enumerate(zip(metrics, effect_sizes, colors, classifications)):
-    ax.plot([0, d], [i, i], color=color, linewidth=4, alpha=0.8)
-    ax.scatter(d, i, s=300, color=color, zorder=3, edgecolors='white', linewidth=3)
-    ax.text(d + 0.15, i, f'{d:.2f}\n{classification}', va='center', 
-            fontsize=9, fontweight='bold')
-
-# 参考线
-ax.axvline(x=0.2, color='#95A5A6', linestyle='--', linewidth=1.5, alpha=0.5)
-ax.text(0.2, -0.8, 'Small', ha='center', fontsize=10, color='#95A5A6', fontweight='bold')
-ax.axvline(x=0.5, color='#F39C12', linestyle='--', linewidth=1.5, alpha=0.5)
-ax.text(0.5, -0.8, 'Medium', ha='center', fontsize=10, color='#F39C12', fontweight='bold')
-ax.axvline(x=0.8, color='#27AE60', linestyle='--', linewidth=1.5, alpha=0.5)
-ax.text(0.8, -0.8, 'Large', ha='center', fontsize=10, color='#27AE60', fontweight='bold')
-
-ax.set_yticks(y_pos)
-ax.set_yticklabels(metrics, fontsize=12, fontweight='bold')
-ax.set_xlabel("Cohen's d Effect Size", fontsize=13, fontweight='bold')
-ax.set_title("Effect Size Analysis with Contributing Factors", fontsize=14, fontweight='bold', pad=20)
-ax.set_xlim(-0.1, 2.8)
-ax.set_ylim(-1.2, len(metrics)-0.5)
-ax.grid(axis='x', alpha=0.3)
-ax.spines['top'].set_visible(False)
-ax.spines['right'].set_visible(False)
-
-plt.tight_layout()
-output_path = os.path.join(OUTPUT_DIR, 'effect_sizes.png')
-plt.savefig(output_path, dpi=600, bbox_inches='tight')
-plt.close()
-print(f"✅ Figure 6 生成完成: {output_path}")
+def draw_effect_sizes(data):
+    metrics = data["metrics"]
+    effect_sizes = data["effect_sizes"]
+    classifications = data["classifications"]
+
+    colors = []
+    for d in effect_sizes:
+        if d >= 0.8:
+            colors.append('#27AE60')
+        elif d >= 0.5:
+            colors.append('#F39C12')
+        else:
+            colors.append('#95A5A6')
+
+    fig, ax = plt.subplots(figsize=(7, 5))
+    y_pos = np.arange(len(metrics))
+
+    for i, (metric, d, color, classification) in enumerate(zip(metrics, effect_sizes, colors, classifications)):
+        ax.plot([0, d], [i, i], color=color, linewidth=4, alpha=0.8)
+        ax.scatter(d, i, s=300, color=color, zorder=3, edgecolors='white', linewidth=3)
+        ax.text(d + 0.15, i, f'{d:.2f}\n{classification}', va='center',
+                fontsize=9, fontweight='bold')
+
+    # 参考线
+    ax.axvline(x=0.2, color='#95A5A6', linestyle='--', linewidth=1.5, alpha=0.5)
+    ax.text(0.2, -0.8, 'Small', ha='center', fontsize=10, color='#95A5A6', fontweight='bold')
+    ax.axvline(x=0.5, color='#F39C12', linestyle='--', linewidth=1.5, alpha=0.5)
+    ax.text(0.5, -0.8, 'Medium', ha='center', fontsize=10, color='#F39C12', fontweight='bold')
+    ax.axvline(x=0.8, color='#27AE60', linestyle='--', linewidth=1.5, alpha=0.5)
+    ax.text(0.8, -0.8, 'Large', ha='center', fontsize=10, color='#27AE60', fontweight='bold')
+
+    ax.set_yticks(y_pos)
+    ax.set_yticklabels(metrics, fontsize=12, fontweight='bold')
+    ax.set_xlabel("Cohen's d Effect Size", fontsize=13, fontweight='bold')
+    ax.set_title("Effect Size Analysis with Contributing Factors", fontsize=14, fontweight='bold', pad=20)
+    ax.set_xlim(-0.1, 2.8)
+    ax.set_ylim(-1.2, len(metrics)-0.5)
+    ax.grid(axis='x', alpha=0.3)
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+
+    fig.tight_layout()
+    return fig
+
 
 # === Figure 7: Response Length ===
-print("生成 Figure 7: Response Length...")
-fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(7, 3.5))
-
-# Panel (a): Distribution
-np.random.seed(42)
-ai_data = np.random.normal(1247, 312, 500)
-trad_data = np.random.normal(80, 25, 500)
-
-ax1.hist(trad_data, bins=20, color='#95A5A6', alpha=0.7, label='Traditional', edgecolor='white')
-ax1.hist(ai_data, bins=30, color='#2E5090', alpha=0.7, label='AI Agent', edgecolor='white')
-ax1.axvline(1247, color='#2E5090', linestyle='--', linewidth=2)
-ax1.axvline(80, color='#95A5A6', linestyle='--', linewidth=2)
-ax1.text(1247, ax1.get_ylim()[1]*0.9, 'AI mean:\n1247 words', ha='center', fontsize=9, 
-         bbox=dict(boxstyle='round', facecolor='#2E5090', alpha=0.3))
-ax1.text(80, ax1.get_ylim()[1]*0.6, 'Trad mean:\n80 words', ha='center', fontsize=9,
-         bbox=dict(boxstyle='round', facecolor='#95A5A6', alpha=0.3))
-ax1.set_xlabel('Response Length (words)', fontsize=11, fontweight='bold')
-ax1.set_ylabel('Frequency', fontsize=11, fontweight='bold')
-ax1.set_title('(a) Distribution Comparison', fontsize=12, fontweight='bold')
-ax1.legend(fontsize=9, loc='upper right')
-ax1.grid(alpha=0.3)
-
-# Panel (b): Box plot
-data = [trad_data, ai_data]
-bp = ax2.boxplot(data, labels=['Traditional', 'AI Agent'], 
-                 patch_artist=True, widths=0.6)
-bp['boxes'][0].set_facecolor('#95A5A6')
-bp['boxes'][0].set_alpha(0.9)
-bp['boxes'][1].set_facecolor('#2E5090')
-bp['boxes'][1].set_alpha(0.9)
-
-for patch in bp['boxes']:
-    patch.set_edgecolor('white')
-    patch.set_linewidth(1.5)
-
-ax2.text(1.5, 1650, '15.5× improvement\n(Includes:\n• Macau resources\n• Multimodal guidance)', 
-         fontsize=9, ha='center', fontweight='bold',
-         bbox=dict(boxstyle='round', facecolor='#FFF9C4', alpha=0.9, edgecolor='#F39C12'))
-ax2.set_ylabel('Response Length (words)', fontsize=11, fontweight='bold')
-ax2.set_title('(b) Box Plot Comparison', fontsize=12, fontweight='bold')
-ax2.grid(axis='y', alpha=0.3)
-
-plt.tight_layout()
-plt.savefig('response_length_analysis.png', dpi=600, bbox_inches='tight')
-plt.close()
-print("✅ Figure 7 生成完成: response_length_analysis.png")
+def histogram_bins(values, count):
+    """固定长度的回复（如传统基线）没有离散度，给一个 2 词宽的单箱，否则柱子宽度为 0。"""
+    return count if np.ptp(values) else [values[0] - 1, values[0] + 1]
+
+
+def draw_response_length(data):
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(7, 3.5))
+
+    # Panel (a): Distribution
+    ai_data, trad_data = np.asarray(data["ai_lengths"]), np.asarray(data["trad_lengths"])
+    ai_mean, trad_mean = data["ai_mean"], data["trad_mean"]
+
+    ax1.hist(trad_data, bins=histogram_bins(trad_data, 20), color='#95A5A6', alpha=0.7, label='Traditional',
+             edgecolor='white')
+    ax1.hist(ai_data, bins=histogram_bins(ai_data, 30), color='#2E5090', alpha=0.7, label='AI Agent', edgecolor='white')
+    ax1.axvline(ai_mean, color='#2E5090', linestyle='--', linewidth=2)
+    ax1.axvline(trad_mean, color='#95A5A6', linestyle='--', linewidth=2)
+    ax1.text(ai_mean, ax1.get_ylim()[1]*0.9, f'AI mean:\n{ai_mean:.0f} words', ha='center', fontsize=9,
+             bbox=dict(boxstyle='round', facecolor='#2E5090', alpha=0.3))
+    ax1.text(trad_mean, ax1.get_ylim()[1]*0.6, f'Trad mean:\n{trad_mean:.0f} words', ha='center', fontsize=9,
+             bbox=dict(boxstyle='round', facecolor='#95A5A6', alpha=0.3))
+    ax1.set_xlabel('Response Length (words)', fontsize=11, fontweight='bold')
+    ax1.set_ylabel('Frequency', fontsize=11, fontweight='bold')
+    ax1.set_title('(a) Distribution Comparison', fontsize=12, fontweight='bold')
+    ax1.legend(fontsize=9, loc='upper right')
+    ax1.grid(alpha=0.3)
+
+    # Panel (b): Box plot
+    bp = ax2.boxplot([trad_data, ai_data], patch_artist=True, widths=0.6)
+    ax2.set_xticks([1, 2])
+    ax2.set_xticklabels(['Traditional', 'AI Agent'])
+    bp['boxes'][0].set_facecolor('#95A5A6')
+    bp['boxes'][0].set_alpha(0.9)
+    bp['boxes'][1].set_facecolor('#2E5090')
+    bp['boxes'][1].set_alpha(0.9)
+
+    for patch in bp['boxes']:
+        patch.set_edgecolor('white')
+        patch.set_linewidth(1.5)
+
+    ax2.text(1.5, data["annotation_y"],
+             f'{data["improvement"]:.1f}× improvement\n(Includes:\n• Macau resources\n• Multimodal guidance)',
+             fontsize=9, ha='center', fontweight='bold',
+             bbox=dict(boxstyle='round', facecolor='#FFF9C4', alpha=0.9, edgecolor='#F39C12'))
+    ax2.set_ylabel('Response Length (words)', fontsize=11, fontweight='bold')
+    ax2.set_title('(b) Box Plot Comparison', fontsize=12, fontweight='bold')
+    ax2.grid(axis='y', alpha=0.3)
+
+    fig.tight_layout()
+    return fig
+
 
 # === Figure 8: Heatmap ===
-print("生成 Figure 8: Significance Heatmap...")
-metrics = ['Accuracy', 'Completeness', 'Safety', 'Usability', 'Satisfaction']
-data = np.array([
-    [4.16, 4.23, 4.36, 4.00, 4.16],  # AI Agent
-    [3.00, 2.80, 4.21, 3.09, 3.03]   # Traditional
-])
-
-fig, ax = plt.subplots(figsize=(7, 3))
-im = ax.imshow(data, cmap='Blues', aspect='auto', vmin=2.5, vmax=4.5)
-
-# 添加数值和显著性
-significance = [['***', '***', '**', '***', '***'],
-               ['', '', '', '', '']]
-
-for i in range(2):
-    for j in range(5):
-        text_color = 'white' if data[i, j] > 3.8 else 'black'
-        ax.text(j, i, f'{data[i, j]:.2f}\n{significance[i][j]}', 
-               ha="center", va="center", color=text_color, 
-               fontsize=12, fontweight='bold')
-
-ax.set_xticks(np.arange(5))
-ax.set_yticks(np.arange(2))
-ax.set_xticklabels(metrics, fontsize=11, fontweight='bold')
-ax.set_yticklabels(['AI Agent\n(Multimodal + Macau)', 'Traditional\nSystem'], 
-                   fontsize=11, fontweight='bold')
-ax.set_title('Statistical Significance Heatmap', fontsize=14, fontweight='bold', pad=15)
-
-# 颜色条
-cbar = plt.colorbar(im, ax=ax, fraction=0.046, pad=0.04)
-cbar.set_label('Rating (1-5 Likert Scale)', fontsize=11, fontweight='bold')
-
-plt.tight_layout()
-output_path = os.path.join(OUTPUT_DIR, 'significance_heatmap.png')
-plt.savefig(output_path, dpi=600, bbox_inches='tight')
-plt.close()
-print(f"✅ Figure 8 生成完成: {output_path}")
+def draw_significance_heatmap(data):
+    metrics = data["metrics"]
+    values = np.array([data["ai_means"], data["trad_means"]])
 
-# === Figure 9: Radar Chart ===
-print("生成 Figure 9: Radar Chart...")
-categories = ['Accuracy', 'Completeness', 'Safety', 'Usability', 'Satisfaction']
-ai_values = [4.16, 4.23, 4.36, 4.00, 4.16]
-trad_values = [3.00, 2.80, 4.21, 3.09, 3.03]
-
-ai_values_closed = ai_values + ai_values[:1]
-trad_values_closed = trad_values + trad_values[:1]
-
-angles = np.linspace(0, 2 * np.pi, len(categories), endpoint=False).tolist()
-angles_closed = angles + angles[:1]
-
-fig, ax = plt.subplots(figsize=(6, 6), subplot_kw=dict(projection='polar'))
-
-# 绘制AI系统
-ax.plot(angles_closed, ai_values_closed, 'o-', linewidth=3, color='#2E5090', 
-        label='AI Agent (Multimodal + Macau)', markersize=8)
-ax.fill(angles_closed, ai_values_closed, alpha=0.25, color='#2E5090')
-
-# 绘制传统系统
-ax.plot(angles_closed, trad_values_closed, 's-', linewidth=2, color='#7F8C8D', 
-        label='Traditional System', markersize=6)
-ax.fill(angles_closed, trad_values_closed, alpha=0.15, color='#7F8C8D')
-
-# 卓越阈值圈
-theta = np.linspace(0, 2*np.pi, 100)
-r = np.ones(100) * 4.0
-ax.plot(theta, r, 'g--', linewidth=1.5, alpha=0.5, label='Excellence (4.0)')
-
-# 设置
-ax.set_ylim(0, 5)
-ax.set_yticks([1, 2, 3, 4, 5])
-ax.set_yticklabels(['1', '2', '3', '4', '5'], fontsize=10)
-ax.set_xticks(angles)
-ax.set_xticklabels(categories, fontsize=12, fontweight='bold')
-ax.grid(True, linestyle=':', alpha=0.5)
-ax.legend(loc='upper right', bbox_to_anchor=(1.35, 1.1), fontsize=10, 
-          frameon=True, shadow=True)
-ax.set_title('User Satisfaction Comparison\nAll AI Dimensions > 4.0', 
-             fontsize=14, fontweight='bold', pad=20)
-
-plt.tight_layout()
-output_path = os.path.join(OUTPUT_DIR, 'satisfaction_radar.png')
-plt.savefig(output_path, dpi=600, bbox_inches='tight')
-plt.close()
-print(f"✅ Figure 9 生成完成: {output_path}\n")
-
-print("=" * 50)
-print("✅ 所有图表生成完成！")
-print("=" * 50)
-print(f"\n📁 保存目录: {OUTPUT_DIR}")
-print("\n生成的文件:")
-print("  - system_performance_comparison_enhanced.png")
-print("  - effect_sizes.png")
-print("  - response_length_analysis.png")
-print("  - significance_heatmap.png")
-print("  - satisfaction_radar.png")
-print("\n🚀 可直接上传到Overleaf")
-print(f"\n💡 提示: 文件已保存到桌面 ICHI_figures 文件夹，避免iCloud同步问题")
-print("\n💡 提示:")
-print("  - Figure 1-2（架构/流程图）需要用Draw.io或PPT制作")
-print("  - Figure 3-4（统计/界面图）可用Python或设计工具")
-print("  - 详细prompts见：高质量图表生成Prompts.md")
+    fig, ax = plt.subplots(figsize=(7, 3))
+    im = ax.imshow(values, cmap='Blues', aspect='auto', vmin=2.5, vmax=4.5)
+
+    # 添加数值和显著性
+    significance = [data["significance"], [''] * len(metrics)]
+
+    for i in range(2):
+        for j in range(len(metrics)):
+            text_color = 'white' if values[i, j] > 3.8 else 'black'
+            ax.text(j, i, f'{values[i, j]:.2f}\n{significance[i][j]}',
+                    ha="center", va="center", color=text_color,
+                    fontsize=12, fontweight='bold')
+
+    ax.set_xticks(np.arange(len(metrics)))
+    ax.set_yticks(np.arange(2))
+    ax.set_xticklabels(metrics, fontsize=11, fontweight='bold')
+    ax.set_yticklabels(['AI Agent\n(Multimodal + Macau)', 'Traditional\nSystem'],
+                       fontsize=11, fontweight='bold')
+    ax.set_title('Statistical Significance Heatmap', fontsize=14, fontweight='bold', pad=15)
 
+    # 颜色条
+    cbar = fig.colorbar(im, ax=ax, fraction=0.046, pad=0.04)
+    cbar.set_label('Rating (1-5 Likert Scale)', fontsize=11, fontweight='bold')
+
+    fig.tight_layout()
+    return fig
+
+
+# === Figure 9: Radar Chart ===
+def draw_satisfaction_radar(data):
+    categories = data["metrics"]
+    ai_values = list(data["ai_means"])
+    trad_values = list(data["trad_means"])
+
+    ai_values_closed = ai_values + ai_values[:1]
+    trad_values_closed = trad_values + trad_values[:1]
+
+    angles = np.linspace(0, 2 * np.pi, len(categories), endpoint=False).tolist()
+    angles_closed = angles + angles[:1]
+
+    fig, ax = plt.subplots(figsize=(6, 6), subplot_kw=dict(projection='polar'))
+
+    # 绘制AI系统
+    ax.plot(angles_closed, ai_values_closed, 'o-', linewidth=3, color='#2E5090',
+            label='AI Agent (Multimodal + Macau)', markersize=8)
+    ax.fill(angles_closed, ai_values_closed, alpha=0.25, color='#2E5090')
+
+    # 绘制传统系统
+    ax.plot(angles_closed, trad_values_closed, 's-', linewidth=2, color='#7F8C8D',
+            label='Traditional System', markersize=6)
+    ax.fill(angles_closed, trad_values_closed, alpha=0.15, color='#7F8C8D')
+
+    # 卓越阈值圈
+    theta = np.linspace(0, 2*np.pi, 100)
+    r = np.ones(100) * 4.0
+    ax.plot(theta, r, 'g--', linewidth=1.5, alpha=0.5, label='Excellence (4.0)')
+
+    # 设置
+    ax.set_ylim(0, 5)
+    ax.set_yticks([1, 2, 3, 4, 5])
+    ax.set_yticklabels(['1', '2', '3', '4', '5'], fontsize=10)
+    ax.set_xticks(angles)
+    ax.set_xticklabels(categories, fontsize=12, fontweight='bold')
+    ax.grid(True, linestyle=':', alpha=0.5)
+    ax.legend(loc='upper right', bbox_to_anchor=(1.35, 1.1), fontsize=10,
+              frameon=True, shadow=True)
+    ax.set_title('User Satisfaction Comparison\nAll AI Dimensions > 4.0',
+                 fontsize=14, fontweight='bold', pad=20)
+
+    fig.tight_layout()
+    return fig
+
+
+FigureJob = namedtuple("FigureJob", ["number", "title", "filename", "draw", "data"])
+
+FIGURES = {
+    5: FigureJob(5, "Performance Comparison", "system_performance_comparison_enhanced",
+              draw_performance_comparison, lambda: PERFORMANCE),
+    6: FigureJob(6, "Effect Sizes", "effect_sizes", draw_effect_sizes, lambda: EFFECT_SIZES),
+    7: FigureJob(7, "Response Length", "response_length_analysis", draw_response_length, response_length_data),
+    8: FigureJob(8, "Significance Heatmap", "significance_heatmap", draw_significance_heatmap, lambda: PERFORMANCE),
+    9: FigureJob(9, "Radar Chart", "satisfaction_radar", draw_satisfaction_radar, lambda: PERFORMANCE),
+}
+
+
+def apply_style(dpi):
+    plt.rcParams.update(STYLE)
+    plt.rcParams['figure.dpi'] = dpi
+    plt.rcParams['savefig.dpi'] = dpi
+
+
+def _is_local(module):
+    return os.path.dirname(getattr(module, "__file__", None) or "") == os.path.dirname(os.path.abspath(__file__))
+
+
+def code_sources(function):
+    """function 及其直接或间接调用的本项目函数的源码，以及它们引用的大写模块常量，按名称排序。"""
+    sources, pending = {}, [function]
+    while pending:
+        current = pending.pop()
+        name = f"{current.__module__}.{current.__qualname__}"
+        if name in sources:
+            continue
+        sources[name] = inspect.getsource(current)
+        codes, names = [current.__code__], set()
+        while codes:
+            code = codes.pop()
+            codes.extend(const for const in code.co_consts if inspect.iscode(const))
+            names.update(code.co_names)
+        scopes = [current.__globals__] + [vars(value) for value in map(current.__globals__.get, names)
+                                          if inspect.ismodule(value) and _is_local(value)]
+        for scope in scopes:
+            for referenced in names:
+                value = scope.get(referenced)
+                if inspect.isfunction(value) and _is_local(inspect.getmodule(value)):
+                    pending.append(value)
+                elif referenced.isupper() and isinstance(value, (str, int, float, list, tuple, dict)):
+                    sources[f"{current.__module__}.{referenced}"] = repr(value)
+    return [sources[name] for name in sorted(sources)]
+
+
+@functools.lru_cache(maxsize=None)
+def rc_digest():
+    """渲染进程生效的 matplotlib 参数（默认值 + matplotlibrc + STYLE）的哈希。"""
+    params = matplotlib.rc_params()
+    params.update(STYLE)
+    return hashlib.sha256(json.dumps({key: str(value) for key, value in params.items() if key != "backend"},
+                                     sort_keys=True).encode()).hexdigest()
+
+
+def content_hash(figure, data, fmt, dpi):
+    payload = json.dumps({
+        "data": data,
+        "rc": rc_digest(),
+        "format": fmt,
+        "dpi": dpi,
+        "code": code_sources(figure.draw),
+        "matplotlib": matplotlib.__version__
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def render_figure(number, data, output_path, fmt, dpi):
+    """进程池任务：渲染单张图并保存。"""
+    apply_style(dpi)
+    fig = FIGURES[number].draw(data)
+    fig.savefig(output_path, format=fmt, dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    return output_path
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, CACHE_MANIFEST), encoding="utf-8") as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, CACHE_MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def generate_figures(numbers=None, output_dir=OUTPUT_DIR, fmt="png", dpi=600, workers=None, force=False):
+    """渲染指定图表，返回 {图号: (输出路径, 是否跳过)}。"""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    results, jobs = {}, {}
+    for number in numbers or sorted(FIGURES):
+        figure = FIGURES[number]
+        data = figure.data()
+        output_path = os.path.join(output_dir, f"{figure.filename}.{fmt}")
+        digest = content_hash(figure, data, fmt, dpi)
+        if not force and manifest.get(os.path.basename(output_path)) == digest and os.path.exists(output_path):
+            results[number] = (output_path, True)
+        else:
+            jobs[number] = (data, output_path, digest)
+
+    if jobs:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {number: pool.submit(render_figure, number, data, output_path, fmt, dpi)
+                           for number, (data, output_path, _) in jobs.items()}
+                for number, future in futures.items():
+                    output_path = future.result()
+                    manifest[os.path.basename(output_path)] = jobs[number][2]
+                    results[number] = (output_path, False)
+        finally:
+            save_manifest(output_dir, manifest)
+    return dict(sorted(results.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成 ICHI 2026 论文 Figure 5-9")
+    parser.add_argument("--format", default="png", choices=["png", "svg", "pdf"], help="输出格式")
+    parser.add_argument("--dpi", type=int, default=600, help="输出分辨率")
+    parser.add_argument("--only", help="只生成指定图号，如 5,7")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="输出目录")
+    parser.add_argument("--workers", type=int, default=None, help="渲染进程数")
+    parser.add_argument("--force", action="store_true", help="忽略缓存，重新渲染全部图表")
+    args = parser.parse_args()
+
+    numbers = [int(n) for n in args.only.split(",")] if args.only else None
+    print(f"=== 图表保存目录: {args.output_dir} ===\n")
+    print("=== 开始生成ICHI 2026论文图表 ===\n")
+
+    results = generate_figures(numbers, args.output_dir, args.format, args.dpi, args.workers, args.force)
+    for number, (output_path, skipped) in results.items():
+        status = "未变化，已跳过" if skipped else "生成完成"
+        print(f"✅ Figure {number} ({FIGURES[number].title}) {status}: {output_path}")
+
+    print("\n" + "=" * 50)
+    print("✅ 所有图表生成完成！")
+    print("=" * 50)
+    print(f"\n📁 保存目录: {args.output_dir}")
+    print("\n生成的文件:")
+    for number in results:
+        print(f"  - {FIGURES[number].filename}.{args.format}")
+    print("\n🚀 可直接上传到Overleaf")
+    print(f"\n💡 提示: 文件已保存到桌面 ICHI_figures 文件夹，避免iCloud同步问题")
+    print("\n💡 提示:")
+    print("  - Figure 1-2（架构/流程图）需要用Draw.io或PPT制作")
+    print("  - Figure 3-4（统计/界面图）可用Python或设计工具")
+    print("  - 详细prompts见：高质量图表生成Prompts.md")
@@ -0,0 +1,126 @@
+"""
+Versioned, hot-reloadable knowledge-base snapshot.
+
+knowledge_base.json holds the editable content: guidelines, Macau resources,
+risk rules, process steps and query synonyms. KnowledgeStore loads it on
+first use and afterwards checks the file's mtime and size at most every
+`check_interval` seconds. A changed snapshot is compiled by the caller's
+`build` function off to the side and then published with a single reference
+assignment, so requests that already hold the previous state finish with it.
+A snapshot that fails to parse or compile is rejected and the previous state
+keeps serving.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+SNAPSHOT_PATH = Path(__file__).resolve().parent / "knowledge_base.json"
+
+REQUIRED_KEYS = ["version", "nccn_guidelines", "macau_resources", "risk_rules", "process_steps"]
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def read_snapshot(path):
+    """Return (snapshot dict, sha1 of the file bytes)."""
+    with open(path, "rb") as handle:
+        raw = handle.read()
+    try:
+        snapshot = json.loads(raw)
+    except ValueError as error:
+        raise SnapshotError(f"{path}: {error}")
+    missing = [key for key in REQUIRED_KEYS if key not in snapshot]
+    if missing:
+        raise SnapshotError(f"{path}: missing {', '.join(missing)}")
+    return snapshot, hashlib.sha1(raw).hexdigest()
+
+
+class KnowledgeStore:
+    def __init__(self, build, path=SNAPSHOT_PATH, check_interval=2.0, on_swap=None):
+        self.build = build
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self.on_swap = on_swap
+        self.state = None
+        self.version = None
+        self.digest = None
+        self.loaded_at = None
+        self.last_error = None
+        self.reloads = 0
+        self._signature = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def current(self):
+        """Return the live state, picking up a changed snapshot if one is due."""
+        if self.state is None:
+            with self._lock:
+                if self.state is None:
+                    self._load()
+            return self.state
+        now = time.monotonic()
+        if now - self._checked >= self.check_interval and self._lock.acquire(blocking=False):
+            try:
+                self._checked = now
+                if self._stat() != self._signature:
+                    self._load()
+            except OSError as error:
+                self.last_error = str(error)
+            finally:
+                self._lock.release()
+        return self.state
+
+    def reload(self):
+        """Force a reload; returns True if a new state was published."""
+        with self._lock:
+            return self._load()
+
+    def _load(self):
+        signature = None
+        try:
+            signature = self._stat()
+            snapshot, digest = read_snapshot(self.path)
+            if digest == self.digest:
+                self._signature = signature
+                return False
+            state = self.build(snapshot)
+        except Exception as error:
+            if self.state is None:
+                raise
+            self._signature = signature
+            self.last_error = f"{type(error).__name__}: {error}"
+            print(f"knowledge_store: keeping version {self.version}, rejected snapshot ({self.last_error})",
+                  file=sys.stderr)
+            return False
+
+        state.version, state.digest = snapshot["version"], digest
+        self.state = state
+        self.version, self.digest, self._signature = snapshot["version"], digest, signature
+        self.loaded_at = datetime.now(timezone.utc)
+        self.last_error = None
+        self.reloads += 1
+        if self.on_swap:
+            self.on_swap(state)
+        return True
+
+    def info(self):
+        return {
+            "path": self.path.name,
+            "version": self.version,
+            "digest": self.digest,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "reloads": self.reloads,
+            "last_error": self.last_error
+        }
@@ -0,0 +1,278 @@
+"""
+Request and stage timing histograms with a Prometheus text endpoint.
+
+`instrument(app)` times every request per route, method and status and adds
+a `/metrics` route. A streamed response is timed until the server closes it. Code on the hot path wraps its phases in
+`METRICS.stage("name")`, recorded per route in `app_stage_seconds`. The route
+travels in a context variable, so stages that run on worker threads still
+count against the request that started them as long as the context is
+copied (see app.run_lookup).
+
+Observing a sample is a bisect plus a few additions under a lock, on the
+order of a microsecond.
+
+Setting PROFILE_SLOW_MS turns on a sampling profiler. A background thread
+records every thread's stack each PROFILE_INTERVAL_MS (default 5 ms) into a
+ring buffer. When a request takes longer than the threshold, the samples from
+its time window are written as folded stacks (flamegraph.pl / speedscope
+format) to PROFILE_DIR (default profiles/). The samples are process-wide,
+because async views and lookups run on threads other than the one that
+accepted the request.
+"""
+
+import bisect
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CURRENT_ROUTE = contextvars.ContextVar("current_route", default="none")
+
+# leaf frames of threads that are blocked rather than working
+IDLE_FUNCTIONS = {"wait", "select", "poll", "accept", "_recv_into", "readinto", "readline", "serve_forever", "_worker",
+                  "_wait_for_tstate_lock"}
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, [le])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Gauge:
+    """Gauge read from a callback at scrape time."""
+
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.read()}"]
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.005, window=60.0):
+        self.interval = interval
+        self.samples = deque(maxlen=max(int(window / interval), 1))
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            now = time.perf_counter()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or frame.f_code.co_name in IDLE_FUNCTIONS:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples.append((now, ";".join(reversed(stack))))
+
+    def folded(self, start, end):
+        return Counter(stack for timestamp, stack in list(self.samples) if start <= timestamp <= end)
+
+
+class Metrics:
+    def __init__(self):
+        self.request_seconds = Histogram("app_request_seconds", "Request latency by route.",
+                                         ("route", "method", "status"))
+        self.stage_seconds = Histogram("app_stage_seconds", "Hot-path stage latency by route.", ("route", "stage"))
+        self.slow_requests = CounterMetric("app_slow_requests_total", "Requests slower than PROFILE_SLOW_MS.", ("route",))
+        self.gauges = []
+        self.profiler = None
+        self.slow_seconds = None
+        self.profile_dir = None
+
+    def gauge(self, name, help_text, read):
+        self.gauges.append(Gauge(name, help_text, read))
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - started, CURRENT_ROUTE.get(), name)
+
+    def enable_profiler(self, slow_ms, interval_ms=5.0, profile_dir="profiles"):
+        self.slow_seconds = slow_ms / 1000.0
+        self.profile_dir = Path(profile_dir)
+        self.profiler = SamplingProfiler(interval=interval_ms / 1000.0)
+        self.profiler.start()
+
+    def record_request(self, route, method, status, started):
+        ended = time.perf_counter()
+        elapsed = ended - started
+        self.request_seconds.observe(elapsed, route, method, status)
+        if self.profiler and elapsed >= self.slow_seconds:
+            self.slow_requests.inc(route)
+            self.dump_profile(route, started, ended)
+
+    def dump_profile(self, route, started, ended):
+        stacks = self.profiler.folded(started, ended)
+        if not stacks:
+            return None
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = self.profile_dir / f"{stamp}-{route.strip('/').replace('/', '_') or 'root'}.folded"
+        with open(path, "w", encoding="utf-8") as handle:
+            for stack, count in stacks.most_common():
+                handle.write(f"{stack} {count}\n")
+        return path
+
+    def render(self):
+        lines = self.request_seconds.render() + self.stage_seconds.render() + self.slow_requests.render()
+        for gauge in self.gauges:
+            lines.extend(gauge.render())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def _with_route(iterable, route):
+    """Iterate a streamed body with CURRENT_ROUTE set, since it runs after the request context is gone."""
+    iterator = iter(iterable)
+    try:
+        while True:
+            token = CURRENT_ROUTE.set(route)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                CURRENT_ROUTE.reset(token)
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+def instrument(app, metrics=METRICS):
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_route = CURRENT_ROUTE.set(request.url_rule.rule if request.url_rule else "unmatched")
+
+    def _reset_route():
+        token = g.pop("metrics_route", None)
+        if token is not None:
+            CURRENT_ROUTE.reset(token)
+
+    @app.after_request
+    def _record(response):
+        started = g.pop("metrics_started", None)
+        route, method = CURRENT_ROUTE.get(), request.method
+        _reset_route()
+        if started is None:
+            return response
+        if response.is_streamed:
+            # a streamed body is produced after this hook returns; time it until the server closes it
+            if not response.direct_passthrough:
+                response.response = _with_route(response.response, route)
+            response.call_on_close(lambda: metrics.record_request(route, method, response.status_code, started))
+        else:
+            metrics.record_request(route, method, response.status_code, started)
+        return response
+
+    @app.teardown_request
+    def _teardown(error=None):
+        # after_request is skipped when a response cannot be finalized; do not leak the route
+        _reset_route()
+
+    class TimedJSONProvider(type(app.json)):
+        def response(self, *args, **kwargs):
+            with metrics.stage("serialize"):
+                return super().response(*args, **kwargs)
+
+    app.json = TimedJSONProvider(app)
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    slow_ms = os.environ.get("PROFILE_SLOW_MS")
+    if slow_ms:
+        metrics.enable_profiler(float(slow_ms), float(os.environ.get("PROFILE_INTERVAL_MS", 5)),
+                                os.environ.get("PROFILE_DIR", "profiles"))
+    return metrics
@@ -0,0 +1,114 @@
+"""
+Micro-batching scheduler for model inference shared by concurrent requests.
+
+A MicroBatcher turns single-item calls into batched calls to one function.
+Callers submit an item and get a Future. A dedicated scheduler thread takes
+the oldest waiting item and keeps collecting until the batch holds
+`max_batch` items or the oldest item has waited `max_wait_ms`. It then
+passes the whole batch to `function`, which returns one result per item.
+A result that is an exception instance fails only its own caller.
+
+Batches run inline on the scheduler thread, or, with an `executor`, on up to
+`concurrency` executor workers at a time, for example a process pool for
+CPU-bound models. While every worker is busy, new requests queue up. The
+next free worker then takes them as one larger batch, so batch size grows
+with load and an idle server adds at most `max_wait_ms` of latency.
+"""
+
+import queue
+import threading
+import time
+from collections.abc import Sized
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    def __init__(self, function, max_batch=32, max_wait_ms=2.0, executor=None, concurrency=1, name="micro-batch"):
+        self.function = function
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+        self.concurrency = concurrency if executor is not None else 1
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self.largest = 0
+        self._queue = queue.Queue()
+        self._slots = threading.Semaphore(self.concurrency)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, item):
+        future = Future()
+        if self._thread is None:
+            self._start()
+        self._queue.put((time.monotonic(), item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        enqueued, item, future = self._queue.get()
+        batch = [(item, future)]
+        deadline = enqueued + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                _, item, future = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            batch.append((item, future))
+        return [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            self._slots.acquire()
+            batch = self._collect()
+            if not batch:
+                self._slots.release()
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            self.largest = max(self.largest, len(batch))
+            items = [item for item, _ in batch]
+            if self.executor is None:
+                try:
+                    self._finish(batch, self.function(items))
+                except Exception as error:
+                    self._finish(batch, error)
+                continue
+            try:
+                job = self.executor.submit(self.function, items)
+            except Exception as error:
+                self._finish(batch, error)
+                continue
+            job.add_done_callback(lambda job, batch=batch: self._finish(
+                batch, job.exception() if job.exception() is not None else job.result()))
+
+    def _finish(self, batch, outcome):
+        self._slots.release()
+        if not isinstance(outcome, BaseException):
+            count = len(outcome) if isinstance(outcome, Sized) else None
+            if count != len(batch):
+                outcome = RuntimeError(f"{self.name}: batch function returned {count} results for {len(batch)} items")
+        if isinstance(outcome, BaseException):
+            for _, future in batch:
+                future.set_exception(outcome)
+            return
+        for (_, future), result in zip(batch, outcome):
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        return {"batches": self.batches, "items": self.items, "largest": self.largest,
+                "mean_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "pending": self._queue.qsize(), "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000.0}
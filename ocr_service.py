@@ -0,0 +1,284 @@
+"""
+Lab-report OCR for /api/multimodal/image.
+
+Images arrive base64 encoded (optionally as a data: URL). They are decoded and
+hashed, then OCR'd with Tesseract in a bounded process pool, so CPU-heavy
+recognition never runs on a request thread. Concurrent uploads are
+micro-batched into one tesseract run per batch. The recognized text is parsed
+for common blood-count and chemistry values. Each value is converted from the
+unit printed on the report to the reference unit and checked against its
+reference range; a value without a recognized unit is reported unjudged.
+
+Results are cached by the image's sha256, so a lab report that is uploaded
+again is answered from memory. pytesseract, Pillow and the tesseract binary
+are optional: without them, clients can still send already-extracted text
+in the `text` field.
+"""
+
+import base64
+import binascii
+import functools
+import hashlib
+import importlib.util
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from micro_batch import MicroBatcher
+from ttl_cache import TTLCache
+
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+# name, aliases (EN / 简 / 繁), reference unit, reference low, reference high
+LAB_TESTS = [
+    ("WBC", ["wbc", "white blood cells?", "white cell count", "leukocytes?", "白细胞", "白細胞", "白血球"],
+     "x10^9/L", 4.0, 10.0),
+    ("Neutrophils", ["anc", "neut(?:rophils?)?", "中性粒细胞", "中性粒細胞", "嗜中性白血球"], "x10^9/L", 1.5, 8.0),
+    ("RBC", ["rbc", "red blood cells?", "erythrocytes?", "红细胞", "紅細胞", "紅血球"], "x10^12/L", 4.0, 6.0),
+    ("Hemoglobin", ["hemoglobin", "haemoglobin", "hgb", "hb", "血红蛋白", "血紅蛋白", "血色素"], "g/dL", 12.0, 17.5),
+    ("Platelets", ["platelets?", "plt", "血小板"], "x10^9/L", 150.0, 400.0),
+    ("ALT", ["alt", "sgpt", "谷丙转氨酶", "谷丙轉氨酶"], "U/L", 7.0, 56.0),
+    ("AST", ["ast", "sgot", "谷草转氨酶", "谷草轉氨酶"], "U/L", 10.0, 40.0),
+    ("Creatinine", ["creatinine", "cr", "肌酐", "肌酸酐"], "mg/dL", 0.6, 1.3),
+]
+
+# factor from each accepted unit (normalized by _unit_key) to the test's reference unit
+_PER_10_9_L = {"10^9/l": 1.0, "10^3/ul": 1.0, "k/ul": 1.0, "10^3/mm3": 1.0, "/ul": 0.001, "cells/ul": 0.001,
+               "/mm3": 0.001, "cells/mm3": 0.001}
+_PER_10_12_L = {"10^12/l": 1.0, "10^6/ul": 1.0, "m/ul": 1.0, "10^6/mm3": 1.0}
+_ENZYME = {"u/l": 1.0, "iu/l": 1.0, "ukat/l": 60.0}
+UNIT_FACTORS = {
+    "WBC": _PER_10_9_L,
+    "Neutrophils": _PER_10_9_L,
+    "RBC": _PER_10_12_L,
+    "Hemoglobin": {"g/dl": 1.0, "g/l": 0.1, "mmol/l": 1.611},
+    "Platelets": _PER_10_9_L,
+    "ALT": _ENZYME,
+    "AST": _ENZYME,
+    "Creatinine": {"mg/dl": 1.0, "umol/l": 1 / 88.4, "mmol/l": 1000 / 88.4},
+}
+
+LOW_ADVICE = {
+    "WBC": "Low white cell count raises infection risk; avoid crowds and report any fever above 38°C immediately.",
+    "Neutrophils": "Low neutrophils (neutropenia) raise infection risk; report any fever above 38°C immediately.",
+    "Hemoglobin": "Low hemoglobin can cause fatigue and shortness of breath; tell your care team if this worsens.",
+    "Platelets": "Low platelets raise bleeding risk; watch for bruising or bleeding gums and avoid injury.",
+}
+HIGH_ADVICE = {
+    "ALT": "Raised liver enzymes should be reviewed by your oncologist before the next treatment cycle.",
+    "AST": "Raised liver enzymes should be reviewed by your oncologist before the next treatment cycle.",
+    "Creatinine": "Raised creatinine may indicate reduced kidney function; your care team may adjust doses.",
+}
+
+# "%", a power-of-ten count ("x10^9/L", "×10⁹/L") or a unit with a slash ("g/dL", "µmol/L", "/uL")
+_UNIT = (r"%|(?:[x×*][ \t]*)?10[ \t]*(?:\^|\*\*|e)?[ \t]*(?:\d+|[⁰¹²³⁴⁵⁶⁷⁸⁹]+)[ \t]*/[ \t]*[a-zµμ]+\d?"
+         r"|[a-zµμ]*[ \t]*/[ \t]*[a-zµμ]+\d?")
+_SUPERSCRIPTS = str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹×*µμ", "0123456789xxuu")
+
+_PATTERNS = [
+    (name, re.compile(r"(?<![A-Za-z])(?:" + "|".join(aliases) + r")(?![A-Za-z])"
+                      r"(?P<before>(?:(?:" + _UNIT + r")|[^0-9\n]){0,20}?)(?P<value>\d+(?:\.\d+)?)"
+                      r"(?:[ \t]*(?P<unit>" + _UNIT + r"))?", re.IGNORECASE), unit, low, high)
+    for name, aliases, unit, low, high in LAB_TESTS
+]
+
+
+def _unit_key(unit):
+    key = re.sub(r"\s+", "", unit.translate(_SUPERSCRIPTS).lower())
+    return re.sub(r"^x?10(?:\^|\*\*|e)?", "10^", key)
+
+
+class OCRError(ValueError):
+    pass
+
+
+class OCRUnavailable(RuntimeError):
+    pass
+
+
+class OCRBusy(RuntimeError):
+    pass
+
+
+def ocr_available():
+    return (importlib.util.find_spec("pytesseract") is not None and importlib.util.find_spec("PIL") is not None
+            and shutil.which("tesseract") is not None)
+
+
+def decode_image(data, max_bytes=MAX_IMAGE_BYTES):
+    if not isinstance(data, str) or not data.strip():
+        raise OCRError("image must be a non-empty base64 string")
+    if data.startswith("data:"):
+        data = data.partition(",")[2]
+    if len(data) * 3 // 4 > max_bytes:
+        raise OCRError(f"image exceeds {max_bytes // (1024 * 1024)} MB")
+    try:
+        return base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        raise OCRError("image is not valid base64")
+
+
+def run_ocr_batch(images, lang):
+    """Process-pool job: OCR a batch of images and return one text, or OCRError, per image.
+
+    Loading the language data dominates a tesseract run on a single report, so
+    the batch goes to one run as a list file, and the output is split on the
+    form feed tesseract writes after each page.
+    """
+    import pytesseract
+    from PIL import Image, ImageOps
+
+    results = [None] * len(images)
+    with tempfile.TemporaryDirectory(prefix="ocr-") as directory:
+        paths = []
+        for number, image_bytes in enumerate(images):
+            path = os.path.join(directory, f"{number}.png")
+            try:
+                with Image.open(io.BytesIO(image_bytes)) as image:
+                    ImageOps.exif_transpose(image).convert("L").save(path)
+            except (OSError, ValueError, Image.DecompressionBombError) as error:
+                results[number] = OCRError(f"image could not be read: {error}")
+                continue
+            paths.append(path)
+        if paths:
+            listing = os.path.join(directory, "images.txt")
+            with open(listing, "w") as handle:
+                handle.write("\n".join(paths) + "\n")
+            pages = pytesseract.image_to_string(listing, lang=lang).split("\f")
+            if len(pages) < len(paths):
+                raise RuntimeError(f"tesseract returned {len(pages)} pages for {len(paths)} images")
+            texts = iter(pages)
+            results = [result if result is not None else next(texts) for result in results]
+    return results
+
+
+def parse_lab_values(text):
+    """Find each test's first value and judge it in the reference unit.
+
+    The unit may follow the value ("Hb 125 g/L") or sit between the name and
+    the value ("Neutrophils % 65", "Hb (g/L): 125"). A value is converted to
+    the reference unit before it is compared with the reference range. A
+    value whose unit is missing, not recognized or a percentage is reported
+    with status "unknown" rather than judged against the wrong range.
+    """
+    values = []
+    for name, pattern, reference_unit, low, high in _PATTERNS:
+        match = pattern.search(text)
+        if not match:
+            continue
+        value = float(match.group("value"))
+        unit = match.group("unit") or next(iter(re.findall(_UNIT, match.group("before"), re.IGNORECASE)), None)
+        unit = re.sub(r"\s+", "", unit) if unit else None
+        factor = UNIT_FACTORS[name].get(_unit_key(unit)) if unit else None
+        result = {"test": name, "value": value, "unit": unit, "reference_range": [low, high],
+                  "reference_unit": reference_unit}
+        if factor is None:
+            result["status"] = "unknown"
+        else:
+            converted = round(value * factor, 3)
+            result["status"] = "low" if converted < low else "high" if converted > high else "normal"
+            if factor != 1.0:
+                result["converted_value"] = converted
+        values.append(result)
+    return values
+
+
+def _describe(value):
+    reported = f"{value['value']:g} {value['unit']}" if value["unit"] else f"{value['value']:g}"
+    if "converted_value" in value:
+        reported += f" = {value['converted_value']:g} {value['reference_unit']}"
+    return reported
+
+
+def interpret(values):
+    if not values:
+        return "No recognizable lab values were found. Please upload a clearer photo or consult your care team."
+    abnormal = [value for value in values if value["status"] in ("low", "high")]
+    unknown = [value for value in values if value["status"] == "unknown"]
+    if not abnormal and not unknown:
+        return "All recognized values are within their reference ranges."
+    lines = [f"{value['test']} is {value['status']} ({_describe(value)}, reference "
+             f"{value['reference_range'][0]:g}-{value['reference_range'][1]:g} {value['reference_unit']})."
+             for value in abnormal]
+    if not abnormal:
+        lines.append("The other recognized values are within their reference ranges." if len(unknown) < len(values)
+                     else "No value could be checked against a reference range.")
+    lines.extend(f"{value['test']} ({_describe(value)}) was not checked: "
+                 + ("a percentage needs the total white cell count." if value["unit"] == "%"
+                    else f"its unit is {'not recognized' if value['unit'] else 'missing'}.")
+                 for value in unknown)
+    advice = [(LOW_ADVICE if value["status"] == "low" else HIGH_ADVICE).get(value["test"]) for value in abnormal]
+    lines.extend(dict.fromkeys(line for line in advice if line))
+    return " ".join(lines)
+
+
+def analyze_text(text):
+    values = parse_lab_values(text)
+    return {"extracted_text": text.strip(), "lab_values": values, "interpretation": interpret(values)}
+
+
+class OCRService:
+    def __init__(self, workers=2, max_pending=8, cache_size=512, timeout=30, lang="eng", batch=4, batch_wait_ms=20.0):
+        self.workers = workers
+        self.batch = batch
+        self.batch_wait_ms = batch_wait_ms
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.lang = lang
+        self.cache = TTLCache(maxsize=cache_size)
+        self.available = ocr_available()
+        self.runs = 0
+        self._inflight = {}
+        self._batcher = None
+        self._lock = threading.Lock()
+
+    def _scheduler(self):
+        if self._batcher is None:
+            self._batcher = MicroBatcher(functools.partial(run_ocr_batch, lang=self.lang), max_batch=self.batch,
+                                         max_wait_ms=self.batch_wait_ms,
+                                         executor=ProcessPoolExecutor(max_workers=self.workers),
+                                         concurrency=self.workers, name="ocr-batcher")
+        return self._batcher
+
+    def process(self, image=None, text=None):
+        """Return the analysis for a base64 image, or for already-extracted text."""
+        if text is not None and not isinstance(text, str):
+            raise OCRError("text must be a string")
+        if text:
+            return {**analyze_text(text), "source": "text", "cached": False}
+        image_bytes = decode_image(image)
+        key = (hashlib.sha256(image_bytes).hexdigest(), self.lang)
+        result = self.cache.get(key)
+        if result is not None:
+            return {**result, "cached": True}
+        if not self.available:
+            raise OCRUnavailable("OCR engine is not installed; send extracted text in the 'text' field")
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                if len(self._inflight) >= self.max_pending:
+                    raise OCRBusy("Too many images waiting for OCR")
+                future = self._scheduler().submit(image_bytes)
+                self._inflight[key] = future
+        try:
+            text = future.result(timeout=self.timeout)
+        finally:
+            if owner:
+                with self._lock:
+                    self._inflight.pop(key, None)
+        result = {**analyze_text(text), "source": "ocr", "image_sha256": key[0]}
+        if owner:
+            self.runs += 1
+            self.cache.set(key, result)
+        return {**result, "cached": False}
+
+    def stats(self):
+        return {**self.cache.stats(), "available": self.available, "runs": self.runs,
+                "inflight": len(self._inflight), "workers": self.workers,
+                "batching": self._batcher.stats() if self._batcher is not None else None}
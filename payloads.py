@@ -0,0 +1,131 @@
+"""
+JSON serialization, pre-serialized static payloads and response compression.
+
+FastJSONProvider serializes with orjson when it is installed, and falls back
+to Flask's stdlib provider otherwise. Output stays compatible: keys are
+sorted, dates go through Flask's `default`, and UTF-8 text is emitted
+unescaped, which makes CJK text about half the size.
+
+StaticPayload serializes a payload that only changes with the knowledge
+base (timeline, resources, process steps) once. It also computes the
+payload's strong ETag and its gzip/brotli encodings, so serving it costs a
+header lookup.
+
+`compress_responses(app)` negotiates Content-Encoding per client for every
+other response: br when the brotli package is installed, else gzip. GET
+responses get a strong ETag from their body, so unchanged payloads answer
+304. Streamed responses (SSE, NDJSON) and binary images pass through
+untouched.
+"""
+
+import gzip
+import hashlib
+import importlib.util
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+from metrics import METRICS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+COMPRESSIBLE = {"application/json", "application/javascript", "image/svg+xml", "text/css", "text/csv", "text/html",
+                "text/plain"}
+MIN_COMPRESS_BYTES = 512
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+if orjson is not None:
+    _ORJSON_OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+                       | orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+def dumps_bytes(obj, default=DefaultJSONProvider.default):
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=default, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    ensure_ascii = orjson is None
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.keys() - {"separators"}:
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(obj, self.default).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        body = dumps_bytes(self._prepare_response_obj(args, kwargs), self.default) + b"\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+if importlib.util.find_spec("brotli") is not None:
+    import brotli
+
+    ENCODERS = {"br": lambda body: brotli.compress(body, quality=BROTLI_QUALITY),
+                "gzip": lambda body: gzip.compress(body, GZIP_LEVEL, mtime=0)}
+else:
+    ENCODERS = {"gzip": lambda body: gzip.compress(body, GZIP_LEVEL, mtime=0)}
+
+
+def negotiate_encoding(request):
+    return request.accept_encodings.best_match(list(ENCODERS))
+
+
+class StaticPayload:
+    """A JSON payload serialized, hashed and compressed once."""
+
+    def __init__(self, obj):
+        self.body = dumps_bytes(obj) + b"\n"
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        self.encoded = {encoding: encode(self.body) for encoding, encode in ENCODERS.items()
+                        if len(self.body) >= MIN_COMPRESS_BYTES}
+
+    def response(self, app, request):
+        encoding = negotiate_encoding(request) if self.encoded else None
+        response = app.response_class(self.encoded[encoding] if encoding else self.body, mimetype="application/json")
+        response.vary.add("Accept-Encoding")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.set_etag(f"{self.etag}-{encoding}" if encoding else self.etag)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+
+def compress_responses(app, min_size=MIN_COMPRESS_BYTES, metrics=METRICS):
+    from flask import request
+
+    @app.after_request
+    def _compress(response):
+        if (response.is_streamed or response.direct_passthrough or response.status_code != 200
+                or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE):
+            return response
+        with metrics.stage("compress"):
+            body = response.get_data()
+            # routes that set their own ETag have already answered If-None-Match for the plain body
+            revalidate = False
+            if request.method in ("GET", "HEAD") and response.get_etag()[0] is None:
+                response.set_etag(hashlib.sha1(body).hexdigest())
+                revalidate = True
+            response.vary.add("Accept-Encoding")
+            encoding = negotiate_encoding(request) if len(body) >= min_size else None
+            if encoding:
+                response.set_data(ENCODERS[encoding](body))
+                response.headers["Content-Encoding"] = encoding
+                etag, weak = response.get_etag()
+                if etag:
+                    response.set_etag(f"{etag}-{encoding}", weak)
+                    revalidate = request.method in ("GET", "HEAD")
+        return response.make_conditional(request) if revalidate else response
+
+    return app
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Macau cancer registry ingestion.
+
+Parses every workbook in macau_cancer_data/ once, normalizes the registry
+tables into a single long-format table
+
+    source, measure, year, icd10, site, site_zh, cancer_type, sex, age_group, value
+
+and persists it as a columnar NumPy cache keyed by the source files' size and
+mtime: one .npy file per column inside a versioned directory, plus a small
+registry.json pointer that is swapped atomically. The Flask app opens the
+columns read-only with mmap, so every worker process shares the same page
+cache pages instead of holding a private copy. pandas/xlrd/openpyxl are
+needed only when the cache has to be rebuilt.
+
+Sources:
+    registry_report  annual report appendix tables (5-year age bands)
+    top_ten          IV.10 / IV.12 top-ten sites by year
+    age_groups       IV.11 main sites by 10-year age group
+
+age_group "all" is the all-ages total (crude rate for rate measures) and
+"asr" the world age-standardised rate. Each table also carries an all-sites
+total row (site in TOTAL_SITES, empty icd10) next to the per-site rows.
+
+Usage:
+    python registry_data.py            # rebuild the cache if stale and print a summary
+    python registry_data.py --force    # always rebuild
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+DATA_DIR = Path(__file__).resolve().parent / "macau_cancer_data"
+CACHE_DIR = DATA_DIR / ".cache"
+POINTER_NAME = "registry.json"
+PARSER_VERSION = 1
+TOTAL_SITES = ("All Sites", "Todos Os Locais")
+
+CATEGORICAL_COLUMNS = ["source", "measure", "icd10", "site", "site_zh", "cancer_type", "sex", "age_group"]
+NUMERIC_COLUMNS = {"year": np.int16, "value": np.float64}
+
+ICD_CANCER_TYPES = [
+    ("C11", "C11", "nasopharyngeal_cancer"),
+    ("C15", "C15", "esophageal_cancer"),
+    ("C16", "C16", "stomach_cancer"),
+    ("C18", "C21", "colorectal_cancer"),
+    ("C22", "C22", "liver_cancer"),
+    ("C25", "C25", "pancreatic_cancer"),
+    ("C33", "C34", "lung_cancer"),
+    ("C50", "C50", "breast_cancer"),
+    ("C53", "C53", "cervical_cancer"),
+    ("C54", "C54", "uterine_cancer"),
+    ("C56", "C56", "ovarian_cancer"),
+    ("C61", "C61", "prostate_cancer"),
+    ("C67", "C67", "bladder_cancer"),
+    ("C73", "C73", "thyroid_cancer"),
+]
+
+MEASURE_PATTERNS = [
+    ("new cases", "new_cases"),
+    ("deaths", "deaths"),
+    ("incidence", "incidence_rate"),
+    ("mortality", "mortality_rate"),
+]
+
+
+def cancer_type_for_icd(icd10):
+    match = re.match(r"\s*([A-Z])\s*(\d+)", icd10 or "")
+    if not match:
+        return ""
+    code = f"{match.group(1)}{int(match.group(2)):02d}"
+    for start, end, cancer_type in ICD_CANCER_TYPES:
+        if start <= code <= end:
+            return cancer_type
+    return ""
+
+
+def _clean(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return re.sub(r"\s+", " ", str(value)).strip()
+
+
+def _number(value):
+    if isinstance(value, (int, float)) and value == value:
+        return float(value)
+    text = _clean(value)
+    if text in ("", "-"):
+        return 0.0
+    try:
+        return float(text.replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _split_site(label):
+    match = re.match(r"^(.*?)\s*([A-Za-z].*)$", label)
+    if not match:
+        return label, label
+    return match.group(2).strip().title(), match.group(1).strip()
+
+
+def _age_label(header):
+    header = _clean(header)
+    if re.fullmatch(r"\d+-", header):
+        start = int(header[:-1])
+        return f"{start}-{start + 4}"
+    if re.fullmatch(r"\d+\+", header):
+        return header
+    if "WASR" in header:
+        return "asr"
+    if "所有" in header or "Crude" in header or "All" in header:
+        return "all"
+    return None
+
+
+def _parse_title(title):
+    lower = title.lower()
+    measure = next((name for pattern, name in MEASURE_PATTERNS if pattern in lower), None)
+    year = re.search(r"in (\d{4})", title)
+    if "female" in lower:
+        sex = "female"
+    elif "male" in lower:
+        sex = "male"
+    else:
+        sex = "all"
+    return measure, int(year.group(1)) if year else None, sex
+
+
+def _parse_appendix(frame):
+    records = []
+    measure = year = sex = None
+    ages = None
+    for _, row in frame.iterrows():
+        first = _clean(row.iloc[0])
+        if "Table" in first:
+            measure, year, sex = _parse_title(first)
+            ages = None
+            continue
+        if first == "ICD-10":
+            ages = {position: _age_label(row.iloc[position]) for position in range(2, len(row))}
+            continue
+        label = _clean(row.iloc[1])
+        if ages is None or measure is None or not label:
+            if first and re.match(r"^\d\s", first):
+                ages = None
+            continue
+        site, site_zh = _split_site(label)
+        icd10 = first.replace(" ", "")
+        for position, age_group in ages.items():
+            if age_group is None:
+                continue
+            value = _number(row.iloc[position])
+            if value is None:
+                continue
+            records.append(("registry_report", measure, year, icd10, site, site_zh,
+                            cancer_type_for_icd(icd10), sex, age_group, value))
+    return records
+
+
+def _split_summary_site(label):
+    parts = [part.strip() for part in str(label).split("\n") if part.strip()]
+    site_zh = parts[0] if parts else ""
+    site = parts[1].title() if len(parts) > 1 else site_zh
+    return site, site_zh
+
+
+def _parse_top_ten(frame):
+    title = " ".join(_clean(value) for value in frame.iloc[:2, 1])
+    measure = "deaths" if "死亡" in title or "morte" in title else "new_cases"
+    header_row = next(i for i in range(len(frame)) if "CID-10" in _clean(frame.iloc[i, 1]))
+    header = frame.iloc[header_row]
+    sexes = frame.iloc[header_row + 1]
+    columns = []
+    for position in range(4, len(header)):
+        year = _number(header.iloc[position])
+        if year:
+            current_year = int(year)
+        sex_label = _clean(sexes.iloc[position])
+        if not year and not sex_label:
+            continue
+        sex = {"M": "male", "F": "female"}.get(sex_label.split(" ")[-1], "all")
+        columns.append((position, current_year, sex))
+
+    records = []
+    for _, row in frame.iloc[header_row + 2:].iterrows():
+        label = row.iloc[2] if _clean(row.iloc[2]) else row.iloc[1]
+        if not _clean(label) or _clean(label).startswith(("資料", "Fonte")):
+            continue
+        icd10 = _clean(row.iloc[1]).replace(" ", "") if _clean(row.iloc[2]) else ""
+        site, site_zh = _split_summary_site(label)
+        for position, year, sex in columns:
+            value = _number(row.iloc[position])
+            if value is None:
+                continue
+            records.append(("top_ten", measure, year, icd10, site, site_zh,
+                            cancer_type_for_icd(icd10), sex, "all", value))
+    return records
+
+
+def _parse_age_groups(frame):
+    title = " ".join(_clean(value) for value in frame.iloc[:2, 1])
+    year = int(re.search(r"(\d{4})", title).group(1))
+    header_row = next(i for i in range(len(frame)) if "CID-10" in _clean(frame.iloc[i, 1]))
+    ages = {}
+    for position in range(4, frame.shape[1]):
+        header = _clean(frame.iloc[header_row, position])
+        if re.fullmatch(r"\d+-\d+", header):
+            ages[position] = header
+        elif header.startswith("≧"):
+            ages[position] = header[1:] + "+"
+        elif "Ignorado" in header:
+            ages[position] = "unknown"
+        elif "Total" in header:
+            ages[position] = "all"
+
+    records = []
+    for _, row in frame.iloc[header_row + 1:].iterrows():
+        label = row.iloc[2] if _clean(row.iloc[2]) else row.iloc[1]
+        if not _clean(label) or _clean(label).startswith(("資料", "Fonte")):
+            continue
+        icd10 = _clean(row.iloc[1]).replace(" ", "") if _clean(row.iloc[2]) else ""
+        site, site_zh = _split_summary_site(label)
+        for position, age_group in ages.items():
+            value = _number(row.iloc[position])
+            if value is None:
+                continue
+            records.append(("age_groups", "new_cases", year, icd10, site, site_zh,
+                            cancer_type_for_icd(icd10), "all", age_group, value))
+    return records
+
+
+def parse_workbook(path):
+    """Parse one registry workbook into a list of normalized record tuples."""
+    import pandas as pd
+
+    records = []
+    workbook = pd.ExcelFile(path)
+    for sheet in workbook.sheet_names:
+        name = sheet.strip()
+        if name.startswith("appendix"):
+            records.extend(_parse_appendix(workbook.parse(sheet, header=None)))
+        elif name in ("IV.10", "IV.12"):
+            records.extend(_parse_top_ten(workbook.parse(sheet, header=None)))
+        elif name == "IV.11":
+            records.extend(_parse_age_groups(workbook.parse(sheet, header=None)))
+    return records
+
+
+def source_files(data_dir=DATA_DIR):
+    return sorted(Path(data_dir).glob("*.xlsx"))
+
+
+def last_modified(files):
+    mtimes = [path.stat().st_mtime for path in files]
+    return datetime.fromtimestamp(max(mtimes), tz=timezone.utc) if mtimes else None
+
+
+def cache_key(files):
+    digest = hashlib.sha1(f"v{PARSER_VERSION}".encode())
+    for path in files:
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+class RegistryTable:
+    def __init__(self, columns, labels, key=""):
+        self.columns = columns
+        self.labels = labels
+        self.key = key
+
+    @classmethod
+    def from_records(cls, records, key=""):
+        unique = {}
+        for record in records:
+            unique.setdefault(record[:-1], record)
+        rows = list(unique.values())
+        names = ["source", "measure", "year", "icd10", "site", "site_zh", "cancer_type", "sex", "age_group", "value"]
+        columns, labels = {}, {}
+        for position, name in enumerate(names):
+            values = [row[position] for row in rows]
+            if name in NUMERIC_COLUMNS:
+                columns[name] = np.array(values, dtype=NUMERIC_COLUMNS[name])
+            else:
+                labels[name], codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+                columns[name] = codes.astype(np.int16)
+        return cls(columns, labels, key)
+
+    @classmethod
+    def empty(cls):
+        columns = {name: np.zeros(0, dtype=np.int16) for name in CATEGORICAL_COLUMNS}
+        columns.update({name: np.zeros(0, dtype=dtype) for name, dtype in NUMERIC_COLUMNS.items()})
+        return cls(columns, {name: np.zeros(0, dtype=str) for name in CATEGORICAL_COLUMNS})
+
+    def __len__(self):
+        return len(self.columns["value"])
+
+    def column(self, name):
+        if name in self.labels:
+            return self.labels[name][self.columns[name]]
+        return self.columns[name]
+
+    def code(self, name, label):
+        labels = self.labels[name]
+        position = np.searchsorted(labels, label)
+        return position if position < len(labels) and labels[position] == label else -1
+
+    def mask(self, **filters):
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in filters.items():
+            if name in self.labels:
+                mask &= self.columns[name] == self.code(name, value)
+            else:
+                mask &= self.columns[name] == value
+        return mask
+
+    def total(self, measure, cancer_type, year=None, sex="all", age_group="all", source="registry_report"):
+        mask = self.mask(source=source, measure=measure, cancer_type=cancer_type, sex=sex, age_group=age_group)
+        if not mask.any():
+            return None, None
+        year = year or int(self.columns["year"][mask].max())
+        mask &= self.columns["year"] == year
+        return year, float(self.columns["value"][mask].sum())
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame({name: self.column(name) for name in self.columns})
+
+    def save(self, cache_dir):
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        target = cache_dir / f"registry-{self.key[:16]}"
+        staging = cache_dir / f".staging-{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir()
+        for name, values in self.columns.items():
+            np.save(staging / f"{name}.npy", np.ascontiguousarray(values))
+        for name, labels in self.labels.items():
+            np.save(staging / f"{name}__labels.npy", labels)
+        try:
+            os.replace(staging, target)
+        except OSError:
+            # another worker published this version first; both copies hold the same data
+            shutil.rmtree(staging, ignore_errors=True)
+            if not target.is_dir():
+                raise
+
+        pointer = cache_dir / f".{POINTER_NAME}.{os.getpid()}"
+        pointer.write_text(json.dumps({"key": self.key, "directory": target.name, "rows": len(self)}))
+        os.replace(pointer, cache_dir / POINTER_NAME)
+        for stale in cache_dir.glob("registry-*"):
+            if stale != target:
+                shutil.rmtree(stale, ignore_errors=True)
+
+    @staticmethod
+    def _map(path):
+        try:
+            return np.load(path, mmap_mode="r", allow_pickle=False)
+        except ValueError:
+            return np.load(path, allow_pickle=False)
+
+    @classmethod
+    def load(cls, cache_dir):
+        cache_dir = Path(cache_dir)
+        pointer = json.loads((cache_dir / POINTER_NAME).read_text())
+        directory = cache_dir / pointer["directory"]
+        labels = {name: cls._map(directory / f"{name}__labels.npy") for name in CATEGORICAL_COLUMNS}
+        columns = {name: cls._map(directory / f"{name}.npy") for name in CATEGORICAL_COLUMNS + list(NUMERIC_COLUMNS)}
+        return cls(columns, labels, pointer["key"])
+
+
+def build_registry(files, key=""):
+    records = []
+    for path in files:
+        records.extend(parse_workbook(path))
+    return RegistryTable.from_records(records, key)
+
+
+def load_registry(data_dir=DATA_DIR, cache_dir=CACHE_DIR, force=False):
+    """Map the normalized registry table read-only, rebuilding the cache when the workbooks changed."""
+    files = source_files(data_dir)
+    key = cache_key(files)
+    if not force:
+        try:
+            table = RegistryTable.load(cache_dir)
+            if table.key == key:
+                return table
+        except (OSError, ValueError, KeyError):
+            pass
+    if not files:
+        return RegistryTable.empty()
+    try:
+        table = build_registry(files, key)
+    except ImportError as error:
+        print(f"Registry cache is stale and cannot be rebuilt ({error}); registry data disabled.", file=sys.stderr)
+        return RegistryTable.empty()
+    try:
+        table.save(cache_dir)
+        return RegistryTable.load(cache_dir)
+    except (OSError, ValueError, KeyError) as error:
+        print(f"Registry cache could not be written ({error}); serving an in-memory copy.", file=sys.stderr)
+        return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the Macau registry cache")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the cache is up to date")
+    args = parser.parse_args()
+
+    table = load_registry(force=args.force)
+    print(f"{len(table)} rows cached in {CACHE_DIR}")
+    for name in ("source", "measure", "sex", "cancer_type"):
+        counts = np.bincount(table.columns[name], minlength=len(table.labels[name]))
+        print(f"  {name}: " + json.dumps(dict(zip(table.labels[name].tolist(), counts.tolist())), ensure_ascii=False))
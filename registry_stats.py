@@ -0,0 +1,139 @@
+"""
+Indexed statistics queries over the normalized registry table.
+
+Every dimension gets an inverted index (label -> sorted row positions) built
+once at startup. A filtered query seeks into the most selective posting list,
+checks the remaining filters only against those rows, and group-bys aggregate
+the surviving rows with a single bincount. Results are memoized per
+normalized query.
+
+The all-sites total rows would double every sum over sites, so they are
+left out by default: `total=true` selects only them, `total=true,false`
+keeps both, and a `site` filter disables the default.
+"""
+
+import hashlib
+
+import numpy as np
+
+from registry_data import TOTAL_SITES
+from ttl_cache import TTLCache
+
+DIMENSIONS = ["source", "measure", "year", "icd10", "site", "cancer_type", "sex", "age_group"]
+
+DEFAULTS = {"source": "registry_report", "measure": "new_cases", "sex": "all", "age_group": "all"}
+FLAGS = {"true": True, "false": False}
+
+
+class StatsQueryError(ValueError):
+    pass
+
+
+class RegistryStats:
+    def __init__(self, table, last_modified=None):
+        self.table = table
+        self.last_modified = last_modified
+        self.columns = {name: np.asarray(table.columns[name]) for name in DIMENSIONS}
+        self.columns["total"] = np.isin(self.columns["site"], [table.code("site", site) for site in TOTAL_SITES])
+        self.postings = {}
+        for name in DIMENSIONS + ["total"]:
+            values = self.columns[name]
+            order = np.argsort(values, kind="stable")
+            keys, starts = np.unique(values[order], return_index=True)
+            bounds = list(starts[1:]) + [len(order)]
+            labels = table.labels[name][keys] if name in table.labels else keys
+            self.postings[name] = {self._label(label): order[start:end]
+                                   for label, start, end in zip(labels, starts, bounds)}
+        self.values = np.asarray(table.columns["value"])
+        self.cache = TTLCache(maxsize=2048)
+
+    @staticmethod
+    def _label(value):
+        return value.item() if hasattr(value, "item") else value
+
+    def dimension_values(self, name):
+        return sorted(self.postings[name])
+
+    def _parse_filter(self, name, raw):
+        values = [value.strip() for value in str(raw).split(",") if value.strip()]
+        if name == "year":
+            try:
+                values = [int(value) for value in values]
+            except ValueError:
+                raise StatsQueryError("year must be an integer")
+        if name == "total":
+            try:
+                values = [FLAGS[value.lower()] for value in values]
+            except KeyError:
+                raise StatsQueryError("total must be true or false")
+        return values
+
+    def normalize(self, params):
+        group_by = [name.strip() for name in params.get("group_by", "").split(",") if name.strip()]
+        for name in group_by:
+            if name not in DIMENSIONS:
+                raise StatsQueryError(f"Unknown group_by dimension: {name}")
+        filters = {}
+        for name in DIMENSIONS:
+            if params.get(name):
+                filters[name] = tuple(self._parse_filter(name, params[name]))
+            elif name in DEFAULTS and name not in group_by:
+                filters[name] = (DEFAULTS[name],)
+        if params.get("total"):
+            filters["total"] = tuple(sorted(set(self._parse_filter("total", params["total"]))))
+        elif "site" not in filters:
+            filters["total"] = (False,)
+        return filters, tuple(group_by)
+
+    def etag(self, filters, group_by):
+        digest = hashlib.sha1(repr((self.table.key, sorted(filters.items()), group_by)).encode())
+        return digest.hexdigest()
+
+    def _codes(self, name, values):
+        if name in self.table.labels:
+            return [self.table.code(name, value) for value in values]
+        return list(values)
+
+    def _rows(self, filters):
+        if not filters:
+            return np.arange(len(self.values))
+        sizes = {name: sum(len(self.postings[name].get(value, ())) for value in values)
+                 for name, values in filters.items()}
+        seek = min(sizes, key=sizes.get)
+        postings = [self.postings[seek][value] for value in filters[seek] if value in self.postings[seek]]
+        if not postings:
+            return np.zeros(0, dtype=np.intp)
+        rows = np.sort(np.concatenate(postings)) if len(postings) > 1 else postings[0]
+        for name, values in filters.items():
+            if name != seek and len(rows):
+                rows = rows[np.isin(self.columns[name][rows], self._codes(name, values))]
+        return rows
+
+    def query(self, filters, group_by=()):
+        key = (tuple(sorted(filters.items())), group_by)
+        return self.cache.get_or_create(key, lambda: self._query(filters, group_by))
+
+    def _query(self, filters, group_by):
+        rows = self._rows(filters)
+        result = {
+            "filters": {name: list(values) for name, values in filters.items()},
+            "group_by": list(group_by),
+            "matched_rows": int(len(rows))
+        }
+        if not group_by:
+            result["value"] = float(self.values[rows].sum())
+            return result
+
+        codes = [self.columns[name][rows].astype(np.int64) for name in group_by]
+        shape = [int(column.max()) + 1 if len(column) else 1 for column in codes]
+        groups, inverse = np.unique(np.ravel_multi_index(codes, shape), return_inverse=True)
+        sums = np.bincount(inverse, weights=self.values[rows], minlength=len(groups))
+        result["rows"] = []
+        for group_codes, total in zip(zip(*np.unravel_index(groups, shape)), sums):
+            row = {}
+            for dimension, code in zip(group_by, group_codes):
+                row[dimension] = (str(self.table.labels[dimension][code]) if dimension in self.table.labels
+                                  else int(code))
+            row["value"] = float(total)
+            result["rows"].append(row)
+        return result
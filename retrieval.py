@@ -0,0 +1,157 @@
+"""
+BM25 passage retrieval over the guideline knowledge base.
+
+Guideline texts are chunked into passages (numbered items and sentences,
+packed up to a word budget), tokenized into Latin words plus CJK unigrams
+and bigrams, and compiled into a sparse term x passage matrix of BM25
+weights. A query is scored by summing the matrix rows of its terms, so the
+cost depends on the postings of the query terms rather than on corpus size.
+
+The compiled index is persisted as a single .npz under
+macau_cancer_data/.cache/retrieval/ and reused while the corpus is unchanged.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+from scipy import sparse
+
+from registry_data import CACHE_DIR
+
+INDEX_PATH = CACHE_DIR / "retrieval" / "bm25.npz"
+INDEX_VERSION = 1
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "how", "i", "in", "is",
+    "it", "may", "my", "of", "on", "or", "should", "the", "to", "what", "when", "which", "with", "you"
+}
+
+_TOKEN = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]+|[^\W\d_]\w*|\d+(?:\.\d+)?")
+_CJK = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+_ITEM = re.compile(r"\s*(?=\b\d+\)\s)")
+_SENTENCE = re.compile(r"(?<=[.!?。！？])\s+")
+
+
+def tokenize(text):
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if _CJK.match(token):
+            tokens.extend(token)
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+        elif token not in STOPWORDS:
+            if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+                token = token[:-1]
+            tokens.append(token)
+    return tokens
+
+
+def chunk_text(text, max_words=30):
+    """Split on numbered items ("1) ...") and sentences, then pack up to max_words."""
+    pieces = [piece.strip() for item in _ITEM.split(text) for piece in _SENTENCE.split(item) if piece.strip()]
+    chunks, current = [], []
+    for piece in pieces:
+        if current and len(" ".join(current + [piece]).split()) > max_words:
+            chunks.append(" ".join(current))
+            current = []
+        current.append(piece)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def guideline_passages(guidelines, max_words=30):
+    passages = []
+    for cancer_type, sections in guidelines.items():
+        for intent, text in sections.items():
+            for number, chunk in enumerate(chunk_text(text, max_words)):
+                passages.append({"id": f"{cancer_type}/{intent}/{number}", "cancer_type": cancer_type,
+                                 "intent": intent, "title": f"{cancer_type} {intent}".replace("_", " "),
+                                 "text": chunk})
+    return passages
+
+
+def corpus_key(passages):
+    payload = json.dumps([INDEX_VERSION, passages], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class BM25Index:
+    def __init__(self, passages, vocabulary, weights, key=""):
+        self.passages = passages
+        self.by_id = {passage["id"]: passage for passage in passages}
+        self.cancer_types = np.array([passage.get("cancer_type", "") for passage in passages], dtype=str)
+        self.vocabulary = vocabulary
+        self.weights = weights.tocsr()
+        self.key = key
+
+    @classmethod
+    def build(cls, passages, k1=1.5, b=0.75):
+        vocabulary, term_ids, lengths = {}, [], np.zeros(len(passages), dtype=np.int64)
+        for doc, passage in enumerate(passages):
+            tokens = tokenize(f"{passage.get('title', '')} {passage['text']}")
+            lengths[doc] = len(tokens)
+            term_ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+
+        # duplicate (term, passage) entries are summed into term frequencies
+        docs = np.repeat(np.arange(len(passages)), lengths)
+        tf = sparse.csr_matrix((np.ones(len(term_ids)), (np.asarray(term_ids, dtype=np.int64), docs)),
+                               shape=(len(vocabulary), len(passages)))
+        tf.sum_duplicates()
+        df = np.diff(tf.indptr)
+        idf = np.log1p((len(passages) - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * lengths / (lengths.mean() if len(passages) else 1.0))
+        data = tf.data
+        docs = tf.indices
+        term_idf = np.repeat(idf, df)
+        tf.data = term_idf * data * (k1 + 1) / (data + norm[docs])
+        return cls(passages, vocabulary, tf, key=corpus_key(passages))
+
+    def search(self, query, k=3, min_score=0.0, cancer_type=None):
+        """Return up to k (passage, score) pairs, best first, from the passages of `cancer_type` if given."""
+        terms = [self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary]
+        if not terms or not self.passages:
+            return []
+        scores = np.asarray(self.weights[terms].sum(axis=0)).ravel()
+        if cancer_type is not None:
+            scores = np.where(self.cancer_types == cancer_type, scores, 0.0)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.passages[doc], float(scores[doc])) for doc in top if scores[doc] > min_score]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staging = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(staging, data=self.weights.data, indices=self.weights.indices, indptr=self.weights.indptr,
+                 shape=np.asarray(self.weights.shape),
+                 meta=np.asarray(json.dumps({"key": self.key, "passages": self.passages,
+                                             "vocabulary": self.vocabulary}, ensure_ascii=False)))
+        os.replace(staging, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as stored:
+            meta = json.loads(str(stored["meta"]))
+            weights = sparse.csr_matrix((stored["data"], stored["indices"], stored["indptr"]),
+                                        shape=tuple(stored["shape"]))
+        return cls(meta["passages"], meta["vocabulary"], weights, key=meta["key"])
+
+
+def load_index(passages, path=INDEX_PATH):
+    """Load the persisted index if it was built from the same passages, else rebuild and persist it."""
+    key = corpus_key(passages)
+    try:
+        index = BM25Index.load(path)
+        if index.key == key:
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+    index = BM25Index.build(passages)
+    try:
+        index.save(path)
+    except OSError:
+        pass
+    return index
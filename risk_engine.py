@@ -0,0 +1,170 @@
+"""
+Risk-rule engine.
+
+Compiles the declarative RISK_RULES table from app.py into a dense lookup
+index keyed by (gender, cancer_type, age band). Every cell holds the rules
+that fire for that combination, already sorted by priority, so evaluating
+a patient is a dictionary hit and scoring a whole roster is one NumPy
+fancy-indexing operation.
+
+Rule fields:
+    id            unique rule name
+    alert         alert text returned to the client
+    priority      lower fires first (default 0)
+    min_age       inclusive lower age bound (optional)
+    max_age       exclusive upper age bound (optional)
+    genders       list of genders the rule applies to (optional, any if absent)
+    cancer_types  list of cancer types the rule applies to (optional, any if absent)
+    registry_min  {metric: threshold} over the registry statistics (optional); the
+                  rule applies only to cancer types whose all-ages value of every
+                  metric reaches its threshold, e.g. {"mortality_incidence_ratio": 0.35}
+    registry_fallback  cancer types used instead of registry_min when the registry has no
+                  data for one of its metrics (optional; without it the rule matches no cancer type)
+"""
+
+import bisect
+import sys
+
+import numpy as np
+
+OTHER = "*"
+PATIENT_FIELDS = ("age", "gender", "cancer_type")
+
+
+class PatientError(ValueError):
+    pass
+
+
+def validate_patient(patient):
+    """Return `patient` if it is an object whose age, gender and cancer_type are scalars, else raise PatientError."""
+    if not isinstance(patient, dict):
+        raise PatientError("patient must be a JSON object")
+    for field in PATIENT_FIELDS:
+        value = patient.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (str, int, float))):
+            raise PatientError(f"{field} must be a string or number")
+    return patient
+
+
+def normalize_label(value):
+    """Stripped, lower-cased form of a gender or cancer type, as rules and registry lookups compare them."""
+    return str(value).strip().lower() if value is not None else ""
+
+
+def _coerce_age(age):
+    try:
+        age = float(age)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if age != age else age
+
+
+def _rule_matches(rule, age, gender, cancer_type):
+    if rule.get("min_age") is not None and age < rule["min_age"]:
+        return False
+    if rule.get("max_age") is not None and age >= rule["max_age"]:
+        return False
+    if rule.get("genders") and gender not in {normalize_label(g) for g in rule["genders"]}:
+        return False
+    if (rule.get("cancer_types") is not None
+            and cancer_type not in {normalize_label(c) for c in rule["cancer_types"]}):
+        return False
+    return True
+
+
+def resolve_registry_conditions(rule, site_metric):
+    """Replace a rule's registry_min condition with the cancer types that satisfy it, or with its
+    registry_fallback list when the registry has no data for one of the metrics."""
+    if not rule.get("registry_min"):
+        return rule
+    eligible = None
+    for metric, threshold in rule["registry_min"].items():
+        values = site_metric(metric) if site_metric else {}
+        if not values:
+            fallback = rule.get("registry_fallback")
+            print(f"risk_engine: no registry data for {metric}; rule {rule.get('id')} "
+                  + (f"falls back to {', '.join(fallback)}" if fallback else "matches no cancer type"),
+                  file=sys.stderr)
+            eligible = set(fallback or [])
+            break
+        passing = {cancer_type for cancer_type, value in values.items() if value >= threshold}
+        eligible = passing if eligible is None else eligible & passing
+    if rule.get("cancer_types") is not None:
+        eligible &= set(rule["cancer_types"])
+    return {**rule, "cancer_types": sorted(eligible)}
+
+
+class RiskIndex:
+    def __init__(self, rules, site_metric=None):
+        rules = [resolve_registry_conditions(rule, site_metric) for rule in rules]
+        self.rules = sorted(rules, key=lambda rule: rule.get("priority", 0))
+        self.by_id = {rule["id"]: rule for rule in self.rules}
+        genders = sorted({normalize_label(g) for rule in self.rules for g in rule.get("genders") or []})
+        cancer_types = sorted({normalize_label(c) for rule in self.rules for c in rule.get("cancer_types") or []})
+        self.age_bounds = sorted({bound for rule in self.rules
+                                  for bound in (rule.get("min_age"), rule.get("max_age")) if bound is not None})
+
+        self.gender_codes = {gender: code for code, gender in enumerate(genders + [OTHER])}
+        self.cancer_codes = {cancer: code for code, cancer in enumerate(cancer_types + [OTHER])}
+        band_ages = [float("-inf")] + self.age_bounds
+
+        shape = (len(self.gender_codes), len(self.cancer_codes), len(band_ages))
+        self.first_rule = np.full(shape, -1, dtype=np.int16)
+        self.match_count = np.zeros(shape, dtype=np.int16)
+        self.matched = np.empty(shape, dtype=object)
+        self.cells = {}
+        for gender, g in self.gender_codes.items():
+            for cancer_type, c in self.cancer_codes.items():
+                for b, band_age in enumerate(band_ages):
+                    matched = tuple(rule for rule in self.rules
+                                    if _rule_matches(rule, band_age, gender, cancer_type))
+                    self.cells[(g, c, b)] = self.matched[g, c, b] = matched
+                    self.match_count[g, c, b] = len(matched)
+                    if matched:
+                        self.first_rule[g, c, b] = self.rules.index(matched[0])
+
+        self.alerts = np.array([rule["alert"] for rule in self.rules] + [""], dtype=object)
+
+    def key(self, age, gender, cancer_type):
+        other_gender = self.gender_codes[OTHER]
+        other_cancer = self.cancer_codes[OTHER]
+        return (self.gender_codes.get(normalize_label(gender), other_gender),
+                self.cancer_codes.get(normalize_label(cancer_type), other_cancer),
+                bisect.bisect_right(self.age_bounds, _coerce_age(age)))
+
+    def evaluate(self, age, gender, cancer_type):
+        return self.cells[self.key(age, gender, cancer_type)]
+
+    def _codes(self, values, codes, normalize):
+        values = np.asarray(values, dtype=object)
+        uniques, inverse = np.unique(values.astype(str), return_inverse=True)
+        mapped = np.array([codes.get(normalize(value), codes[OTHER]) for value in uniques], dtype=np.intp)
+        return mapped[inverse].reshape(values.shape)
+
+    def _keys(self, ages, genders, cancer_types):
+        ages = np.asarray(ages)
+        if ages.dtype.kind in "iuf":
+            numeric = np.nan_to_num(ages.astype(float), nan=0.0)
+        else:
+            numeric = np.array([_coerce_age(age) for age in ages.ravel()], dtype=float).reshape(ages.shape)
+        g = self._codes(genders, self.gender_codes, normalize_label)
+        c = self._codes(cancer_types, self.cancer_codes, normalize_label)
+        b = np.searchsorted(np.asarray(self.age_bounds, dtype=float), numeric, side="right")
+        return g, c, b
+
+    def evaluate_batch(self, ages, genders, cancer_types):
+        """Return (first matching rule index or -1, number of matching rules) per patient."""
+        keys = self._keys(ages, genders, cancer_types)
+        return self.first_rule[keys], self.match_count[keys]
+
+    def evaluate_many(self, ages, genders, cancer_types):
+        """Return the matching rules of every patient, as evaluate() would, in an object array."""
+        return self.matched[self._keys(ages, genders, cancer_types)]
+
+    def score_frame(self, frame, age="age", gender="gender", cancer_type="cancer_type"):
+        """Score a pandas DataFrame of patients, returning it with risk columns added."""
+        first, count = self.evaluate_batch(frame[age].to_numpy(), frame[gender].to_numpy(),
+                                           frame[cancer_type].to_numpy())
+        return frame.assign(risk_level=np.where(count > 0, "high", "normal"),
+                            alert_count=count,
+                            top_alert=self.alerts[first])
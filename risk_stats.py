@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Precomputed localized risk statistics from the Macau cancer registry.
+
+The normalized registry table (see registry_data.py) is folded once into a
+dense float32 array indexed by
+
+    site (cancer_type), sex (all/male/female), age band, year, metric
+
+and persisted under macau_cancer_data/.cache/risk_stats/, keyed by the
+registry cache key. Metrics:
+
+    new_cases, deaths             registered counts
+    incidence_rate, mortality_rate  per 100,000 (crude for the "all" band)
+    mortality_incidence_ratio     deaths / new_cases, a survival proxy
+    relative_incidence            band incidence rate / all-ages rate
+
+Annual-report tables give age-banded, per-sex values; the top-ten tables
+fill in all-ages counts for their other years. For every (site, sex, band)
+the latest year with data is precomputed, so a request-time lookup is a
+few dictionary hits and one array index.
+
+Usage:
+    python risk_stats.py               # build (or load) the array and print a summary
+"""
+
+import json
+import os
+import re
+import sys
+
+import numpy as np
+
+from registry_data import CACHE_DIR
+from risk_engine import normalize_label
+
+STATS_DIR = CACHE_DIR / "risk_stats"
+STATS_VERSION = 1
+
+SEXES = ["all", "male", "female"]
+COUNT_METRICS = ["new_cases", "deaths", "incidence_rate", "mortality_rate"]
+METRICS = COUNT_METRICS + ["mortality_incidence_ratio", "relative_incidence"]
+ALL_AGES = "all"
+# in precedence order; the IV.11 age_groups table uses 10-year bands and is left out
+SOURCES = ["registry_report", "top_ten"]
+
+
+def _band_start(label):
+    match = re.match(r"(\d+)", label)
+    return int(match.group(1)) if match else None
+
+
+def _sex_code(gender):
+    gender = normalize_label(gender)
+    return SEXES.index(gender) if gender in SEXES else 0
+
+
+class RiskStatistics:
+    def __init__(self, values, sites, bands, years, key=""):
+        self.values = values
+        self.sites = list(sites)
+        self.bands = list(bands)
+        self.years = [int(year) for year in years]
+        self.key = key
+        self.site_codes = {site: code for code, site in enumerate(self.sites)}
+        self.all_band = self.bands.index(ALL_AGES)
+        # bands are sorted by their first age, with "all" last; index by age up to the open-ended band
+        starts = np.array([_band_start(band) for band in self.bands[:self.all_band]], dtype=np.int64)
+        self.band_by_age = (np.searchsorted(starts, np.arange(starts[-1] + 1 if len(starts) else 0), side="right")
+                            - 1).astype(np.int16)
+        present = ~np.isnan(values[..., METRICS.index("new_cases")])
+        latest = np.where(present, np.arange(len(self.years)), -1).max(axis=-1, initial=-1)
+        self.latest = latest.astype(np.int16)
+
+    @classmethod
+    def build(cls, table):
+        """Fold the registry table into the dense (site, sex, band, year, metric) array."""
+        column = {name: np.asarray(table.column(name)) for name in ("source", "measure", "cancer_type", "sex",
+                                                                    "age_group")}
+        years = np.asarray(table.columns["year"])
+        value = np.asarray(table.columns["value"], dtype=np.float64)
+        keep = ((column["cancer_type"] != "") & np.isin(column["source"], SOURCES)
+                & np.isin(column["measure"], COUNT_METRICS) & np.isin(column["sex"], SEXES)
+                & np.array([label == ALL_AGES or _band_start(label) is not None for label in column["age_group"]],
+                           dtype=bool))
+        sites = sorted(set(column["cancer_type"][keep]))
+        bands = sorted(set(column["age_group"][keep]) - {ALL_AGES}, key=_band_start) + [ALL_AGES]
+        year_labels = sorted(set(years[keep].tolist()))
+
+        shape = (len(sites), len(SEXES), len(bands), len(year_labels), len(METRICS))
+        sums = np.zeros(shape[:-1] + (len(COUNT_METRICS),))
+        seen = np.zeros(shape[:-1] + (len(COUNT_METRICS),), dtype=bool)
+        # annual-report rows win over top-ten rows for the same cell
+        for source in SOURCES:
+            rows = keep & (column["source"] == source)
+            index = (np.searchsorted(sites, column["cancer_type"][rows]),
+                     np.array([SEXES.index(sex) for sex in column["sex"][rows]], dtype=np.intp),
+                     np.array([bands.index(band) for band in column["age_group"][rows]], dtype=np.intp),
+                     np.searchsorted(year_labels, years[rows]),
+                     np.array([COUNT_METRICS.index(measure) for measure in column["measure"][rows]],
+                              dtype=np.intp))
+            fresh = ~seen[index]
+            cells = tuple(axis[fresh] for axis in index)
+            np.add.at(sums, cells, value[rows][fresh])
+            seen[cells] = True
+
+        values = np.full(shape, np.nan, dtype=np.float32)
+        values[..., :len(COUNT_METRICS)] = np.where(seen, sums, np.nan)
+        new_cases, deaths, incidence = (values[..., METRICS.index(name)]
+                                        for name in ("new_cases", "deaths", "incidence_rate"))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values[..., METRICS.index("mortality_incidence_ratio")] = np.where(new_cases > 0, deaths / new_cases,
+                                                                               np.nan)
+            all_ages = incidence[:, :, bands.index(ALL_AGES):bands.index(ALL_AGES) + 1]
+            values[..., METRICS.index("relative_incidence")] = np.where(all_ages > 0, incidence / all_ages, np.nan)
+        return cls(values, sites, bands, year_labels, key=table.key)
+
+    def save(self, directory=STATS_DIR):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.key[:16]}.npz")
+        staging = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(staging, values=self.values,
+                 meta=np.asarray(json.dumps({"version": STATS_VERSION, "key": self.key, "sites": self.sites,
+                                             "bands": self.bands, "years": self.years})))
+        os.replace(staging, path)
+        for stale in os.listdir(directory):
+            if stale.endswith(".npz") and stale != os.path.basename(path):
+                os.remove(os.path.join(directory, stale))
+
+    @classmethod
+    def load(cls, key, directory=STATS_DIR):
+        with np.load(os.path.join(directory, f"{key[:16]}.npz"), allow_pickle=False) as stored:
+            meta = json.loads(str(stored["meta"]))
+            if meta["version"] != STATS_VERSION or meta["key"] != key:
+                raise ValueError("stale risk statistics")
+            return cls(stored["values"], meta["sites"], meta["bands"], meta["years"], key=key)
+
+    def band_for_age(self, age):
+        try:
+            age = int(float(age))
+        except (TypeError, ValueError, OverflowError):
+            return self.all_band
+        if age <= 0 or not len(self.band_by_age):
+            return self.all_band
+        return int(self.band_by_age[min(age, len(self.band_by_age) - 1)])
+
+    def lookup(self, cancer_type, gender=None, age=None, year=None):
+        """Return the registry metrics for one patient profile, or None when the site is not in the registry."""
+        cancer_type = normalize_label(cancer_type)
+        site = self.site_codes.get(cancer_type)
+        if site is None:
+            return None
+        sex, band = _sex_code(gender), self.band_for_age(age)
+        if year is None:
+            column = int(self.latest[site, sex, band])
+        else:
+            try:
+                column = self.years.index(int(year))
+            except (TypeError, ValueError):
+                return None
+        if column < 0:
+            return None
+        cell = self.values[site, sex, band, column].tolist()
+        return {"cancer_type": cancer_type, "sex": SEXES[sex], "age_band": self.bands[band],
+                "year": self.years[column],
+                **{metric: (None if number != number else round(number, 4)) for metric, number in zip(METRICS, cell)}}
+
+    def site_metric(self, metric, sex="all", band=ALL_AGES):
+        """Latest-year value of one metric for every site, as {cancer_type: value}."""
+        sex, band = SEXES.index(sex), self.bands.index(band)
+        metric = METRICS.index(metric)
+        return {site: float(self.values[code, sex, band, self.latest[code, sex, band], metric])
+                for site, code in self.site_codes.items()
+                if self.latest[code, sex, band] >= 0
+                and not np.isnan(self.values[code, sex, band, self.latest[code, sex, band], metric])}
+
+
+def describe(stats):
+    """One-sentence plain-language summary of a lookup() result."""
+    if not stats or stats["incidence_rate"] is None:
+        return None
+    people = {"male": "men", "female": "women"}.get(stats["sex"], "people")
+    ages = "of all ages" if stats["age_band"] == ALL_AGES else f"aged {stats['age_band']}"
+    text = (f"Macau registry {stats['year']}: {stats['incidence_rate']:.1f} new "
+            f"{stats['cancer_type'].replace('_', ' ')} cases per 100,000 {people} {ages}")
+    if stats["relative_incidence"] is not None and stats["age_band"] != ALL_AGES:
+        text += f" ({stats['relative_incidence']:.1f}x the all-ages rate)"
+    if stats["mortality_incidence_ratio"] is not None:
+        text += f"; deaths equalled {stats['mortality_incidence_ratio']:.0%} of new cases"
+    return text + "."
+
+
+def load_risk_stats(table, directory=STATS_DIR):
+    """Load the persisted array for this registry cache, else build it from the table and persist it.
+    An empty table (no workbooks, or no pandas) gives empty statistics and leaves the stored arrays alone."""
+    if not len(table):
+        return RiskStatistics.build(table)
+    try:
+        return RiskStatistics.load(table.key, directory)
+    except (OSError, ValueError, KeyError):
+        pass
+    stats = RiskStatistics.build(table)
+    try:
+        stats.save(directory)
+    except OSError:
+        pass
+    return stats
+
+
+if __name__ == "__main__":
+    from registry_data import load_registry
+
+    stats = load_risk_stats(load_registry())
+    print(f"{stats.values.shape} array ({stats.values.nbytes / 1024:.0f} KiB) in {STATS_DIR}", file=sys.stderr)
+    ratios = stats.site_metric("mortality_incidence_ratio")
+    for site in sorted(ratios, key=ratios.get, reverse=True):
+        print(f"  {site:<24} mortality/incidence {ratios[site]:.2f}")
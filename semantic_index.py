@@ -0,0 +1,243 @@
+"""
+Dense-embedding passage search with an IVF approximate-nearest-neighbour index.
+
+Passages are embedded once, quantized to int8 with a per-row scale (a
+quarter of float32), and stored under macau_cancer_data/.cache/embeddings/,
+from where the matrix is memory-mapped. Small corpora are
+searched exactly. From IVF_MIN_PASSAGES passages up, a k-means inverted file
+is built (about sqrt(N) lists), and each query scores the passages of its
+`nprobe` nearest lists only. That keeps a 100k-passage search at a few
+milliseconds on CPU.
+
+Two encoders are available:
+- SentenceTransformerEncoder runs a sentence-transformers model: the one
+  named by EMBEDDING_MODEL (a local path or a model name), or DEFAULT_MODEL
+  when the package is installed and EMBEDDING_MODEL is unset. Models load
+  with HF_HUB_OFFLINE=1 unless the environment says otherwise, so they come
+  from a local path or the Hugging Face cache and never from the network.
+  It matches paraphrases ("tumour in my chest"), and it is the only encoder
+  with `semantic = True`.
+- HashingEncoder is the fallback when sentence-transformers is missing, when
+  the model is not available locally, or when EMBEDDING_MODEL=hashing. It hashes tokens and character trigrams (CJK
+  unigrams and bigrams via retrieval.tokenize) into a fixed-size vector. That
+  is fuzzy lexical matching: it tolerates misspellings and inflections, but
+  it does not know synonyms, so it is not a semantic model.
+
+Encoders with `batched = True` are worth feeding through a
+micro_batch.MicroBatcher, which embeds concurrent queries in one call.
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import zlib
+
+import numpy as np
+
+from registry_data import CACHE_DIR
+from retrieval import corpus_key, tokenize
+
+EMBEDDING_DIR = CACHE_DIR / "embeddings"
+IVF_MIN_PASSAGES = 4096
+INDEX_VERSION = 1
+DEFAULT_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+
+
+class HashingEncoder:
+    batched = False
+    semantic = False
+    threshold = 0.35
+    margin = 0.10
+
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def features(self, text):
+        tokens = tokenize(text)
+        grams = [f"<{token}>"[start:start + 3] for token in tokens if token.isascii()
+                 for start in range(len(token))]
+        return tokens + grams
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            hashes = np.fromiter((zlib.crc32(feature.encode()) for feature in self.features(text)), dtype=np.uint32)
+            if len(hashes):
+                signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+                np.add.at(vectors[row], hashes % self.dim, signs)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEncoder:
+    batched = True
+    semantic = True
+    threshold = 0.45
+    margin = 0.05
+
+    def __init__(self, model_name):
+        # set before huggingface_hub is first imported, which reads it once
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.name = f"st-{model_name.replace('/', '_')}"
+
+    def encode(self, texts):
+        return self.model.encode(list(texts), batch_size=64, normalize_embeddings=True,
+                                 convert_to_numpy=True).astype(np.float32)
+
+
+def sentence_transformers_available():
+    return importlib.util.find_spec("sentence_transformers") is not None
+
+
+def create_encoder(model_name=None):
+    """The model named by model_name, DEFAULT_MODEL if none is named and sentence-transformers is installed,
+    else (or for "hashing", or when the model fails to load) the hashing encoder."""
+    if model_name is None and sentence_transformers_available():
+        model_name = DEFAULT_MODEL
+    if model_name and model_name != "hashing":
+        try:
+            return SentenceTransformerEncoder(model_name)
+        except Exception as error:
+            print(f"semantic_index: falling back to hashing encoder ({type(error).__name__}: {error})",
+                  file=sys.stderr)
+    return HashingEncoder()
+
+
+def spherical_kmeans(vectors, clusters, iterations=10, sample=32768, seed=0):
+    random = np.random.default_rng(seed)
+    points = vectors[random.choice(len(vectors), min(sample, len(vectors)), replace=False)].astype(np.float32)
+    centroids = points[random.choice(len(points), clusters, replace=False)]
+    for _ in range(iterations):
+        assignment = np.argmax(points @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, points)
+        empty = ~sums.any(axis=1)
+        sums[empty] = points[random.choice(len(points), int(empty.sum()), replace=False)]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+def assign_lists(vectors, scales, centroids, chunk=8192):
+    return np.concatenate([np.argmax((vectors[start:start + chunk] * scales[start:start + chunk, None]) @ centroids.T,
+                                     axis=1)
+                           for start in range(0, len(vectors), chunk)])
+
+
+def quantize(vectors):
+    """Symmetric per-row int8 quantization: vectors ~= codes * scales[:, None]."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+class VectorIndex:
+    def __init__(self, passages, vectors, scales, key, centroids=None, order=None, offsets=None, nprobe=8):
+        self.passages = passages
+        self.cancer_types = np.array([passage.get("cancer_type", "") for passage in passages], dtype=str)
+        self.vectors = vectors
+        self.scales = scales
+        self.key = key
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.nprobe = nprobe
+        self._dense = vectors * scales[:, None] if centroids is None else None
+
+    @classmethod
+    def build(cls, passages, encoder, key, ivf_min=IVF_MIN_PASSAGES, chunk=1024):
+        texts = [f"{passage.get('title', '')} {passage['text']}" for passage in passages]
+        parts = [quantize(encoder.encode(texts[start:start + chunk])) for start in range(0, len(texts), chunk)]
+        vectors = np.concatenate([codes for codes, _ in parts]) if parts else np.zeros((0, 0), dtype=np.int8)
+        scales = np.concatenate([scales for _, scales in parts]) if parts else np.zeros(0, dtype=np.float32)
+        if len(passages) < ivf_min:
+            return cls(passages, vectors, scales, key)
+        centroids = spherical_kmeans(vectors * scales[:, None], int(np.sqrt(len(passages))))
+        lists = assign_lists(vectors, scales, centroids)
+        order = np.argsort(lists, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=len(centroids)))])
+        return cls(passages, vectors, scales, key, centroids, order, offsets)
+
+    def _candidates(self, query):
+        if self.centroids is None:
+            return None, self._dense @ query
+        nprobe = min(self.nprobe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.order[self.offsets[cell]:self.offsets[cell + 1]] for cell in probe])
+        return rows, (self.vectors[rows] @ query) * self.scales[rows]
+
+    def search(self, query, k=5, cancer_type=None):
+        """Return up to k (passage, cosine score) pairs for an embedded query, best first, from the passages
+        of `cancer_type` if given."""
+        if not self.passages:
+            return []
+        rows, scores = self._candidates(np.asarray(query, dtype=np.float32))
+        if cancer_type is not None:
+            kinds = self.cancer_types if rows is None else self.cancer_types[rows]
+            scores = np.where(kinds == cancer_type, scores, -np.inf)
+        k = min(k, len(scores))
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        docs = top if rows is None else rows[top]
+        return [(self.passages[doc], float(score)) for doc, score in zip(docs, scores[top]) if score > -np.inf]
+
+    def classify(self, query, field, threshold, margin, k=8):
+        """Return the `field` value of the best hit when it clearly beats every other value, else None."""
+        best = {}
+        for passage, score in self.search(query, k):
+            best.setdefault(passage[field], score)
+        ranked = sorted(best.items(), key=lambda item: -item[1])
+        if not ranked or ranked[0][1] < threshold:
+            return None
+        if len(ranked) > 1 and ranked[0][1] - ranked[1][1] < margin:
+            return None
+        return ranked[0][0]
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.key)
+        staging = f"{base}.{os.getpid()}.tmp"
+        ivf = {} if self.centroids is None else {"centroids": self.centroids, "order": self.order,
+                                                 "offsets": self.offsets}
+        np.save(f"{staging}.npy", self.vectors)
+        np.savez(f"{staging}.npz", scales=self.scales, **ivf)
+        os.replace(f"{staging}.npy", f"{base}.npy")
+        os.replace(f"{staging}.npz", f"{base}.npz")
+
+    @classmethod
+    def load(cls, passages, key, directory):
+        base = os.path.join(directory, key)
+        vectors = np.load(f"{base}.npy", mmap_mode="r")
+        if len(vectors) != len(passages):
+            raise ValueError("vector count does not match passages")
+        with np.load(f"{base}.npz") as stored:
+            if "centroids" not in stored:
+                return cls(passages, vectors, stored["scales"], key)
+            return cls(passages, vectors, stored["scales"], key, stored["centroids"], stored["order"],
+                       stored["offsets"])
+
+
+def index_key(passages, encoder):
+    return hashlib.sha1(json.dumps([INDEX_VERSION, encoder.name, corpus_key(passages)]).encode()).hexdigest()
+
+
+def load_vector_index(passages, encoder, directory=EMBEDDING_DIR):
+    """Load the stored vectors for these passages and encoder, else embed them and store the result."""
+    key = index_key(passages, encoder)
+    try:
+        return VectorIndex.load(passages, key, directory)
+    except (OSError, ValueError, KeyError):
+        pass
+    index = VectorIndex.build(passages, encoder, key)
+    try:
+        index.save(directory)
+    except OSError:
+        pass
+    return index
@@ -0,0 +1,153 @@
+"""
+Per-patient conversation state.
+
+A session keeps what a patient has told the system (age, gender, cancer
+type), where they are on the care pathway (stage and step), and the last
+risk-rule results. Follow-up requests therefore need not resend their
+context, and they skip rule evaluation while nothing relevant has changed.
+
+Sessions are `__slots__` records: 50,000 sessions with typical values take
+about 20 MB. By default they live in an in-process TTLCache, which evicts
+the least recently used session beyond SESSION_MAX (default 50,000) and
+expires idle sessions after SESSION_TTL seconds. That store is private to the
+process, so a server with several worker processes must set
+SESSION_REDIS_URL: sessions are then stored in Redis, or in any server that
+speaks its protocol, and shared by every process. Each record is stored as
+one compact JSON array.
+
+Session ids come only from the server (secrets.token_urlsafe). Clients send
+them back in the HttpOnly cookie set by POST /api/session, or in the
+X-Session-Id header.
+"""
+
+import json
+import re
+import secrets
+import time
+
+from ttl_cache import TTLCache
+
+SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+
+class SessionError(ValueError):
+    pass
+
+
+class UnknownSessionError(SessionError):
+    pass
+
+
+class Session:
+    __slots__ = ("id", "age", "gender", "cancer_type", "stage", "step", "rule_key", "rule_id", "risk_key", "risk",
+                 "updated")
+
+    def __init__(self, id, age=None, gender=None, cancer_type=None, stage="diagnosis", step=1, rule_key=None,
+                 rule_id=None, risk_key=None, risk=None, updated=None):
+        self.id = id
+        self.age = age
+        self.gender = gender
+        self.cancer_type = cancer_type
+        self.stage = stage
+        self.step = step
+        self.rule_key = rule_key
+        self.rule_id = rule_id
+        self.risk_key = risk_key
+        self.risk = risk
+        self.updated = updated or time.time()
+
+    def remember(self, context):
+        """Merge the patient fields of a request into the session; return the full context."""
+        for field in ("age", "gender", "cancer_type"):
+            value = (context or {}).get(field)
+            if value not in (None, ""):
+                setattr(self, field, value)
+        return {field: getattr(self, field) for field in ("age", "gender", "cancer_type")
+                if getattr(self, field) not in (None, "")}
+
+    def to_dict(self):
+        return {"age": self.age, "gender": self.gender, "cancer_type": self.cancer_type,
+                "stage": self.stage, "step": self.step, "risk": self.risk, "updated": self.updated}
+
+    def dumps(self):
+        return json.dumps([getattr(self, name) for name in self.__slots__], ensure_ascii=False,
+                          separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, raw):
+        session = cls(*json.loads(raw))
+        for name in ("rule_key", "risk_key"):
+            value = getattr(session, name)
+            if value is not None:
+                setattr(session, name, tuple(value))
+        return session
+
+
+def new_session_id():
+    return secrets.token_urlsafe(16)
+
+
+class MemorySessionStore:
+    def __init__(self, maxsize=50000, ttl=86400):
+        self.sessions = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, session_id):
+        return self.sessions.get(session_id)
+
+    def save(self, session):
+        session.updated = time.time()
+        self.sessions.set(session.id, session)
+
+    def delete(self, session_id):
+        self.sessions.pop(session_id)
+
+    def stats(self):
+        return {"backend": "memory", **self.sessions.stats()}
+
+
+class RedisSessionStore:
+    def __init__(self, client, ttl=86400, prefix="session:"):
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def get(self, session_id):
+        raw = self.client.get(self.prefix + session_id)
+        return Session.loads(raw) if raw is not None else None
+
+    def save(self, session):
+        session.updated = time.time()
+        self.client.set(self.prefix + session.id, session.dumps(), ex=self.ttl)
+
+    def delete(self, session_id):
+        self.client.delete(self.prefix + session_id)
+
+    def stats(self):
+        return {"backend": "redis", "ttl": self.ttl}
+
+
+def create_store(redis_url=None, maxsize=50000, ttl=86400):
+    if not redis_url:
+        return MemorySessionStore(maxsize=maxsize, ttl=ttl)
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("SESSION_REDIS_URL is set but the redis package is not installed (pip install redis)")
+    return RedisSessionStore(redis.Redis.from_url(redis_url), ttl=ttl)
+
+
+def resolve(store, session_id):
+    """Return the session for session_id, or None without one.
+
+    Ids are only issued by the server (new_session_id). An id the store does
+    not know, because it was made up, has expired or lives in another
+    process's memory, is rejected instead of being adopted.
+    """
+    if not session_id:
+        return None
+    if not isinstance(session_id, str) or not SESSION_ID.match(session_id):
+        raise SessionError("session_id must be 16-64 characters of A-Z, a-z, 0-9, '_' or '-'")
+    session = store.get(session_id)
+    if session is None:
+        raise UnknownSessionError("Unknown or expired session; start a new one with POST /api/session")
+    return session
@@ -0,0 +1,147 @@
+"""
+Lazily initialized application components and startup timing.
+
+A Component wraps the factory of an expensive object, such as the registry
+table, the chart renderer or a speech model. The object is built on the
+first `get()`, under a lock, so concurrent first requests share one build.
+A failed build is recorded and retried by the next caller.
+
+`Components.warmup()` builds the registered components in order on a
+background thread. A new worker can therefore accept connections as soon as
+app.py is imported, and most first requests find their component ready.
+`ready()` reports whether every required component is built, which backs
+the /api/ready readiness probe. Each probe also calls `warmup()`, which
+rebuilds the required components that failed (a registry on a network
+share that was not mounted yet, say), waiting RETRY_MIN seconds after the
+first failure and twice as long after each further one, up to RETRY_MAX. The startup report gives the import time and
+each component's build time.
+"""
+
+import sys
+import threading
+import time
+
+PROCESS_STARTED = time.perf_counter()
+
+_MISSING = object()
+RETRY_MIN = 1.0
+RETRY_MAX = 60.0
+
+
+class Component:
+    def __init__(self, name, factory, required=True):
+        self.name = name
+        self.factory = factory
+        self.required = required
+        self.state = "pending"
+        self.seconds = None
+        self.error = None
+        self._value = _MISSING
+        self._lock = threading.Lock()
+
+    def get(self):
+        value = self._value
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            if self._value is _MISSING:
+                self.state = "loading"
+                started = time.perf_counter()
+                try:
+                    self._value = self.factory()
+                except Exception as error:
+                    self.state, self.error = "failed", f"{type(error).__name__}: {error}"
+                    raise
+                finally:
+                    self.seconds = time.perf_counter() - started
+                self.state, self.error = "ready", None
+            return self._value
+
+    @property
+    def ready(self):
+        return self._value is not _MISSING
+
+    def status(self):
+        return {"state": self.state, "required": self.required,
+                "seconds": round(self.seconds, 4) if self.seconds is not None else None, "error": self.error}
+
+
+class Components:
+    def __init__(self, retry_min=RETRY_MIN, retry_max=RETRY_MAX):
+        self.items = {}
+        self.imported = None
+        self.warmed = None
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self._backoff = retry_min
+        self._retry_at = 0.0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def add(self, name, factory, required=True):
+        component = self.items[name] = Component(name, factory, required)
+        return component
+
+    def mark_imported(self):
+        self.imported = time.perf_counter() - PROCESS_STARTED
+
+    def warm(self, names=None):
+        """Build the components in registration order; failures are recorded, not raised."""
+        for name in names or list(self.items):
+            try:
+                self.items[name].get()
+            except Exception:
+                pass
+        self.warmed = time.perf_counter() - PROCESS_STARTED
+        return self.report()
+
+    def failed(self):
+        return [name for name, component in self.items.items() if component.required and component.state == "failed"]
+
+    def warmup(self, names=None, log=sys.stderr):
+        """Start warming up in a daemon thread. Later calls return that thread, or, once it is done and its
+        backoff has passed, start another one for the failed required components. The startup report is
+        written to `log` after every run."""
+        def run(names):
+            report = self.warm(names)
+            with self._lock:
+                if self.failed():
+                    self._retry_at = time.monotonic() + self._backoff
+                    self._backoff = min(self._backoff * 2, self.retry_max)
+                else:
+                    self._backoff = self.retry_min
+            if log is not None:
+                print(format_report(report), file=log)
+
+        with self._lock:
+            if self._thread is not None:
+                if self._thread.is_alive() or time.monotonic() < self._retry_at:
+                    return self._thread
+                names = self.failed()
+                if not names:
+                    return self._thread
+            self._thread = threading.Thread(target=run, args=(names,), name="warmup", daemon=True)
+            self._thread.start()
+            return self._thread
+
+    def ready(self):
+        return all(component.ready for component in self.items.values() if component.required)
+
+    def report(self):
+        return {"ready": self.ready(),
+                "import_seconds": round(self.imported, 4) if self.imported is not None else None,
+                "warmup_seconds": round(self.warmed, 4) if self.warmed is not None else None,
+                "components": {name: component.status() for name, component in self.items.items()}}
+
+
+def format_report(report):
+    parts = []
+    for name, status in report["components"].items():
+        if status["state"] == "ready":
+            parts.append(f"{name} {status['seconds'] * 1000:.0f} ms")
+        else:
+            parts.append(f"{name} {status['state']}" + (f" ({status['error']})" if status["error"] else ""))
+    imported = report["import_seconds"]
+    warmed = report["warmup_seconds"]
+    return (f"startup: imported in {imported * 1000:.0f} ms" if imported is not None else "startup:") + (
+        f", warm in {warmed * 1000:.0f} ms" if warmed is not None else "") + " (" + ", ".join(parts) + ")"
@@ -0,0 +1,24 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# tests import app.py directly; no background warmup thread, and sessions stay in memory
+os.environ.setdefault("WARMUP", "0")
+os.environ.pop("SESSION_REDIS_URL", None)
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    import app
+
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,110 @@
+import pytest
+
+import analyze_macau_data as analysis
+from registry_data import RegistryTable
+
+
+def record(source, measure, year, icd10, site_zh, cancer_type, sex, age_group, value):
+    return (source, measure, year, icd10, site_zh, site_zh, cancer_type, sex, age_group, value)
+
+
+def synthetic_frame():
+    records = []
+    top = [("C33-C34", "肺", "lung_cancer", 400), ("C18-C21", "结直肠", "colorectal_cancer", 300),
+           ("C50", "乳腺", "breast_cancer", 250), ("C61", "前列腺", "prostate_cancer", 180),
+           ("C22", "肝", "liver_cancer", 100), ("C73", "甲状腺", "thyroid_cancer", 90)]
+    for icd10, site, cancer_type, value in top:
+        records.append(record("top_ten", "new_cases", 2022, icd10, site, cancer_type, "all", "all", value))
+    for band, value in zip(analysis.STUDY_AGE_DISTRIBUTION, [50, 100, 210, 240, 230, 170]):
+        records.append(record("age_groups", "new_cases", 2022, "", "所有部位", "", "all", band, value))
+    for icd10, site, cancer_type, male, female in [("C61", "前列腺", "prostate_cancer", 180, 0),
+                                                   ("C50", "乳腺", "breast_cancer", 2, 248),
+                                                   ("C53", "子宫颈", "cervical_cancer", 0, 30),
+                                                   ("C62", "睾丸", "", 20, 0),
+                                                   ("C33-C34", "肺", "lung_cancer", 250, 150)]:
+        records.append(record("registry_report", "new_cases", 2022, icd10, site, cancer_type, "male", "all", male))
+        records.append(record("registry_report", "new_cases", 2022, icd10, site, cancer_type, "female", "all",
+                              female))
+    return RegistryTable.from_records(records).to_frame()
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis, "CACHE_DIR", tmp_path)
+    return tmp_path
+
+
+def test_overlap_stage():
+    overlap = analysis.stage_overlap(synthetic_frame())
+    assert overlap["year"] == 2022
+    assert overlap["matched_study_cancers"] == ["乳腺", "肺", "结直肠", "前列腺"]
+    assert overlap["overlap_rate"] == 0.8
+    assert overlap["top_ten_case_coverage"] == pytest.approx(1130 / 1320)
+
+
+def test_age_stage_correlates_distributions():
+    age = analysis.stage_age(synthetic_frame())
+    assert age["bands"] == list(analysis.STUDY_AGE_DISTRIBUTION)
+    assert sum(age["macau_distribution"]) == pytest.approx(1.0, abs=1e-3)
+    assert 0.9 < age["pearson_r"] <= 1.0
+
+
+def test_gender_stage_weights_sex_specific_sites_by_cases():
+    gender = analysis.stage_gender(synthetic_frame())
+    sites = {site["icd10"]: site for site in gender["sex_specific_sites"]}
+    assert set(sites) == {"C61", "C50", "C53", "C62"}
+    assert sites["C62"]["covered"] is False and sites["C50"]["sex"] == "female"
+    assert gender["gender_fit"] == pytest.approx(460 / 480)
+
+
+def test_run_stage_reuses_cached_output_until_the_input_changes(cache_dir):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"value": len(calls)}
+
+    assert analysis.run_stage("overlap", "input-a", compute)[::2] == ({"value": 1}, False)
+    assert analysis.run_stage("overlap", "input-a", compute)[::2] == ({"value": 1}, True)
+    assert analysis.run_stage("overlap", "input-b", compute)[::2] == ({"value": 2}, False)
+    assert len(list(cache_dir.glob("overlap-*.pkl"))) == 1
+    assert analysis.run_stage("overlap", "input-b", compute, force=True)[::2] == ({"value": 3}, False)
+
+
+def fake_parse(path):
+    return [record("top_ten", "new_cases", 2022, "C50", path.stem, "breast_cancer", "all", "all", 1.0)]
+
+
+def test_load_stage_parses_only_changed_workbooks(cache_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis, "parse_workbook", fake_parse)
+    books = tmp_path / "books"
+    books.mkdir()
+    files = [books / "a.xlsx", books / "b.xlsx"]
+    for path in files:
+        path.write_bytes(path.name.encode())
+    loaded, key, parsed = analysis.stage_load(files, workers=1)
+    assert parsed == 2 and loaded[files[0]][0][4] == "a"
+    assert analysis.stage_load(files, workers=1)[1:] == (key, 0)
+    files[1].write_bytes(b"changed")
+    _, changed_key, parsed = analysis.stage_load(files, workers=1)
+    assert parsed == 1 and changed_key != key
+
+
+def test_parser_version_invalidates_parsed_workbooks(cache_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis, "parse_workbook", fake_parse)
+    path = tmp_path / "a.xlsx"
+    path.write_bytes(b"a")
+    _, key, _ = analysis.stage_load([path], workers=1)
+    monkeypatch.setattr(analysis, "PARSER_VERSION", analysis.PARSER_VERSION + 1)
+    _, new_key, parsed = analysis.stage_load([path], workers=1)
+    assert parsed == 1 and new_key != key
+
+
+def test_pipeline_times_every_stage(cache_dir, monkeypatch):
+    monkeypatch.setattr(analysis, "stage_load", lambda files, workers, force=False: ({}, "k", 0))
+    monkeypatch.setattr(analysis, "stage_normalize", lambda loaded: synthetic_frame())
+    _, timings = analysis.run_pipeline()
+    assert set(timings) == {"load", "normalize", "overlap", "age", "gender", "total_seconds"}
+    assert timings["normalize"]["cached"] is False
+    _, timings = analysis.run_pipeline()
+    assert all(timings[name]["cached"] for name in ("normalize", "overlap", "age", "gender"))
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from flask import Flask, jsonify
+
+
+def asgi_get(application, path):
+    async def call():
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": [],
+                 "root_path": "", "scheme": "http", "server": ("testserver", 80), "http_version": "1.1"}
+        await application(scope, receive, send)
+        return sent[0]["status"]
+    return call()
+
+
+@pytest.fixture
+def slow_app(app_module, monkeypatch):
+    import asgi
+
+    monkeypatch.setattr(app_module, "CHAT_SLOTS", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(app_module, "CHAT_QUEUE_TIMEOUT", 0.2)
+    flask_app = Flask("slow")
+
+    @flask_app.route("/sync")
+    def slow_sync():
+        time.sleep(0.4)
+        return jsonify(ok=True)
+
+    @flask_app.route("/async")
+    async def slow_async():
+        await asyncio.sleep(0.4)
+        return jsonify(ok=True)
+
+    @flask_app.route("/limited")
+    @app_module.limit_concurrency
+    async def limited():
+        await asyncio.sleep(0.4)
+        return jsonify(ok=True)
+
+    return asgi.ThreadedWsgiToAsgi(flask_app)
+
+
+def test_requests_run_on_the_request_pool():
+    import asgi
+
+    flask_app = Flask("threads")
+    threads = []
+
+    @flask_app.route("/")
+    def which_thread():
+        threads.append(threading.current_thread().name)
+        return jsonify(ok=True)
+
+    assert asyncio.run(asgi_get(asgi.ThreadedWsgiToAsgi(flask_app), "/")) == 200
+    assert threads[0].startswith("asgi")
+
+
+def test_unsupported_asgiref_is_refused(monkeypatch):
+    import asgi
+    from asgiref.wsgi import WsgiToAsgiInstance
+
+    assert asgi.wsgi_runner() is asgi.RUN_WSGI_APP
+
+    async def rewritten(self, body):
+        pass
+
+    monkeypatch.setattr(WsgiToAsgiInstance, "run_wsgi_app", rewritten)
+    with pytest.raises(ImportError, match="unsupported asgiref release"):
+        asgi.wsgi_runner()
+
+
+@pytest.mark.parametrize("path", ["/sync", "/async"])
+def test_asgi_requests_overlap(slow_app, path):
+    async def main():
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*[asgi_get(slow_app, path) for _ in range(4)])
+        return statuses, time.perf_counter() - started
+
+    statuses, elapsed = asyncio.run(main())
+    assert statuses == [200] * 4
+    # four 0.4 s requests served one after another would take 1.6 s
+    assert elapsed < 1.0
+
+
+def test_admission_sheds_without_blocking_the_event_loop(slow_app):
+    async def main():
+        gaps = []
+
+        async def ticker():
+            last = time.perf_counter()
+            for _ in range(30):
+                await asyncio.sleep(0.01)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        results = await asyncio.gather(asgi_get(slow_app, "/limited"), asgi_get(slow_app, "/limited"), ticker())
+        return sorted(results[:2]), max(gaps)
+
+    statuses, longest_gap = asyncio.run(main())
+    assert statuses == [200, 503]
+    # a blocking acquire would stall the loop for the whole 0.2 s queue timeout
+    assert longest_gap < 0.1
+
+
+def test_queued_request_is_admitted_when_a_slot_frees(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "CHAT_SLOTS", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(app_module, "CHAT_QUEUE_TIMEOUT", 2.0)
+
+    async def main():
+        assert await app_module.acquire_slot()
+        asyncio.get_running_loop().call_later(0.1, app_module.CHAT_SLOTS.release)
+        return await app_module.acquire_slot()
+
+    assert asyncio.run(main()) is True
+    app_module.CHAT_SLOTS.release()
+    assert app_module.CHAT_SLOTS.acquire(blocking=False)
+
+
+def test_cancelled_waiter_returns_its_slot(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "CHAT_SLOTS", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(app_module, "CHAT_QUEUE_TIMEOUT", 1.0)
+
+    async def main():
+        assert await app_module.acquire_slot()
+        waiter = asyncio.ensure_future(app_module.acquire_slot())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        app_module.CHAT_SLOTS.release()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    assert app_module.CHAT_SLOTS.acquire(blocking=False)
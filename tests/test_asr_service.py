@@ -0,0 +1,118 @@
+import base64
+import io
+import json
+import sys
+import types
+import wave
+
+import pytest
+
+import asr_service
+from asr_service import (ASRError, ASRUnavailable, SpeechRecognizer, normalize_language, normalize_transcript,
+                         parse_wav_header, split_chunks)
+
+
+class FakeRecognizer:
+    def __init__(self, model, rate):
+        self.model, self.rate, self.received = model, rate, b""
+
+    def AcceptWaveform(self, chunk):
+        self.received += chunk
+
+    def FinalResult(self):
+        return json.dumps({"text": f"{self.model.path} {self.rate} {len(self.received)}"})
+
+
+@pytest.fixture
+def models(tmp_path, monkeypatch):
+    fake = types.SimpleNamespace(SetLogLevel=lambda level: None, KaldiRecognizer=FakeRecognizer,
+                                 Model=lambda path: types.SimpleNamespace(path=path.rsplit("/", 1)[-1]))
+    monkeypatch.setitem(sys.modules, "vosk", fake)
+    monkeypatch.setattr(asr_service, "vosk_available", lambda: True)
+    for name in ("en", "zh-cn", "Not_A_Language"):
+        (tmp_path / "models" / name).mkdir(parents=True)
+    (tmp_path / "secret").mkdir()
+    return tmp_path / "models"
+
+
+def wav_bytes(frames, rate=16000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as handle:
+        handle.setnchannels(1)
+        handle.setsampwidth(2)
+        handle.setframerate(rate)
+        handle.writeframes(b"\0\0" * frames)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("language, code", [("en", "en"), ("EN", "en"), (" zh-CN ", "zh-cn")])
+def test_language_codes_are_case_folded(language, code):
+    assert normalize_language(language) == code
+
+
+@pytest.mark.parametrize("language", ["", None, 7, ["en"], "../secret", "en/../../secret", "/etc", "..", "eng",
+                                      "zh_cn", "e\nn", "e n", "ｅｎ"])
+def test_malformed_languages_are_rejected(language):
+    with pytest.raises(ASRError):
+        normalize_language(language)
+
+
+def test_only_installed_model_directories_are_available(models):
+    recognizer = SpeechRecognizer(model_dir=models)
+    assert recognizer.languages() == {"en", "zh-cn"}
+    assert recognizer.available("ZH-cn") and not recognizer.available("fr")
+    with pytest.raises(ASRError):
+        recognizer.available("../secret")
+    assert SpeechRecognizer(model_dir=models / "missing").languages() == set()
+
+
+def test_traversal_never_reaches_the_model_loader(models):
+    recognizer = SpeechRecognizer(model_dir=models)
+    with pytest.raises(ASRError):
+        recognizer.recognize([wav_bytes(10)], "../secret")
+    with pytest.raises(ASRUnavailable):
+        recognizer.recognize([wav_bytes(10)], "fr")
+    assert recognizer.stats()["models_loaded"] == []
+
+
+def test_streamed_wav_is_recognized_with_its_header_rate(models):
+    recognizer = SpeechRecognizer(model_dir=models)
+    audio = wav_bytes(4000, rate=8000)
+    assert recognizer.recognize(split_chunks(audio, 100), "EN") == "en 8000 8000"
+    assert recognizer.recognize([b"\1\0" * 50], "zh-cn", 16000) == "zh-cn 16000 100"
+    assert recognizer.preload(["en", " ZH-CN", "fr"]) == ["en", "zh-cn"]
+    assert recognizer.stats()["recognitions"] == 2
+
+
+@pytest.mark.parametrize("audio, message", [
+    ([b""], "empty"),
+    ([b"RIFF\0\0\0\0WAVX"], "not a WAV"),
+    ([b"\0\0" * 10], "sample rate"),
+])
+def test_malformed_audio_is_rejected(models, audio, message):
+    sample_rate = 4000 if message == "sample rate" else None
+    with pytest.raises(ASRError, match=message):
+        SpeechRecognizer(model_dir=models).recognize(audio, "en", sample_rate)
+
+
+def test_wav_header_needs_pcm_mono():
+    header = bytearray(wav_bytes(0))
+    assert parse_wav_header(bytes(header)) == (16000, 44)
+    assert parse_wav_header(bytes(header[:20])) is None
+    header[22] = 2
+    with pytest.raises(ASRError, match="mono"):
+        parse_wav_header(bytes(header))
+
+
+def test_cjk_transcripts_are_joined():
+    assert normalize_transcript(" 肺 癌 副作用 lung cancer ") == "肺癌副作用 lung cancer"
+
+
+def test_voice_endpoint_rejects_path_like_languages(client):
+    response = client.post("/api/multimodal/voice?language=../../etc", data=wav_bytes(10),
+                           content_type="audio/wav")
+    assert response.status_code == 400
+    response = client.post("/api/multimodal/voice", json={"audio": base64.b64encode(wav_bytes(10)).decode(),
+                                                           "language": {"en": 1}})
+    assert response.status_code == 400
+    assert client.post("/api/multimodal/voice", json={"audio": "%%"}).status_code == 400
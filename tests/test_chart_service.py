@@ -0,0 +1,46 @@
+import pytest
+
+from chart_service import CHARTS, ChartError, ChartService
+
+TREND = {"title": "Lung", "measure": "new_cases", "years": [2020, 2021], "values": [10.0, 12.0]}
+
+
+@pytest.fixture
+def service(tmp_path):
+    return ChartService(cache_dir=str(tmp_path), workers=1)
+
+
+def test_options_validate_format_and_clamp_dpi(service):
+    assert service.options({}) == ("png", 150)
+    assert service.options({"format": "SVG", "dpi": "5000"}) == ("svg", 300)
+    with pytest.raises(ChartError):
+        service.options({"format": "gif"})
+    with pytest.raises(ChartError):
+        service.options({"dpi": "high"})
+
+
+def test_key_depends_on_chart_data_and_options(service):
+    key = service.key("registry-trend", TREND, "png", 100)
+    assert key == service.key("registry-trend", dict(TREND), "png", 100)
+    assert key != service.key("registry-trend", {**TREND, "values": [1.0, 2.0]}, "png", 100)
+    assert key != service.key("registry-trend", TREND, "svg", 100)
+    assert key != service.key("registry-age", TREND, "png", 100)
+
+
+def test_render_uses_memory_then_disk_cache(service, tmp_path):
+    body, key = service.render("registry-trend", TREND, "svg", 60)
+    assert body.startswith(b"<?xml") and service.renders == 1
+    assert service.render("registry-trend", TREND, "svg", 60) == (body, key)
+    fresh = ChartService(cache_dir=str(tmp_path), workers=1)
+    assert fresh.render("registry-trend", TREND, "svg", 60) == (body, key)
+    assert fresh.renders == 0 and fresh.disk_hits == 1
+
+
+def test_chart_endpoint(client):
+    assert client.get("/api/charts/nope").status_code == 404
+    assert client.get("/api/charts/registry-trend").status_code == 400
+    response = client.get("/api/charts/timeline?format=svg&dpi=50")
+    assert response.status_code == 200 and response.mimetype == "image/svg+xml"
+    assert client.get("/api/charts/timeline?format=svg&dpi=50",
+                      headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    assert set(CHARTS) >= {"figure5", "figure7", "timeline", "registry-trend", "registry-age"}
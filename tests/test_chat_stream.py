@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(app_module):
+    app_module.RESPONSE_CACHE.clear()
+
+
+@pytest.mark.parametrize("query", ["What are lung cancer side effects?", "nausea help", "hello"])
+def test_streamed_sections_join_to_the_plain_response(client, query):
+    plain = client.post("/api/chat", json={"query": query, "context": {"age": 70}}).get_json()["response"]
+    response = client.post("/api/chat", json={"query": query, "context": {"age": 70}, "stream": True})
+    assert response.mimetype == "text/event-stream"
+    assert response.headers["Cache-Control"] == "no-cache"
+    events = parse_events(response.get_data(as_text=True))
+    assert events[-1][0] == "done" and events[-1][1]["system_type"] == "ai"
+    sections = [payload["text"] for event, payload in events[:-1]]
+    assert all(event == "section" for event, _ in events[:-1])
+    assert ("\n\n".join(sections) if sections else plain) == plain
+
+
+def test_accept_header_selects_the_event_stream(client):
+    response = client.post("/api/chat", json={"query": "breast treatment"},
+                           headers={"Accept": "text/event-stream"})
+    assert response.mimetype == "text/event-stream"
+    names = [payload.get("name") for _, payload in parse_events(response.get_data(as_text=True))]
+    assert names[0] == "guideline"
+    json_response = client.post("/api/chat", json={"query": "breast treatment"},
+                                headers={"Accept": "application/json"})
+    assert json_response.is_json
+
+
+@pytest.mark.parametrize("stream", ["false", "0", "true", 1, 0, None, [], {}])
+def test_only_a_json_true_stream_flag_selects_the_event_stream(client, stream):
+    response = client.post("/api/chat", json={"query": "breast treatment", "stream": stream})
+    assert response.status_code == 200 and response.mimetype == "application/json"
+
+
+def test_baseline_streams_a_single_section(client):
+    response = client.post("/api/chat", json={"query": "x", "system_type": "baseline", "stream": True})
+    events = parse_events(response.get_data(as_text=True))
+    assert [event for event, _ in events] == ["section", "done"]
+    assert events[0][1]["name"] == "baseline"
+
+
+def test_stream_is_cached_only_when_fully_consumed(app_module):
+    kb = app_module.KNOWLEDGE.current()
+    key = app_module.response_key(kb, "What are lung cancer side effects?", {}, None)
+    stream = app_module.iter_cached_sections(kb, key)
+    next(stream)
+    stream.close()
+    assert app_module.RESPONSE_CACHE.get((kb.digest,) + key) is None
+    sections = list(app_module.iter_cached_sections(kb, key))
+    assert app_module.RESPONSE_CACHE.get((kb.digest,) + key) == tuple(sections)
+    assert list(app_module.iter_cached_sections(kb, key)) == sections
+
+
+def test_malformed_stream_context_is_rejected_before_streaming(client):
+    response = client.post("/api/chat", json={"query": "lung", "stream": True, "context": {"age": [1]}})
+    assert response.status_code == 400
@@ -0,0 +1,75 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import evaluate_responses
+from evaluate_responses import build_corpus, compute_metrics, evaluate, load_corpus, summarize
+
+SNAPSHOT = {
+    "version": 3,
+    "cancer_synonyms": {"lung_cancer": ["lung", "肺"]},
+    "intent_synonyms": {"treatment": ["treatment"]},
+    "nccn_guidelines": {"lung_cancer": {"treatment": "Lung guideline text.", "side_effects": "Lung effects."}},
+}
+
+
+def test_build_corpus_is_seeded_and_labelled():
+    corpus = build_corpus(SNAPSHOT, 50, seed=1)
+    assert len(corpus) == 50 and corpus == build_corpus(SNAPSHOT, 50, seed=1)
+    assert {item["cancer_type"] for item in corpus} <= {"lung_cancer", None}
+    assert all(item["intent"] == "treatment" for item in corpus if item["cancer_type"])
+
+
+def test_load_corpus_reads_jsonl_and_plain_lines(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    path.write_text('{"query": "lung help", "cancer_type": "Lung Cancer", "intent": " TREATMENT "}\n'
+                    "\n"
+                    "plain question\n", encoding="utf-8")
+    first, second = load_corpus(path)
+    assert (first["cancer_type"], first["intent"], first["context"]) == ("lung_cancer", "treatment", {})
+    assert second == {"query": "plain question", "context": {}, "cancer_type": None, "intent": None}
+
+
+@pytest.mark.parametrize("line, message", [
+    ("{not json", "queries.jsonl:2"),
+    ('{"context": {}}', "query"),
+    ('{"query": "  "}', "query"),
+    ('{"query": 5}', "query"),
+    ('{"query": "x", "context": [1]}', "context"),
+    ('{"query": "x", "cancer_type": ["lung"]}', "queries.jsonl:2"),
+])
+def test_load_corpus_reports_malformed_lines(tmp_path, line, message):
+    path = tmp_path / "queries.jsonl"
+    path.write_text('{"query": "fine"}\n' + line + "\n", encoding="utf-8")
+    with pytest.raises(ValueError, match=message):
+        load_corpus(path)
+
+
+def test_compute_metrics_on_known_responses():
+    texts = np.array(["Lung guideline text. 【Local Healthcare Resources】 Macau clinic",
+                      "Please consult your provider."], dtype=object)
+    corpus = [{"query": "q", "context": {}, "cancer_type": "lung_cancer", "intent": "treatment"},
+              {"query": "q", "context": {}, "cancer_type": "lung_cancer", "intent": "treatment"},
+              {"query": "q", "context": {}, "cancer_type": None, "intent": None}]
+    metrics = compute_metrics(texts, np.array([0, 1, 1]), corpus, SNAPSHOT["nccn_guidelines"])
+    assert metrics["words"].tolist() == [8, 4, 4]
+    assert metrics["topic_hit"][:2].tolist() == [1.0, 0.0] and np.isnan(metrics["topic_hit"][2])
+    assert metrics["local_resources"].tolist() == [1.0, 0.0, 0.0]
+    assert metrics["keyword_recall"].tolist() == [1 / 3, 0.0, 0.0]
+    assert metrics["section_coverage"][0] == pytest.approx(2 / 6)
+    summary = summarize(metrics)
+    assert summary["topic_hit"]["n"] == 2 and summary["topic_hit"]["mean"] == 0.5
+
+
+def test_evaluate_replays_both_systems(app_module, monkeypatch):
+    monkeypatch.setattr(evaluate_responses, "ProcessPoolExecutor", ThreadPoolExecutor)
+    snapshot = json.loads(open(app_module.KNOWLEDGE.path, encoding="utf-8").read())
+    corpus = build_corpus(snapshot, 40)
+    results = evaluate(corpus, snapshot, workers=2, chunk=15)
+    assert results["queries"] == 40 and results["knowledge_version"] == snapshot["version"]
+    ai, baseline = results["systems"]["ai"], results["systems"]["traditional"]
+    assert len(ai["lengths"]) == len(baseline["lengths"]) == 40
+    assert len(set(baseline["lengths"])) == 1
+    assert ai["summary"]["topic_hit"]["mean"] > baseline["summary"]["topic_hit"]["mean"]
@@ -0,0 +1,47 @@
+import generate_all_figures as figures
+from generate_all_figures import FIGURES, code_sources, content_hash, generate_figures
+
+
+def test_code_sources_follow_helper_calls():
+    sources = code_sources(FIGURES[7].draw)
+    assert any(source.startswith("def histogram_bins") for source in sources)
+    assert len(code_sources(FIGURES[5].draw)) == 1
+
+
+def test_hash_changes_with_a_shared_helper(monkeypatch):
+    data = FIGURES[7].data()
+    before = content_hash(FIGURES[7], data, "png", 100)
+    assert content_hash(FIGURES[7], data, "png", 100) == before
+    unrelated = content_hash(FIGURES[5], FIGURES[5].data(), "png", 100)
+
+    def histogram_bins(values, count):
+        return count * 2
+
+    monkeypatch.setattr(figures, "histogram_bins", histogram_bins)
+    assert content_hash(FIGURES[7], data, "png", 100) != before
+    # figures that do not use the helper keep their hash
+    assert content_hash(FIGURES[5], FIGURES[5].data(), "png", 100) == unrelated
+
+
+def test_hash_changes_with_style_and_data(monkeypatch):
+    data = FIGURES[5].data()
+    before = content_hash(FIGURES[5], data, "png", 100)
+    assert content_hash(FIGURES[5], {**data, "ai_means": [1, 2, 3, 4, 5]}, "png", 100) != before
+    assert content_hash(FIGURES[5], data, "svg", 100) != before
+    monkeypatch.setattr(figures, "STYLE", {**figures.STYLE, "font.size": 13})
+    figures.rc_digest.cache_clear()
+    try:
+        assert content_hash(FIGURES[5], data, "png", 100) != before
+    finally:
+        monkeypatch.undo()
+        figures.rc_digest.cache_clear()
+
+
+def test_generate_figures_skips_unchanged_output(tmp_path):
+    first = generate_figures([5, 6], output_dir=str(tmp_path), fmt="svg", dpi=50, workers=1)
+    assert [skipped for _, skipped in first.values()] == [False, False]
+    assert all((tmp_path / f"{FIGURES[number].filename}.svg").exists() for number in (5, 6))
+    again = generate_figures([5, 6], output_dir=str(tmp_path), fmt="svg", dpi=50, workers=1)
+    assert [skipped for _, skipped in again.values()] == [True, True]
+    forced = generate_figures([5], output_dir=str(tmp_path), fmt="svg", dpi=50, workers=1, force=True)
+    assert forced[5][1] is False
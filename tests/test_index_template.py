@@ -0,0 +1,133 @@
+import json
+import shutil
+import subprocess
+from html.parser import HTMLParser
+
+import pytest
+
+PAYLOAD = "<img src=x onerror=\"alert('x')\"><script>alert(1)</script>"
+
+# a minimal DOM and fetch, enough to run the page's chat, stream and OCR handlers under node
+HARNESS = r"""
+class Element {
+    constructor(tag) {
+        this.tag = tag;
+        this.children = [];
+        this.className = '';
+        this.innerHTML = '';
+        this.classList = { add() {}, remove() {} };
+    }
+    appendChild(child) { this.children.push(child); return child; }
+    click() {}
+}
+const elements = {};
+const created = [];
+globalThis.document = {
+    getElementById: id => elements[id] || (elements[id] = new Element('div')),
+    createElement: tag => { const element = new Element(tag); created.push(element); return element; },
+    querySelectorAll: () => [],
+};
+class FileReader { readAsDataURL() { this.result = 'data:image/png;base64,AA=='; this.onload(); } }
+globalThis.FileReader = FileReader;
+
+const replies = JSON.parse(process.argv[1]);
+const encoder = new TextEncoder();
+globalThis.fetch = async (url) => {
+    const reply = replies[url.split('?')[0]] || { status: 200, json: {} };
+    const sse = reply.sse === undefined ? null : encoder.encode(reply.sse);
+    return {
+        ok: reply.status < 400,
+        status: reply.status,
+        headers: { get: () => (sse ? 'text/event-stream' : 'application/json') },
+        body: sse && { getReader: () => {
+            let sent = false;
+            return { read: async () => (sent ? { done: true } : (sent = true, { value: sse, done: false })) };
+        } },
+        json: async () => reply.json,
+    };
+};
+"""
+
+DRIVER = r"""
+(async () => {
+    document.getElementById('chatInput').value = process.argv[2];
+    await sendMessage();
+    uploadImage();
+    const input = created.find(element => element.tag === 'input');
+    await input.onchange({ target: { files: [{ name: process.argv[2] + '.png' }] } });
+    await new Promise(resolve => setTimeout(resolve, 10));
+    const html = [];
+    const walk = element => { if (element.innerHTML) html.push(element.innerHTML); element.children.forEach(walk); };
+    walk(document.getElementById('chatMessages'));
+    process.stdout.write(JSON.stringify(html));
+})();
+"""
+
+
+class Markup(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.tags, self.text = set(), []
+
+    def handle_starttag(self, tag, attrs):
+        self.tags.add(tag)
+
+    def handle_data(self, data):
+        self.text.append(data)
+
+
+def page_script(page):
+    scripts = []
+
+    class Scripts(HTMLParser):
+        def handle_starttag(self, tag, attrs):
+            self.inside = tag == "script"
+
+        def handle_endtag(self, tag):
+            self.inside = False
+
+        def handle_data(self, data):
+            if getattr(self, "inside", False):
+                scripts.append(data)
+
+    Scripts().feed(page)
+    return "".join(scripts)
+
+
+def test_index_page_renders(client):
+    response = client.get("/")
+    assert response.status_code == 200 and b"function addMessage" in response.data
+
+
+def test_untrusted_text_is_rendered_as_text(client):
+    node = shutil.which("node")
+    if node is None:
+        pytest.skip("node is not installed")
+    replies = {
+        "/api/session": {"status": 200, "json": {}},
+        # the chat reply as JSON here; the second run streams it as one SSE section
+        "/api/chat": {"status": 200, "json": {"response": f"【Risk Alert】{PAYLOAD}"}},
+        "/api/multimodal/image": {"status": 200, "json": {
+            "lab_values": [{"test": PAYLOAD, "value": 1, "unit": PAYLOAD, "status": "high"}],
+            "extracted_text": PAYLOAD, "interpretation": PAYLOAD}},
+    }
+    script = HARNESS + page_script(client.get("/").get_data(as_text=True)) + DRIVER
+
+    def run(replies):
+        result = subprocess.run([node, "-e", script, json.dumps(replies), PAYLOAD], capture_output=True,
+                                text=True, check=True)
+        return json.loads(result.stdout)
+
+    rendered = run(replies)
+    replies["/api/chat"] = {"status": 200,
+                            "sse": f"event: section\ndata: {json.dumps({'name': 'risk_alert', 'text': PAYLOAD})}\n\n"}
+    rendered += run(replies)
+
+    # user message, reply and lab report (file name, values, text) of each run
+    assert len(rendered) == 8
+    for html in rendered:
+        markup = Markup()
+        markup.feed(html)
+        markup.close()
+        assert markup.tags <= {"div", "br"}, html
+        assert PAYLOAD in "".join(markup.text)
@@ -0,0 +1,98 @@
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from knowledge_store import KnowledgeStore, SnapshotError, read_snapshot
+
+
+def write(path, version, **extra):
+    snapshot = {"version": version, "nccn_guidelines": {}, "macau_resources": {}, "risk_rules": [],
+                "process_steps": {}, **extra}
+    path.write_text(json.dumps(snapshot))
+    # make sure the (mtime, size) signature changes even within one clock tick
+    os.utime(path, ns=(version * 10 ** 9, version * 10 ** 9))
+
+
+def build(snapshot):
+    if snapshot.get("broken"):
+        raise ValueError("cannot compile")
+    return SimpleNamespace(rules=list(snapshot["risk_rules"]))
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    path = tmp_path / "knowledge_base.json"
+    write(path, 1)
+    return path
+
+
+def test_read_snapshot_validates_required_keys(tmp_path):
+    path = tmp_path / "kb.json"
+    path.write_text(json.dumps({"version": 1}))
+    with pytest.raises(SnapshotError, match="missing"):
+        read_snapshot(path)
+    path.write_text("{not json")
+    with pytest.raises(SnapshotError):
+        read_snapshot(path)
+
+
+def test_loads_lazily_and_stamps_version(snapshot_path):
+    store = KnowledgeStore(build, path=snapshot_path, check_interval=0)
+    assert store.state is None
+    state = store.current()
+    assert (state.version, store.version, store.reloads) == (1, 1, 1)
+    assert store.current() is state
+
+
+def test_hot_reload_publishes_a_new_state(snapshot_path):
+    swaps = []
+    store = KnowledgeStore(build, path=snapshot_path, check_interval=0, on_swap=swaps.append)
+    old = store.current()
+    write(snapshot_path, 2, risk_rules=[{"id": "r"}])
+    new = store.current()
+    assert new is not old and new.version == 2 and new.rules == [{"id": "r"}]
+    assert old.version == 1
+    assert swaps == [old, new]
+
+
+def test_check_interval_throttles_stat_calls(snapshot_path):
+    store = KnowledgeStore(build, path=snapshot_path, check_interval=3600)
+    store.current()
+    old = store.current()  # the first check after the initial load starts the interval
+    write(snapshot_path, 2)
+    assert store.current() is old
+    assert store.reload() is True and store.current().version == 2
+
+
+def test_touching_the_file_without_changes_keeps_the_state(snapshot_path):
+    store = KnowledgeStore(build, path=snapshot_path, check_interval=0)
+    old = store.current()
+    os.utime(snapshot_path, ns=(5 * 10 ** 9, 5 * 10 ** 9))
+    assert store.current() is old and store.reloads == 1
+
+
+def test_bad_snapshot_is_rejected_and_previous_state_keeps_serving(snapshot_path):
+    store = KnowledgeStore(build, path=snapshot_path, check_interval=0)
+    old = store.current()
+    write(snapshot_path, 2, broken=True)
+    assert store.current() is old
+    assert "cannot compile" in store.info()["last_error"]
+    snapshot_path.write_text("{")
+    assert store.current() is old
+    write(snapshot_path, 3)
+    assert store.current().version == 3 and store.info()["last_error"] is None
+
+
+def test_first_load_failure_raises(tmp_path):
+    path = tmp_path / "kb.json"
+    write(path, 1, broken=True)
+    with pytest.raises(ValueError):
+        KnowledgeStore(build, path=path).current()
+
+
+def test_knowledge_endpoint(client, app_module):
+    info = client.get("/api/knowledge").get_json()
+    snapshot, _ = read_snapshot(app_module.KNOWLEDGE.path)
+    assert info["version"] == snapshot["version"] and info["last_error"] is None
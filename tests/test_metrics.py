@@ -0,0 +1,75 @@
+import time
+
+from flask import Flask, Response, jsonify
+
+from metrics import CURRENT_ROUTE, CounterMetric, Histogram, Metrics, instrument
+
+
+def series(metrics, name):
+    histogram = metrics.request_seconds if name == "request" else metrics.stage_seconds
+    return {labels: (total, count) for labels, (_, total, count) in histogram._series.items()}
+
+
+def make_app():
+    app = Flask("metrics-test")
+    metrics = instrument(app, Metrics())
+
+    @app.route("/plain")
+    def plain():
+        with metrics.stage("work"):
+            return jsonify(route=CURRENT_ROUTE.get())
+
+    @app.route("/stream")
+    def stream():
+        def generate():
+            for chunk in ("a", "b", "c"):
+                with metrics.stage("chunk"):
+                    time.sleep(0.05)
+                yield chunk
+        return Response(generate(), mimetype="text/plain")
+
+    return app, metrics
+
+
+def test_label_values_are_escaped():
+    histogram = Histogram("h", "help", ("route",), buckets=(1.0,))
+    histogram.observe(0.5, 'a\\b"c\nd')
+    counter = CounterMetric("c", "help", ("route",))
+    counter.inc('x"y')
+    lines = histogram.render() + counter.render()
+    assert 'h_count{route="a\\\\b\\"c\\nd"} 1' in lines
+    assert 'c{route="x\\"y"} 1' in lines
+    assert all("\n" not in line for line in lines)
+
+
+def test_route_is_reset_after_each_request():
+    app, metrics = make_app()
+    client = app.test_client()
+    assert client.get("/plain").get_json() == {"route": "/plain"}
+    assert CURRENT_ROUTE.get() == "none"
+    client.get("/missing").close()  # error pages are streamed bodies, recorded when the server closes them
+    assert CURRENT_ROUTE.get() == "none"
+    assert ("/plain", "work") in series(metrics, "stage")
+    assert ("unmatched", "GET", 404) in series(metrics, "request")
+
+
+def test_streamed_response_is_timed_until_closed():
+    app, metrics = make_app()
+    response = app.test_client().get("/stream", buffered=False)
+    assert ("/stream", "GET", 200) not in series(metrics, "request")
+    assert b"".join(response.response) == b"abc"
+    assert CURRENT_ROUTE.get() == "none"
+    response.close()
+    total, count = series(metrics, "request")[("/stream", "GET", 200)]
+    assert count == 1 and total >= 0.15
+    assert series(metrics, "stage")[("/stream", "chunk")][1] == 3
+
+
+def test_app_streams_leave_no_route_behind(client, app_module):
+    with client.post("/api/risk-alert/batch", json=[{"age": 80, "gender": "F", "cancer_type": "liver_cancer"}]) as batch:
+        assert batch.status_code == 200 and batch.get_data()
+    with client.post("/api/chat", json={"query": "lung", "stream": True}) as chat:
+        assert chat.get_data()
+    assert CURRENT_ROUTE.get() == "none"
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'app_request_seconds_count{route="/api/risk-alert/batch",method="POST",status="200"}' in text
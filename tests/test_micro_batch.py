@@ -0,0 +1,117 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pytest
+
+from micro_batch import MicroBatcher
+
+
+def test_concurrent_items_share_a_batch():
+    seen = []
+
+    def double(items):
+        seen.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, max_batch=8, max_wait_ms=50)
+    futures = [batcher.submit(number) for number in range(5)]
+    assert [future.result(1) for future in futures] == [0, 2, 4, 6, 8]
+    assert seen == [[0, 1, 2, 3, 4]]
+    assert batcher.stats()["batches"] == 1 and batcher.stats()["mean_batch"] == 5.0
+
+
+def test_max_batch_splits_the_queue():
+    release = threading.Event()
+    sizes = []
+
+    def collect(items):
+        release.wait(1)
+        sizes.append(len(items))
+        return items
+
+    batcher = MicroBatcher(collect, max_batch=3, max_wait_ms=20)
+    futures = [batcher.submit(number) for number in range(7)]
+    release.set()
+    assert [future.result(1) for future in futures] == list(range(7))
+    assert sizes == [3, 3, 1] and batcher.stats()["largest"] == 3
+
+
+def test_lone_item_waits_at_most_max_wait():
+    batcher = MicroBatcher(lambda items: items, max_batch=64, max_wait_ms=20)
+    started = time.monotonic()
+    assert batcher("x", timeout=1) == "x"
+    assert time.monotonic() - started < 0.5
+
+
+def test_exceptions_fail_only_their_callers():
+    def check(items):
+        return [ValueError(item) if item < 0 else item for item in items]
+
+    batcher = MicroBatcher(check, max_wait_ms=20)
+    good, bad = batcher.submit(1), batcher.submit(-1)
+    assert good.result(1) == 1
+    with pytest.raises(ValueError):
+        bad.result(1)
+
+
+@pytest.mark.parametrize("function, error", [
+    (lambda items: 1 / 0, ZeroDivisionError),
+    (lambda items: items[:-1], RuntimeError),
+    (lambda items: None, RuntimeError),
+    (lambda items: (item for item in items), RuntimeError),
+])
+@pytest.mark.parametrize("executor", [None, "threads"])
+def test_malformed_batch_results_fail_the_whole_batch(function, error, executor):
+    pool = ThreadPoolExecutor(2) if executor else None
+    batcher = MicroBatcher(function, max_wait_ms=20, executor=pool, concurrency=2)
+    futures = [batcher.submit(number) for number in range(3)]
+    for future in futures:
+        with pytest.raises(error):
+            future.result(1)
+    # the failed batch returned its slot, so the batcher keeps working
+    batcher.function = lambda items: items
+    assert batcher(7, timeout=1) == 7
+    if pool:
+        pool.shutdown()
+
+
+def test_cancelled_items_are_skipped():
+    release = threading.Event()
+    seen = []
+
+    def slow(items):
+        release.wait(1)
+        seen.extend(items)
+        return items
+
+    batcher = MicroBatcher(slow, max_batch=1, max_wait_ms=1)
+    first = batcher.submit("first")
+    time.sleep(0.05)
+    second = batcher.submit("second")
+    assert second.cancel()
+    release.set()
+    assert first.result(1) == "first"
+    assert batcher("third", timeout=1) == "third"
+    assert seen == ["first", "third"]
+
+
+def test_executor_runs_batches_concurrently():
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def work(items):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.1)
+        with lock:
+            running[0] -= 1
+        return items
+
+    with ThreadPoolExecutor(2) as pool:
+        batcher = MicroBatcher(work, max_batch=1, max_wait_ms=1, executor=pool, concurrency=2)
+        futures = [batcher.submit(number) for number in range(4)]
+        wait(futures, timeout=2)
+    assert [future.result() for future in futures] == [0, 1, 2, 3]
+    assert peak[0] == 2
@@ -0,0 +1,88 @@
+import base64
+
+import pytest
+
+from ocr_service import OCRError, OCRService, decode_image, interpret, parse_lab_values
+
+
+def parsed(text):
+    return {value["test"]: value for value in parse_lab_values(text)}
+
+
+@pytest.mark.parametrize("text, test, status, converted", [
+    ("Hemoglobin 125 g/L", "Hemoglobin", "normal", 12.5),
+    ("Hb (g/L): 95", "Hemoglobin", "low", 9.5),
+    ("Hb 9 mmol/L", "Hemoglobin", "normal", 14.499),
+    ("CR 88 umol/L", "Creatinine", "normal", 0.995),
+    ("肌酐 150 µmol/L", "Creatinine", "high", 1.697),
+    ("WBC 4500 /uL", "WBC", "normal", 4.5),
+    ("ALT 2 ukat/L", "ALT", "high", 120.0),
+])
+def test_values_are_converted_to_the_reference_unit(text, test, status, converted):
+    value = parsed(text)[test]
+    assert (value["status"], value["converted_value"]) == (status, converted)
+
+
+@pytest.mark.parametrize("text, unit", [
+    ("WBC 3.2 x10^9/L", "x10^9/L"),
+    ("PLT 120 ×10⁹/L", "×10⁹/L"),
+    ("白细胞 3.5 x 10^9/L", "x10^9/L"),
+    ("WBC (x10^9/L): 3.2", "x10^9/L"),
+    ("Platelets 120 K/uL", "K/uL"),
+])
+def test_reference_and_equivalent_units_are_judged_unchanged(text, unit):
+    value = next(iter(parsed(text).values()))
+    assert value["unit"] == unit and value["status"] == "low" and "converted_value" not in value
+
+
+def test_units_are_case_insensitive():
+    values = parsed("HEMOGLOBIN 125 G/L\nCREATININE 1.4 MG/DL")
+    assert values["Hemoglobin"]["status"] == "normal"
+    assert values["Creatinine"]["status"] == "high"
+
+
+@pytest.mark.parametrize("text, unit", [
+    ("Neutrophils % 65", "%"),
+    ("neut 65%", "%"),
+    ("WBC 3.2", None),
+    ("WBC 3.2 foo/bar", "foo/bar"),
+    ("Creatinine 88 g/dL", "g/dL"),
+])
+def test_percentages_and_unknown_units_are_not_judged(text, unit):
+    value = next(iter(parsed(text).values()))
+    assert (value["unit"], value["status"]) == (unit, "unknown")
+    assert "converted_value" not in value
+
+
+def test_interpretation_reports_converted_and_unchecked_values():
+    text = interpret(parse_lab_values("Hb 95 g/L\nNeutrophils % 65\nWBC 3.2"))
+    assert "Hemoglobin is low (95 g/L = 9.5 g/dL, reference 12-17.5 g/dL)." in text
+    assert "Neutrophils (65 %) was not checked: a percentage needs the total white cell count." in text
+    assert "WBC (3.2) was not checked: its unit is missing." in text
+    assert "fatigue" in text
+    assert interpret(parse_lab_values("Neutrophils % 65")).startswith("No value could be checked")
+    assert interpret(parse_lab_values("Hb 130 g/L PLT 9")).startswith("The other recognized values")
+    assert interpret(parse_lab_values("Hb 130 g/L")) == "All recognized values are within their reference ranges."
+
+
+@pytest.mark.parametrize("image", [None, "", 42, "not base64!!", "data:image/png;base64,@@@"])
+def test_malformed_images_are_rejected(image):
+    with pytest.raises(OCRError):
+        decode_image(image)
+
+
+def test_oversized_image_is_rejected():
+    with pytest.raises(OCRError, match="exceeds"):
+        decode_image(base64.b64encode(b"x" * 64).decode(), max_bytes=16)
+
+
+def test_text_must_be_a_string():
+    with pytest.raises(OCRError):
+        OCRService().process(text=["Hb 9"])
+
+
+def test_image_endpoint_with_extracted_text(client):
+    data = client.post("/api/multimodal/image", json={"text": "Hemoglobin 125 g/L\nCR 88 umol/L"}).get_json()
+    assert [value["status"] for value in data["lab_values"]] == ["normal", "normal"]
+    assert client.post("/api/multimodal/image", json={"text": {"a": 1}}).status_code == 400
+    assert client.post("/api/multimodal/image", json={"image": "%%%"}).status_code == 400
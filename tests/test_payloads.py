@@ -0,0 +1,62 @@
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+
+import payloads
+from payloads import FastJSONProvider, StaticPayload, dumps_bytes
+
+
+def test_stdlib_fallback_matches_orjson(app_module, monkeypatch):
+    kb = app_module.KNOWLEDGE.current()
+    samples = [kb.knowledge_base["macau_resources"], kb.process_steps, {"b": 1, "a": [1.5, None, "肺癌"]}]
+    fast = [dumps_bytes(sample) for sample in samples]
+    monkeypatch.setattr(payloads, "orjson", None)
+    assert [dumps_bytes(sample) for sample in samples] == fast
+
+
+def test_provider_falls_back_without_orjson(app_module, monkeypatch):
+    monkeypatch.setattr(payloads, "orjson", None)
+    provider = FastJSONProvider(app_module.app)
+    text = provider.dumps({"b": "肺癌", "a": datetime(2024, 1, 2)})
+    assert json.loads(text) == {"a": "Tue, 02 Jan 2024 00:00:00 GMT", "b": "肺癌"}
+    assert provider.loads('{"x": 1}') == {"x": 1}
+
+
+def test_static_payload_revalidates_per_encoding(client):
+    plain = client.get("/api/timeline", headers={"Accept-Encoding": "identity"})
+    compressed = client.get("/api/timeline", headers={"Accept-Encoding": "GZip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(compressed.data)) == plain.get_json()
+    assert plain.headers["ETag"] != compressed.headers["ETag"]
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+    revalidated = client.get("/api/timeline", headers={"Accept-Encoding": "gzip",
+                                                       "If-None-Match": compressed.headers["ETag"]})
+    assert revalidated.status_code == 304 and revalidated.data == b""
+
+
+@pytest.mark.parametrize("etag", ['"not-the-etag"', "garbage", ""])
+def test_mismatched_or_malformed_if_none_match_gets_the_body(client, etag):
+    response = client.get("/api/resources", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.get_json()
+
+
+def test_dynamic_responses_are_compressed_and_tagged(client):
+    response = client.get("/api/search?q=lung%20cancer%20treatment&k=5", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    again = client.get("/api/search?q=lung%20cancer%20treatment&k=5",
+                       headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_small_and_streamed_responses_pass_through(client):
+    small = client.get("/api/resources", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+    stream = client.post("/api/chat", json={"query": "lung", "stream": True}, headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in stream.headers and stream.data.startswith(b"event: section")
+
+
+def test_static_payload_below_threshold_is_not_encoded():
+    payload = StaticPayload({"a": 1})
+    assert payload.encoded == {} and payload.body == b'{"a":1}\n'
@@ -0,0 +1,30 @@
+from app import build_query_matcher, match_query
+
+
+def test_matcher_prefers_listed_order(app_module):
+    kb = app_module.KNOWLEDGE.current()
+    assert match_query("lung and breast treatment", kb) == ("breast_cancer", "treatment")
+
+
+def test_matcher_is_case_insensitive(app_module):
+    kb = app_module.KNOWLEDGE.current()
+    assert match_query("LUNG Cancer SIDE EFFECT", kb) == ("lung_cancer", "side_effects")
+    assert match_query("肺癌治療", kb) == ("lung_cancer", "treatment")
+
+
+def test_matcher_casefolds_non_ascii_query(app_module):
+    kb = app_module.KNOWLEDGE.current()
+    # U+017F LATIN SMALL LETTER LONG S casefolds to "s"
+    assert match_query("ſide effect lung", kb) == ("lung_cancer", "side_effects")
+
+
+def test_matcher_casefolds_terms():
+    pattern, terms = build_query_matcher(["stomach_cancer"], {"stomach_cancer": ["MAGEN", "Straße"]}, {})
+    assert set(terms) == {"stomach cancer", "magen", "strasse"}
+    assert [match.group(0) for match in pattern.finditer("Magen STRASSE".casefold())] == ["magen", "strasse"]
+
+
+def test_chat_with_long_s_is_not_a_server_error(client):
+    response = client.post("/api/chat", json={"query": "ſide effect lung"})
+    assert response.status_code == 200
+    assert "lung" in response.get_json()["response"].lower()
@@ -0,0 +1,48 @@
+import multiprocessing
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+import registry_data
+from registry_data import RegistryTable
+
+RECORDS = [
+    ("registry_report", "new_cases", 2022, "C33-C34", "Lung", "肺", "lung_cancer", "all", "all", 450.0),
+    ("registry_report", "deaths", 2022, "C33-C34", "Lung", "肺", "lung_cancer", "all", "all", 200.0),
+]
+KEY = "c" * 40
+
+
+def test_save_when_another_worker_already_published(tmp_path):
+    winner = RegistryTable.from_records(RECORDS, key=KEY)
+    winner.save(tmp_path)
+    RegistryTable.from_records(RECORDS, key=KEY).save(tmp_path)
+    assert not list(tmp_path.glob(".staging-*"))
+    assert np.array_equal(RegistryTable.load(tmp_path).column("value"), winner.column("value"))
+
+
+def test_save_when_another_worker_publishes_during_the_rename(tmp_path, monkeypatch):
+    real_replace = os.replace
+
+    def replace(source, target):
+        if Path(target).name.startswith("registry-") and not Path(target).exists():
+            shutil.copytree(source, target)
+        return real_replace(source, target)
+
+    monkeypatch.setattr(registry_data.os, "replace", replace)
+    RegistryTable.from_records(RECORDS, key=KEY).save(tmp_path)
+    assert not list(tmp_path.glob(".staging-*"))
+    assert len(RegistryTable.load(tmp_path)) == 2
+
+
+def save_and_load(cache_dir):
+    RegistryTable.from_records(RECORDS, key=KEY).save(cache_dir)
+    return len(RegistryTable.load(cache_dir))
+
+
+def test_concurrent_first_start_builds_do_not_fail(tmp_path):
+    with multiprocessing.get_context("fork").Pool(6) as pool:
+        assert pool.map(save_and_load, [tmp_path] * 24) == [2] * 24
+    assert [path.name for path in tmp_path.glob("registry-*")] == ["registry-" + KEY[:16]]
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pytest
+
+import registry_data
+from registry_data import RegistryTable, cache_key, cancer_type_for_icd, load_registry
+
+RECORDS = [
+    ("registry_report", "new_cases", 2022, "C33-C34", "Lung", "肺", "lung_cancer", "male", "65-69", 120.0),
+    ("registry_report", "new_cases", 2022, "C33-C34", "Lung", "肺", "lung_cancer", "female", "65-69", 60.0),
+    ("registry_report", "new_cases", 2021, "C33-C34", "Lung", "肺", "lung_cancer", "all", "all", 400.0),
+    ("registry_report", "new_cases", 2022, "C33-C34", "Lung", "肺", "lung_cancer", "all", "all", 450.0),
+    ("registry_report", "deaths", 2022, "C33-C34", "Lung", "肺", "lung_cancer", "all", "all", 200.0),
+    # a duplicate of an earlier cell (e.g. the same table in two workbooks) is kept once
+    ("registry_report", "new_cases", 2022, "C33-C34", "Lung", "肺", "lung_cancer", "all", "all", 999.0),
+]
+
+
+@pytest.mark.parametrize("icd10, cancer_type", [("C34", "lung_cancer"), ("C18-C21", "colorectal_cancer"),
+                                                ("c 5", ""), ("C50", "breast_cancer"), ("", ""), (None, "")])
+def test_cancer_type_for_icd(icd10, cancer_type):
+    assert cancer_type_for_icd(icd10) == cancer_type
+
+
+def test_table_dictionary_encodes_and_deduplicates():
+    table = RegistryTable.from_records(RECORDS, key="k")
+    assert len(table) == 5
+    assert table.columns["sex"].dtype == np.int16
+    assert sorted(set(table.column("sex"))) == ["all", "female", "male"]
+    assert table.code("sex", "male") >= 0 and table.code("sex", "nobody") == -1
+
+
+def test_total_defaults_to_the_latest_year():
+    table = RegistryTable.from_records(RECORDS)
+    assert table.total("new_cases", "lung_cancer") == (2022, 450.0)
+    assert table.total("new_cases", "lung_cancer", year=2021) == (2021, 400.0)
+    assert table.total("new_cases", "lung_cancer", sex="male", age_group="65-69") == (2022, 120.0)
+    assert table.total("new_cases", "liver_cancer") == (None, None)
+
+
+def test_save_and_load_round_trip_memory_maps_columns(tmp_path):
+    table = RegistryTable.from_records(RECORDS, key="a" * 40)
+    table.save(tmp_path)
+    loaded = RegistryTable.load(tmp_path)
+    assert loaded.key == table.key
+    assert isinstance(loaded.columns["value"], np.memmap)
+    assert not loaded.columns["value"].flags.writeable
+    for name in table.columns:
+        assert np.array_equal(loaded.column(name), table.column(name))
+
+
+def test_saving_a_new_version_replaces_the_old_one(tmp_path):
+    RegistryTable.from_records(RECORDS, key="a" * 40).save(tmp_path)
+    RegistryTable.from_records(RECORDS[:2], key="b" * 40).save(tmp_path)
+    assert sorted(path.name for path in tmp_path.glob("registry-*")) == ["registry-" + "b" * 16]
+    assert len(RegistryTable.load(tmp_path)) == 2
+
+
+def test_cache_key_tracks_files_and_parser_version(tmp_path, monkeypatch):
+    workbook = tmp_path / "a.xlsx"
+    workbook.write_bytes(b"x")
+    key = cache_key([workbook])
+    os.utime(workbook, ns=(1, 1))
+    assert cache_key([workbook]) != key
+    key = cache_key([workbook])
+    monkeypatch.setattr(registry_data, "PARSER_VERSION", registry_data.PARSER_VERSION + 1)
+    assert cache_key([workbook]) != key
+
+
+def test_load_registry_without_workbooks_is_empty(tmp_path):
+    table = load_registry(data_dir=tmp_path, cache_dir=tmp_path / ".cache")
+    assert len(table) == 0
+    assert table.total("new_cases", "lung_cancer") == (None, None)
+
+
+def test_bundled_registry_loads_from_cache():
+    table = load_registry()
+    year, new_cases = table.total("new_cases", "lung_cancer")
+    assert year >= 2020 and new_cases > 0
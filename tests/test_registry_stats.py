@@ -0,0 +1,89 @@
+import pytest
+
+from registry_data import RegistryTable
+from registry_stats import RegistryStats, StatsQueryError
+
+
+def record(site, icd10, cancer_type, value, sex="all", year=2022, measure="new_cases", age_group="all",
+           source="registry_report"):
+    return (source, measure, year, icd10, site, site, cancer_type, sex, age_group, value)
+
+
+RECORDS = [
+    record("All Sites", "", "", 100.0),
+    record("Bronchus & Lung", "C33-C34", "lung_cancer", 60.0),
+    record("Breast", "C50", "breast_cancer", 30.0),
+    record("Without Specification", "", "", 10.0),
+    record("All Sites", "", "", 55.0, sex="male"),
+    record("Bronchus & Lung", "C33-C34", "lung_cancer", 40.0, sex="male"),
+    record("Breast", "C50", "breast_cancer", 15.0, sex="male"),
+    record("Bronchus & Lung", "C33-C34", "lung_cancer", 20.0, measure="deaths"),
+    record("Bronchus & Lung", "C33-C34", "lung_cancer", 50.0, year=2021),
+    record("Todos Os Locais", "", "", 90.0, source="top_ten"),
+    record("Bronchus & Lung", "C33-C34", "lung_cancer", 60.0, source="top_ten"),
+    record("Outros", "", "", 30.0, source="top_ten"),
+]
+
+
+@pytest.fixture(scope="module")
+def stats():
+    return RegistryStats(RegistryTable.from_records(RECORDS, key="k"))
+
+
+def query(stats, **params):
+    return stats.query(*stats.normalize(params))
+
+
+def test_default_query_excludes_all_sites_totals(stats):
+    assert query(stats)["value"] == 100.0 + 50.0
+    assert query(stats, source="top_ten")["value"] == 90.0
+
+
+def test_total_filter(stats):
+    assert query(stats, total="true", year="2022")["value"] == 100.0
+    assert query(stats, total="true,false", year="2022")["value"] == 200.0
+    assert query(stats, site="All Sites")["value"] == 100.0
+    with pytest.raises(StatsQueryError):
+        stats.normalize({"total": "maybe"})
+
+
+def test_sum_over_sites_matches_the_total_row(stats):
+    by_site = query(stats, group_by="site", year="2022")["rows"]
+    assert {row["site"] for row in by_site} == {"Bronchus & Lung", "Breast", "Without Specification"}
+    assert sum(row["value"] for row in by_site) == query(stats, total="true", year="2022")["value"]
+
+
+def test_group_by_multiple_dimensions(stats):
+    rows = query(stats, cancer_type="lung_cancer,breast_cancer", sex="all,male", group_by="cancer_type,sex",
+                 year="2022")["rows"]
+    assert {(row["cancer_type"], row["sex"]): row["value"] for row in rows} == {
+        ("breast_cancer", "all"): 30.0, ("breast_cancer", "male"): 15.0,
+        ("lung_cancer", "all"): 60.0, ("lung_cancer", "male"): 40.0}
+
+
+def test_group_by_year_and_filters(stats):
+    rows = query(stats, cancer_type="lung_cancer", group_by="year")["rows"]
+    assert rows == [{"year": 2021, "value": 50.0}, {"year": 2022, "value": 60.0}]
+    assert query(stats, cancer_type="lung_cancer", measure="deaths")["value"] == 20.0
+    assert query(stats, cancer_type="stomach_cancer")["matched_rows"] == 0
+
+
+def test_invalid_parameters(stats):
+    with pytest.raises(StatsQueryError):
+        stats.normalize({"group_by": "colour"})
+    with pytest.raises(StatsQueryError):
+        stats.normalize({"year": "last"})
+
+
+def test_results_are_memoized(stats):
+    filters, group_by = stats.normalize({"cancer_type": "breast_cancer"})
+    assert stats.query(filters, group_by) is stats.query(filters, group_by)
+
+
+def test_stats_endpoint_with_bundled_registry(client):
+    total = client.get("/api/stats?total=true").get_json()["value"]
+    response = client.get("/api/stats")
+    assert response.status_code == 200
+    assert response.get_json()["value"] == total
+    assert client.get("/api/stats", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    assert client.get("/api/stats?year=abc").status_code == 400
@@ -0,0 +1,51 @@
+from ttl_cache import TTLCache
+
+
+def test_lru_eviction_keeps_recently_used_entries():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("ttl_cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=4, ttl=10)
+    cache.set("a", 1)
+    now[0] = 109.0
+    assert cache.get("a") == 1
+    now[0] = 111.0
+    assert cache.get("a", "gone") == "gone"
+    assert len(cache) == 0
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_get_or_create_calls_factory_once():
+    cache = TTLCache()
+    calls = []
+    for _ in range(3):
+        assert cache.get_or_create("k", lambda: calls.append(1) or "v") == "v"
+    assert len(calls) == 1
+
+
+def test_repeated_and_equivalent_queries_hit_the_response_cache(app_module):
+    from app import RESPONSE_CACHE, generate_ai_response
+
+    RESPONSE_CACHE.clear()
+    first = generate_ai_response("lung cancer treatment")
+    hits = RESPONSE_CACHE.hits
+    assert generate_ai_response("Lung cancer TREATMENT?") == first
+    assert RESPONSE_CACHE.hits == hits + 1
+    assert len(RESPONSE_CACHE) == 1
+
+
+def test_context_changes_the_cached_response(app_module):
+    from app import generate_ai_response
+
+    plain = generate_ai_response("lung cancer treatment")
+    elderly = generate_ai_response("lung cancer treatment", {"age": 70, "gender": "male"})
+    assert "【Risk Alert】" in elderly and "【Risk Alert】" not in plain
@@ -0,0 +1,96 @@
+import numpy as np
+
+from retrieval import BM25Index, chunk_text, guideline_passages, load_index, tokenize
+
+GUIDELINES = {
+    "lung_cancer": {
+        "treatment": "1) Surgery for early stage disease. 2) Chemotherapy with platinum doublets. "
+                     "3) Immunotherapy with PD-1 inhibitors for advanced disease.",
+        "side_effects": "Fatigue and nausea are common after chemotherapy. Tingling in hands and feet may occur.",
+    },
+    "breast_cancer": {
+        "treatment": "Hormone therapy for receptor positive tumours. 化疗后注意休息。",
+    },
+}
+
+
+def test_tokenize_latin_and_cjk():
+    assert tokenize("What are the side effects?") == ["side", "effect"]
+    assert tokenize("化疗") == ["化", "疗", "化疗"]
+    assert tokenize("Glass PD-1") == ["glass", "pd", "1"]
+
+
+def test_chunk_text_splits_items_and_packs_sentences():
+    chunks = chunk_text("1) One two three. 2) Four five. Six seven eight nine.", max_words=5)
+    assert chunks == ["1) One two three.", "2) Four five.", "Six seven eight nine."]
+    assert chunk_text("Short. Text.", max_words=30) == ["Short. Text."]
+
+
+def test_passages_carry_cancer_type_and_intent():
+    passages = guideline_passages(GUIDELINES, max_words=12)
+    assert {passage["id"].split("/")[0] for passage in passages} == {"lung_cancer", "breast_cancer"}
+    assert all(passage["title"] == f"{passage['cancer_type']} {passage['intent']}".replace("_", " ")
+               for passage in passages)
+
+
+def test_search_ranks_the_matching_passage_first():
+    index = BM25Index.build(guideline_passages(GUIDELINES, max_words=12))
+    passage, score = index.search("tingling hands", k=3)[0]
+    assert passage["intent"] == "side_effects" and score > 0
+    assert index.search("PD-1 immunotherapy")[0][0]["text"].startswith("3) Immunotherapy")
+    assert index.search("化疗 休息")[0][0]["cancer_type"] == "breast_cancer"
+
+
+def test_search_without_known_terms_is_empty():
+    index = BM25Index.build(guideline_passages(GUIDELINES))
+    assert index.search("the of and") == []
+    assert index.search("xylophone") == []
+    assert BM25Index.build([]).search("chemotherapy") == []
+
+
+def test_search_is_limited_to_one_cancer_type():
+    index = BM25Index.build(guideline_passages(GUIDELINES, max_words=12))
+    assert index.search("cancer therapy treatment")
+    hits = index.search("cancer therapy treatment", cancer_type="breast_cancer")
+    assert hits and {passage["cancer_type"] for passage, _ in hits} == {"breast_cancer"}
+    assert index.search("cancer therapy treatment", cancer_type="liver_cancer") == []
+
+
+def test_chat_never_returns_other_cancers_guidelines(app_module, client):
+    kb = app_module.KNOWLEDGE.current()
+    assert app_module.retrieve_passage_ids(kb, "liver cancer treatment") != ()
+    assert app_module.retrieve_passage_ids(kb, "liver cancer treatment", "liver_cancer") == ()
+    for query in ("liver cancer treatment", "肝癌治療"):
+        text = client.post("/api/chat", json={"query": query}).get_json()["response"]
+        assert "Guideline Passages" not in text
+        assert "Breast cancer" not in text and "Colorectal cancer" not in text
+
+
+def test_rare_terms_outweigh_common_ones():
+    index = BM25Index.build(guideline_passages(GUIDELINES, max_words=12))
+    common = index.weights[index.vocabulary["chemotherapy"]].max()
+    rare = index.weights[index.vocabulary["tingling"]].max()
+    assert rare > common
+
+
+def test_index_persists_and_rebuilds_when_the_corpus_changes(tmp_path):
+    path = str(tmp_path / "bm25.npz")
+    passages = guideline_passages(GUIDELINES)
+    built = load_index(passages, path)
+    loaded = load_index(passages, path)
+    assert loaded.key == built.key
+    assert np.allclose(loaded.weights.toarray(), built.weights.toarray())
+    changed = guideline_passages({**GUIDELINES, "liver_cancer": {"treatment": "Ablation."}})
+    assert load_index(changed, path).key != built.key
+    assert load_index(changed, path).search("ablation")[0][0]["cancer_type"] == "liver_cancer"
+
+
+def test_search_endpoint(client):
+    hits = client.get("/api/search?q=nausea after chemotherapy").get_json()
+    assert hits["results"] and "error" not in hits
+
+
+def test_search_endpoint_validates_parameters(client):
+    assert client.get("/api/search?q=x&k=many").status_code == 400
+    assert client.get("/api/search?q=x&mode=magic").status_code == 400
+    assert len(client.get("/api/search?q=chemotherapy&k=1").get_json()["results"]) == 1
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+PATIENTS = [{"id": "a", "age": 70, "gender": "male", "cancer_type": "lung_cancer"},
+            {"id": "b", "age": 30, "gender": "female", "cancer_type": "breast_cancer"}]
+
+
+def read_ndjson(response):
+    assert response.mimetype == "application/x-ndjson"
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_json_list_streams_one_line_per_patient(client):
+    lines = read_ndjson(client.post("/api/risk-alert/batch", json=PATIENTS))
+    assert [(line["index"], line["id"]) for line in lines] == [(0, "a"), (1, "b")]
+    assert lines[0]["risk_level"] == "high"
+
+
+def test_json_object_with_patients_key(client):
+    assert len(read_ndjson(client.post("/api/risk-alert/batch", json={"patients": PATIENTS}))) == 2
+
+
+@pytest.mark.parametrize("body", [5, "x", {"patients": 3}, {"other": []}, [1, {"age": 3}],
+                                  [{"cancer_type": {"a": 1}}]])
+def test_malformed_json_body_is_rejected_before_streaming(client, body):
+    response = client.post("/api/risk-alert/batch", json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_ndjson_reports_bad_records_inline(client):
+    body = "\n".join([json.dumps(PATIENTS[0]), "{not json", json.dumps({"cancer_type": ["x"]}), ""])
+    lines = read_ndjson(client.post("/api/risk-alert/batch", data=body, content_type="application/x-ndjson"))
+    assert lines[0]["id"] == "a"
+    assert "error" in lines[1] and "error" in lines[2]
+
+
+def test_csv_upload(client):
+    body = "id,age,gender,cancer_type\na,70,male,lung_cancer\nb,30,female,breast_cancer\n"
+    lines = read_ndjson(client.post("/api/risk-alert/batch", data=body, content_type="text/csv"))
+    assert [line["id"] for line in lines] == ["a", "b"]
+    assert lines[0]["risk_level"] == "high"
+
+
+ROSTER = [{"id": str(number), "age": age, "gender": gender, "cancer_type": cancer_type}
+          for number, (age, gender, cancer_type) in enumerate([
+              (70, "male", "lung_cancer"), ("66", "Female", "Breast_Cancer"), (None, None, None),
+              (45, "male", "liver_cancer"), ("abc", "female", "colorectal_cancer"), (81.5, "MALE", "LUNG_CANCER"),
+              (30, "female", "stomach_cancer")])]
+
+
+def test_batch_scores_chunks_through_evaluate_many(app_module, client, monkeypatch):
+    expected = [{"index": index, "id": patient["id"], **app_module.evaluate_risk(patient)}
+                for index, patient in enumerate(ROSTER)]
+    risk_index = app_module.KNOWLEDGE.current().risk_index
+    calls = []
+    evaluate_many = risk_index.evaluate_many
+    monkeypatch.setattr(risk_index, "evaluate_many", lambda *args: calls.append(len(args[0])) or evaluate_many(*args))
+    monkeypatch.setattr(risk_index, "evaluate", None)
+    monkeypatch.setattr(app_module, "RISK_BATCH_SIZE", 3)
+    body = ROSTER[:2] + [{"cancer_type": ["x"]}] + ROSTER[2:]
+    lines = read_ndjson(client.post("/api/risk-alert/batch", data="\n".join(map(json.dumps, body)),
+                                    content_type="application/x-ndjson"))
+    assert calls == [2, 3, 2]
+    assert [line["index"] for line in lines] == list(range(len(body)))
+    assert "error" in lines[2]
+    assert lines[:2] + lines[3:] == [{**line, "index": line["index"] + (line["index"] >= 2)} for line in expected]
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from risk_engine import PatientError, RiskIndex, resolve_registry_conditions, validate_patient
+
+RULES = [
+    {"id": "elderly", "alert": "elderly", "min_age": 65, "priority": 2},
+    {"id": "female_breast", "alert": "breast", "genders": ["Female"], "cancer_types": ["breast_cancer"],
+     "priority": 1},
+    {"id": "young", "alert": "young", "max_age": 18},
+]
+
+
+def test_evaluate_returns_rules_in_priority_order():
+    index = RiskIndex(RULES)
+    assert [rule["id"] for rule in index.evaluate(70, "female", "breast_cancer")] == ["female_breast", "elderly"]
+    assert [rule["id"] for rule in index.evaluate(10, "male", "lung_cancer")] == ["young"]
+    assert index.evaluate(40, "male", "lung_cancer") == ()
+
+
+def test_unknown_and_malformed_values_fall_into_the_other_cell():
+    index = RiskIndex(RULES)
+    assert index.evaluate("not a number", None, None) == index.evaluate(0, "", "")
+    assert [rule["id"] for rule in index.evaluate("66", " FEMALE ", "breast_cancer")] == ["female_breast", "elderly"]
+
+
+def test_cancer_types_are_case_folded():
+    index = RiskIndex(RULES + [{"id": "liver", "alert": "liver", "cancer_types": ["Liver_Cancer"]}])
+    assert [rule["id"] for rule in index.evaluate(40, "female", " Breast_Cancer ")] == ["female_breast"]
+    assert [rule["id"] for rule in index.evaluate(40, "male", "LIVER_CANCER")] == ["liver"]
+    first, count = index.evaluate_batch([40, 40], ["FEMALE", "male"], ["BREAST_CANCER", "liver_cancer"])
+    assert [index.rules[rule]["id"] for rule in first] == ["female_breast", "liver"] and list(count) == [1, 1]
+
+
+def test_batch_matches_single_evaluation():
+    index = RiskIndex(RULES)
+    ages = [70, 10, 40, "66", None, float("nan")]
+    genders = ["female", "male", "male", "Female", None, "female"]
+    cancer_types = ["breast_cancer", "lung_cancer", "lung_cancer", "breast_cancer", None, "breast_cancer"]
+    first, count = index.evaluate_batch(np.array(ages, dtype=object), genders, cancer_types)
+    assert list(index.evaluate_many(ages, genders, cancer_types)) == [
+        index.evaluate(*patient) for patient in zip(ages, genders, cancer_types)]
+    for age, gender, cancer_type, rule, matches in zip(ages, genders, cancer_types, first, count):
+        expected = index.evaluate(age, gender, cancer_type)
+        assert matches == len(expected)
+        assert (index.rules[rule] if rule >= 0 else None) == (expected[0] if expected else None)
+
+
+def test_registry_conditions_become_cancer_types():
+    metrics = {"mortality_incidence_ratio": {"lung_cancer": 0.6, "breast_cancer": 0.1, "liver_cancer": 0.8}}
+    rule = {"id": "r", "alert": "a", "registry_min": {"mortality_incidence_ratio": 0.35},
+            "cancer_types": ["lung_cancer", "breast_cancer"]}
+    assert resolve_registry_conditions(rule, metrics.get)["cancer_types"] == ["lung_cancer"]
+
+
+def test_registry_conditions_fall_back_without_registry_data(capsys):
+    rule = {"id": "r", "alert": "a", "registry_min": {"mortality_incidence_ratio": 0.35},
+            "registry_fallback": ["lung_cancer", "liver_cancer"]}
+    assert resolve_registry_conditions(rule, {}.get)["cancer_types"] == ["liver_cancer", "lung_cancer"]
+    assert resolve_registry_conditions(rule, None)["cancer_types"] == ["liver_cancer", "lung_cancer"]
+    assert "rule r falls back to lung_cancer, liver_cancer" in capsys.readouterr().err
+    del rule["registry_fallback"]
+    assert resolve_registry_conditions(rule, lambda metric: {})["cancer_types"] == []
+    assert "rule r matches no cancer type" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("patient", [5, [], {"cancer_type": ["x"]}, {"age": {"years": 3}}, {"gender": True}])
+def test_validate_patient_rejects_non_scalars(patient):
+    with pytest.raises(PatientError):
+        validate_patient(patient)
+
+
+def test_validate_patient_accepts_scalars():
+    patient = {"age": "65", "gender": "male", "cancer_type": None}
+    assert validate_patient(patient) is patient
+
+
+def test_risk_alert_rejects_non_scalar_fields(client):
+    response = client.post("/api/risk-alert", json={"cancer_type": ["x"]})
+    assert response.status_code == 400
+    assert "cancer_type" in response.get_json()["error"]
+    assert client.post("/api/risk-alert", json=[1, 2]).status_code == 400
+
+
+def test_risk_alert_flags_elderly_lung_patient(client):
+    data = client.post("/api/risk-alert", json={"age": 70, "gender": "male", "cancer_type": "lung_cancer"}).get_json()
+    assert data["risk_level"] == "high"
+    assert data["registry"]["cancer_type"] == "lung_cancer"
+
+
+def test_risk_alert_case_folds_before_both_lookups(client):
+    lower = client.post("/api/risk-alert", json={"age": 70, "gender": "male", "cancer_type": "lung_cancer"})
+    mixed = client.post("/api/risk-alert", json={"age": 70, "gender": "Male", "cancer_type": "Lung_Cancer"})
+    assert mixed.get_json() == lower.get_json()
+    assert "Men aged 60+" in mixed.get_json()["alerts"][0]
+
+
+def test_chat_rejects_non_scalar_context(client):
+    response = client.post("/api/chat", json={"query": "lung", "context": {"age": [1]}})
+    assert response.status_code == 400
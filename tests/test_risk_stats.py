@@ -0,0 +1,155 @@
+import math
+
+import pytest
+
+import risk_stats
+from registry_data import RegistryTable
+from risk_stats import RiskStatistics, describe, load_risk_stats
+
+
+def record(cancer_type, measure, value, sex="all", age_group="all", year=2022, source="registry_report"):
+    return (source, measure, year, "", cancer_type, cancer_type, cancer_type, sex, age_group, value)
+
+
+RECORDS = [
+    record("lung_cancer", "new_cases", 100.0),
+    record("lung_cancer", "deaths", 40.0),
+    record("lung_cancer", "incidence_rate", 50.0),
+    record("lung_cancer", "new_cases", 20.0, age_group="0-49"),
+    record("lung_cancer", "incidence_rate", 10.0, age_group="0-49"),
+    record("lung_cancer", "new_cases", 80.0, age_group="50+"),
+    record("lung_cancer", "incidence_rate", 150.0, age_group="50+"),
+    record("lung_cancer", "new_cases", 60.0, sex="male"),
+    record("lung_cancer", "incidence_rate", 62.0, sex="male"),
+    record("lung_cancer", "new_cases", 90.0, year=2021),
+    # superseded by the annual-report row for the same cell
+    record("lung_cancer", "new_cases", 999.0, source="top_ten"),
+    record("lung_cancer", "new_cases", 70.0, year=2020, source="top_ten"),
+    record("breast_cancer", "new_cases", 30.0, sex="female"),
+    # left out: unknown sex, non-count measure, unbanded age group and unmapped site
+    record("lung_cancer", "new_cases", 5.0, sex="other"),
+    record("lung_cancer", "survival", 5.0),
+    record("lung_cancer", "new_cases", 5.0, age_group="unknown"),
+    record("", "new_cases", 5.0),
+]
+
+
+@pytest.fixture(scope="module")
+def table():
+    return RegistryTable.from_records(RECORDS, key="0123456789abcdef-registry")
+
+
+@pytest.fixture(scope="module")
+def stats(table):
+    return RiskStatistics.build(table)
+
+
+def test_build_folds_the_table(stats):
+    assert stats.sites == ["breast_cancer", "lung_cancer"]
+    assert stats.bands == ["0-49", "50+", "all"]
+    assert stats.years == [2020, 2021, 2022]
+    result = stats.lookup("lung_cancer")
+    assert result["year"] == 2022 and result["new_cases"] == 100.0 and result["deaths"] == 40.0
+    assert result["mortality_incidence_ratio"] == 0.4
+    assert stats.lookup("lung_cancer", year=2020)["new_cases"] == 70.0
+    assert stats.lookup("lung_cancer", year=2021)["deaths"] is None
+
+
+def test_age_bands_and_relative_incidence(stats):
+    assert stats.lookup("lung_cancer", age=30)["age_band"] == "0-49"
+    assert stats.lookup("lung_cancer", age=49.9)["age_band"] == "0-49"
+    elderly = stats.lookup("lung_cancer", age=120)
+    assert elderly["age_band"] == "50+" and elderly["relative_incidence"] == 3.0
+
+
+@pytest.mark.parametrize("age", [None, "", "abc", "-5", 0, float("nan"), float("inf"), [60]])
+def test_malformed_ages_fall_back_to_all_ages(stats, age):
+    assert stats.band_for_age(age) == stats.all_band
+    assert stats.lookup("lung_cancer", age=age)["age_band"] == "all"
+
+
+def test_gender_and_site_are_case_folded(stats):
+    assert stats.lookup("lung_cancer", gender=" MALE ")["sex"] == "male"
+    assert stats.lookup(" Lung_Cancer ")["new_cases"] == 100.0
+    assert stats.lookup("lung_cancer", gender="unknown")["sex"] == "all"
+
+
+def test_missing_profiles_return_none(stats):
+    assert stats.lookup("bone_cancer") is None
+    assert stats.lookup(None) is None
+    assert stats.lookup("breast_cancer", gender="male") is None
+    assert stats.lookup("lung_cancer", year=1999) is None
+    assert stats.lookup("lung_cancer", year="last year") is None
+    assert stats.lookup("lung_cancer", year=[2022]) is None
+
+
+def test_site_metric(stats):
+    assert stats.site_metric("new_cases") == {"lung_cancer": 100.0}
+    assert stats.site_metric("new_cases", sex="female") == {"breast_cancer": 30.0}
+
+
+def test_describe(stats):
+    text = describe(stats.lookup("lung_cancer", age=70))
+    assert text == ("Macau registry 2022: 150.0 new lung cancer cases per 100,000 people aged 50+ "
+                    "(3.0x the all-ages rate).")
+    assert "deaths equalled 40% of new cases" in describe(stats.lookup("lung_cancer"))
+    assert describe(None) is None
+    assert describe(stats.lookup("breast_cancer", gender="female")) is None
+
+
+def test_persisted_array_round_trips(tmp_path, table, stats):
+    stats.save(tmp_path)
+    (tmp_path / "feedfacefeedface.npz").write_bytes(b"old")
+    stats.save(tmp_path)
+    assert [path.name for path in tmp_path.iterdir()] == ["0123456789abcdef.npz"]
+    loaded = RiskStatistics.load(table.key, tmp_path)
+    assert loaded.lookup("lung_cancer", "male", 60) == stats.lookup("lung_cancer", "male", 60)
+    assert math.isnan(loaded.values[0, 0, 0, 0, 0])
+
+
+def test_stale_array_is_rebuilt(tmp_path, table, stats, monkeypatch):
+    stats.save(tmp_path)
+    monkeypatch.setattr(risk_stats, "STATS_VERSION", risk_stats.STATS_VERSION + 1)
+    with pytest.raises(ValueError):
+        RiskStatistics.load(table.key, tmp_path)
+    rebuilt = load_risk_stats(table, tmp_path)
+    assert rebuilt.lookup("lung_cancer") == stats.lookup("lung_cancer")
+    assert RiskStatistics.load(table.key, tmp_path).years == stats.years
+
+
+def test_risk_alert_attaches_registry_statistics(client):
+    response = client.post("/api/risk-alert", json={"age": 65, "gender": "Male", "cancer_type": "Lung_Cancer"})
+    assert response.status_code == 200
+    registry = response.get_json()["registry"]
+    assert registry["sex"] == "male" and registry["age_band"] == "65-69"
+    assert registry["cancer_type"] == "lung_cancer"
+    assert response.get_json()["registry_summary"].startswith("Macau registry")
+
+
+def test_empty_registry_gives_empty_statistics(tmp_path):
+    empty = load_risk_stats(RegistryTable.empty(), tmp_path)
+    assert empty.sites == [] and empty.bands == ["all"] and empty.years == []
+    assert empty.lookup("lung_cancer", "male", 65) is None
+    assert empty.site_metric("mortality_incidence_ratio") == {}
+    assert empty.band_for_age(65) == empty.all_band
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_endpoints_work_without_a_registry(app_module, client, monkeypatch, tmp_path):
+    from knowledge_store import read_snapshot
+    from startup import Component
+
+    monkeypatch.setattr(app_module, "REGISTRY", Component("registry", RegistryTable.empty))
+    monkeypatch.setattr(app_module, "RISK_STATS", Component(
+        "risk_stats", lambda: load_risk_stats(app_module.REGISTRY.get(), tmp_path)))
+    snapshot, _ = read_snapshot(app_module.KNOWLEDGE.path)
+    state = app_module.build_knowledge_state(snapshot)
+    state.version, state.digest = snapshot["version"], "empty-registry"
+    monkeypatch.setattr(app_module.KNOWLEDGE, "current", lambda: state)
+
+    response = client.post("/api/risk-alert", json={"age": 70, "gender": "male", "cancer_type": "lung_cancer"})
+    assert response.status_code == 200
+    assert response.get_json()["registry"] is None and response.get_json()["registry_summary"] is None
+    assert "High-mortality cancer type, increased surveillance recommended" in response.get_json()["alerts"]
+    response = client.post("/api/chat", json={"query": "lung cancer side effects"})
+    assert response.status_code == 200
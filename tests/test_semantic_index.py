@@ -0,0 +1,118 @@
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+import semantic_index
+from semantic_index import (DEFAULT_MODEL, HashingEncoder, SentenceTransformerEncoder, VectorIndex, create_encoder,
+                            load_vector_index)
+
+
+class FakeModel:
+    def __init__(self, name, device=None):
+        if name == "missing-model":
+            raise OSError("not in the cache")
+        self.name = name
+        self.offline = os.environ.get("HF_HUB_OFFLINE")
+
+    def encode(self, texts, **kwargs):
+        return np.ones((len(texts), 4), dtype=np.float32) / 2
+
+
+@pytest.fixture
+def sentence_transformers(monkeypatch):
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(SentenceTransformer=FakeModel))
+    monkeypatch.setattr(semantic_index, "sentence_transformers_available", lambda: True)
+    monkeypatch.delenv("HF_HUB_OFFLINE", raising=False)
+
+
+def test_hashing_encoder_is_the_fallback_and_not_semantic(monkeypatch):
+    monkeypatch.setattr(semantic_index, "sentence_transformers_available", lambda: False)
+    encoder = create_encoder(None)
+    assert isinstance(encoder, HashingEncoder) and encoder.semantic is False
+
+
+def test_installed_sentence_transformers_is_the_default(sentence_transformers):
+    encoder = create_encoder(None)
+    assert isinstance(encoder, SentenceTransformerEncoder) and encoder.semantic is True
+    assert encoder.model.name == DEFAULT_MODEL and encoder.name == f"st-{DEFAULT_MODEL}"
+    assert create_encoder("org/other").name == "st-org_other"
+
+
+def test_hashing_can_be_forced_and_load_failures_fall_back(sentence_transformers, capsys):
+    assert isinstance(create_encoder("hashing"), HashingEncoder)
+    assert isinstance(create_encoder("missing-model"), HashingEncoder)
+    assert "falling back to hashing encoder" in capsys.readouterr().err
+
+
+def test_models_load_offline_unless_told_otherwise(sentence_transformers, monkeypatch):
+    assert create_encoder(None).model.offline == "1"
+    monkeypatch.setenv("HF_HUB_OFFLINE", "0")
+    assert create_encoder("/models/minilm").model.offline == "0"
+
+
+def test_hashing_encoder_tolerates_misspellings():
+    encoder = HashingEncoder()
+    right, typo, other = encoder.encode(["lung cancer", "lung canser", "hair loss after chemotherapy"])
+    assert np.allclose(np.linalg.norm(encoder.encode(["肺癌", ""]), axis=1), [1.0, 0.0], atol=1e-6)
+    assert right @ typo > right @ other
+
+
+def passages(count):
+    return [{"id": f"p{number}", "title": f"topic {number % 7}", "text": f"passage words {number} side effect",
+             "cancer_type": f"type{number % 3}"} for number in range(count)]
+
+
+def test_ivf_search_agrees_with_exact_search():
+    encoder = HashingEncoder(dim=64)
+    corpus = passages(400)
+    exact = VectorIndex.build(corpus, encoder, "exact")
+    ivf = VectorIndex.build(corpus, encoder, "ivf", ivf_min=100)
+    ivf.nprobe = len(ivf.centroids)
+    query = encoder.encode(["passage words 17 side effect"])[0]
+    assert [passage["id"] for passage, _ in ivf.search(query, 5)] == [passage["id"] for passage, _ in
+                                                                      exact.search(query, 5)]
+    assert exact.search(query, 1)[0][0]["id"] == "p17"
+
+
+def test_search_is_limited_to_one_cancer_type():
+    encoder = HashingEncoder(dim=64)
+    corpus = passages(400)
+    query = encoder.encode(["passage words 17 side effect"])[0]
+    for index in (VectorIndex.build(corpus, encoder, "exact"), VectorIndex.build(corpus, encoder, "ivf", ivf_min=100)):
+        hits = index.search(query, 5, cancer_type="type2")
+        assert hits and {passage["cancer_type"] for passage, _ in hits} == {"type2"}
+        assert index.search(query, 5, cancer_type="liver_cancer") == []
+
+
+def test_index_is_stored_and_memory_mapped(tmp_path):
+    encoder = HashingEncoder(dim=32)
+    corpus = passages(20)
+    built = load_vector_index(corpus, encoder, tmp_path)
+    loaded = load_vector_index(corpus, encoder, tmp_path)
+    assert isinstance(loaded.vectors, np.memmap) and not isinstance(built.vectors, np.memmap)
+    assert np.array_equal(np.asarray(loaded.vectors), built.vectors)
+    assert VectorIndex.build([], encoder, "empty").search(np.zeros(32, dtype=np.float32)) == []
+
+
+def test_classify_needs_a_clear_winner():
+    encoder = HashingEncoder(dim=64)
+    index = VectorIndex.build(passages(30), encoder, "classify")
+    query = encoder.encode(["passage words 4 side effect"])[0]
+    assert index.classify(query, "cancer_type", threshold=0.0, margin=0.0) == "type1"
+    assert index.classify(query, "cancer_type", threshold=1.01, margin=0.0) is None
+    assert index.classify(query, "cancer_type", threshold=0.0, margin=1.0) is None
+
+
+def test_search_modes(client, app_module):
+    dense = client.get("/api/search?q=lung%20canser&mode=DENSE&k=2").get_json()
+    assert dense["mode"] == "dense" and dense["encoder"] == app_module.ENCODER.get().name
+    assert len(dense["results"]) == 2
+    assert "encoder" not in client.get("/api/search?q=lung").get_json()
+    if not app_module.ENCODER.get().semantic:
+        response = client.get("/api/search?q=tumor%20in%20my%20chest&mode=semantic")
+        assert response.status_code == 400 and "mode=dense" in response.get_json()["error"]
+    assert client.get("/api/search?q=x&mode=fuzzy").status_code == 400
+    assert client.get("/api/search?q=x&k=abc").status_code == 400
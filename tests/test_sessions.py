@@ -0,0 +1,110 @@
+import pytest
+
+from session_store import (MemorySessionStore, RedisSessionStore, Session, SessionError, UnknownSessionError,
+                           new_session_id, resolve)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+@pytest.mark.parametrize("store", [MemorySessionStore(), RedisSessionStore(FakeRedis())])
+def test_resolve_returns_only_stored_sessions(store):
+    session = Session(new_session_id(), age=60, rule_key=("a", 1))
+    store.save(session)
+    found = resolve(store, session.id)
+    assert found.age == 60 and found.rule_key == ("a", 1)
+    assert resolve(store, None) is None
+    with pytest.raises(UnknownSessionError):
+        resolve(store, "A" * 22)
+    store.delete(session.id)
+    with pytest.raises(UnknownSessionError):
+        resolve(store, session.id)
+
+
+@pytest.mark.parametrize("session_id", ["short", "x" * 65, "../../etc/passwd", "a b" * 8, 12345678901234567, ["a"]])
+def test_malformed_ids_are_rejected(session_id):
+    with pytest.raises(SessionError) as error:
+        resolve(MemorySessionStore(), session_id)
+    assert not isinstance(error.value, UnknownSessionError)
+
+
+def test_server_issues_the_id_in_an_httponly_cookie(client):
+    response = client.post("/api/session", json={"age": 70, "gender": "male", "session_id": "A" * 22})
+    assert response.status_code == 201
+    session_id = client.get_cookie("session_id").value
+    assert session_id != "A" * 22 and len(session_id) >= 16
+    cookie = response.headers["Set-Cookie"]
+    assert "HttpOnly" in cookie and "SameSite=Lax" in cookie
+    assert client.get("/api/session").get_json()["age"] == 70
+    assert client.delete("/api/session").status_code == 204
+    assert client.get_cookie("session_id") is None
+
+
+def test_the_id_stays_out_of_bodies_and_urls(client):
+    client.post("/api/session", json={"age": 70, "gender": "male"})
+    session_id = client.get_cookie("session_id").value
+    responses = [client.get("/api/session"),
+                 client.post("/api/chat", json={"query": "lung side effects"}),
+                 client.post("/api/risk-alert", json={"age": 70, "gender": "male", "cancer_type": "lung_cancer"}),
+                 client.post("/api/process-navigation", json={"stage": "treatment", "step": 2}),
+                 client.get("/api/timeline")]
+    for response in responses:
+        assert response.status_code == 200 and session_id not in response.get_data(as_text=True)
+    timeline = responses[-1].get_json()
+    assert timeline["chart_url"] == "/api/charts/timeline" and timeline["current_step"] == 2
+
+
+def test_ids_in_bodies_and_query_strings_are_ignored(client):
+    client.post("/api/session", json={"age": 70})
+    session_id = client.get_cookie("session_id").value
+    client.delete_cookie("session_id")
+    assert client.get(f"/api/session?session_id={session_id}").status_code == 400
+    chat = client.post("/api/chat", json={"query": "lung", "session_id": session_id})
+    assert chat.status_code == 200 and "Set-Cookie" not in chat.headers
+    assert client.get("/api/session", headers={"X-Session-Id": session_id}).get_json()["age"] == 70
+
+
+def test_session_timeline_chart_is_private(app_module, client, monkeypatch):
+    class Charts:
+        def options(self, args):
+            return "svg", 100
+
+        def render(self, name, data, fmt, dpi):
+            return f"<svg>{data['current_step']}</svg>".encode(), f"{name}-{data['current_step']}"
+
+    monkeypatch.setattr(app_module, "CHART_SERVICE", type("Ready", (), {"get": staticmethod(Charts)}))
+    client.post("/api/session", json={"age": 70})
+    client.post("/api/process-navigation", json={"stage": "treatment", "step": 3})
+    response = client.get("/api/charts/timeline")
+    assert response.get_data(as_text=True) == "<svg>3</svg>"
+    assert response.headers["Cache-Control"] in ("private, no-cache", "no-cache, private")
+    assert "Cookie" in response.headers["Vary"]
+
+
+def test_unknown_ids_are_rejected_and_the_cookie_cleared(client):
+    made_up = "A" * 22
+    for response in (client.get("/api/session", headers={"X-Session-Id": made_up}),
+                     client.post("/api/chat", json={"query": "lung"}, headers={"X-Session-Id": made_up})):
+        assert response.status_code == 404
+    client.set_cookie("session_id", made_up)
+    response = client.post("/api/chat", json={"query": "lung", "stream": True})
+    assert response.status_code == 404 and "session_id=;" in response.headers["Set-Cookie"]
+    assert client.get_cookie("session_id") is None
+    assert client.get("/api/session").status_code == 400
+
+
+def test_malformed_session_requests_get_400(client):
+    assert client.get("/api/session", headers={"X-Session-Id": "bad"}).status_code == 400
+    assert client.post("/api/session", json=[1, 2]).status_code == 400
+    assert client.post("/api/session", json={"age": {"years": 3}}).status_code == 400
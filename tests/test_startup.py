@@ -0,0 +1,192 @@
+import io
+import threading
+import time
+
+import pytest
+
+from startup import Component, Components, format_report
+
+
+def test_component_builds_once_on_first_get():
+    calls = []
+    component = Component("table", lambda: calls.append(1) or "value")
+    assert not component.ready and component.status()["state"] == "pending"
+    assert component.get() == "value" and component.get() == "value"
+    assert calls == [1]
+    status = component.status()
+    assert component.ready and status["state"] == "ready" and status["error"] is None
+    assert status["seconds"] >= 0
+
+
+def test_concurrent_first_gets_share_one_build():
+    calls = []
+
+    def factory():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    component = Component("slow", factory)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(component.get())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [1] and len(set(map(id, results))) == 1
+
+
+def test_failed_build_is_recorded_and_retried():
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("registry missing")
+        return "table"
+
+    component = Component("registry", factory)
+    with pytest.raises(OSError):
+        component.get()
+    assert not component.ready
+    assert component.status()["state"] == "failed"
+    assert component.status()["error"] == "OSError: registry missing"
+    assert component.get() == "table"
+    assert component.status()["state"] == "ready" and component.status()["error"] is None
+
+
+def test_a_falsy_value_counts_as_built():
+    calls = []
+    component = Component("empty", lambda: calls.append(1))
+    assert component.get() is None and component.get() is None
+    assert component.ready and calls == [1]
+
+
+def components(fail_optional=False):
+    registry = Components()
+    registry.add("registry", lambda: "table")
+
+    def charts():
+        if fail_optional:
+            raise RuntimeError("no matplotlib")
+        return "charts"
+
+    registry.add("charts", charts, required=False)
+    return registry
+
+
+def test_ready_ignores_optional_components():
+    registry = components(fail_optional=True)
+    assert not registry.ready()
+    report = registry.warm()
+    assert report["ready"] and registry.ready()
+    assert report["components"]["registry"]["state"] == "ready"
+    assert report["components"]["charts"] == {"state": "failed", "required": False,
+                                              "seconds": report["components"]["charts"]["seconds"],
+                                              "error": "RuntimeError: no matplotlib"}
+    assert report["warmup_seconds"] is not None and report["import_seconds"] is None
+
+
+def test_warm_selected_components():
+    registry = components()
+    report = registry.warm(["charts"])
+    assert not report["ready"]
+    assert report["components"]["registry"]["state"] == "pending"
+
+
+def test_warmup_starts_one_thread_and_logs_the_report():
+    registry = components(fail_optional=True)
+    registry.mark_imported()
+    log = io.StringIO()
+    threads = []
+    starters = [threading.Thread(target=lambda: threads.append(registry.warmup(log=log))) for _ in range(8)]
+    for starter in starters:
+        starter.start()
+    for starter in starters:
+        starter.join()
+    assert len(set(threads)) == 1
+    threads[0].join(5)
+    assert registry.warmup(log=log) is threads[0]
+    line = log.getvalue()
+    assert line.count("startup:") == 1
+    assert line.startswith("startup: imported in ") and "warm in " in line
+    assert "charts failed (RuntimeError: no matplotlib)" in line
+
+
+def flaky(failures):
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) <= failures:
+            raise OSError("registry not mounted")
+        return "table"
+
+    return factory, attempts
+
+
+def test_warmup_retries_failed_required_components():
+    registry = Components(retry_min=0.0)
+    factory, attempts = flaky(1)
+    registry.add("registry", factory)
+    registry.add("charts", lambda: "charts", required=False)
+    registry.warmup(log=None).join(5)
+    assert not registry.ready() and registry.failed() == ["registry"]
+
+    retry = registry.warmup(log=None)
+    retry.join(5)
+    assert registry.ready() and registry.failed() == [] and len(attempts) == 2
+    assert registry.warmup(log=None) is retry
+
+
+def test_warmup_retries_back_off():
+    registry = Components(retry_min=60.0)
+    factory, attempts = flaky(1)
+    registry.add("registry", factory)
+    first = registry.warmup(log=None)
+    first.join(5)
+    assert registry.warmup(log=None) is first and len(attempts) == 1
+
+    registry.retry_min = registry.retry_max = 0.0
+    registry._retry_at = 0.0
+    registry.warmup(log=None).join(5)
+    assert registry.ready() and registry._backoff == 0.0
+
+
+def test_format_report_without_timings():
+    registry = components()
+    assert format_report(registry.report()) == "startup: (registry pending, charts pending)"
+
+
+def test_ready_endpoint(app_module, client, monkeypatch):
+    gate = threading.Event()
+    registry = Components()
+    registry.add("registry", lambda: gate.wait(5) and "table")
+    monkeypatch.setattr(app_module, "COMPONENTS", registry)
+
+    response = client.get("/api/ready")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert response.get_json()["ready"] is False
+    assert registry._thread is not None
+
+    gate.set()
+    registry._thread.join(5)
+    response = client.get("/api/ready")
+    assert response.status_code == 200 and "Retry-After" not in response.headers
+    assert response.get_json()["components"]["registry"]["state"] == "ready"
+
+
+def test_ready_endpoint_recovers_from_a_failed_load(app_module, client, monkeypatch):
+    registry = Components(retry_min=0.0)
+    factory, attempts = flaky(1)
+    registry.add("registry", factory)
+    monkeypatch.setattr(app_module, "COMPONENTS", registry)
+
+    assert client.get("/api/ready").status_code == 503
+    registry._thread.join(5)
+    assert registry.report()["components"]["registry"]["error"] == "OSError: registry not mounted"
+    client.get("/api/ready")
+    registry._thread.join(5)
+    response = client.get("/api/ready")
+    assert response.status_code == 200 and len(attempts) == 2